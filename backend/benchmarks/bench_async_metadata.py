@@ -0,0 +1,105 @@
+"""
+Async metadata access benchmark
+Serves concurrent requests on one event loop (as uvicorn does) with the previous blocking auth lookup
+and with the async session path, for endpoints that only touch metadata
+
+Run from the backend directory:
+    python -m benchmarks.bench_async_metadata [concurrency] [seconds]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# The benchmark gets its own database; this must be set before the app modules are imported
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+import httpx
+import numpy as np
+from fastapi import Depends, HTTPException
+from fastapi.testclient import TestClient
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+from config import settings
+from database import get_db, init_db
+from main import app
+from models import User
+from routers.auth import get_current_user, oauth2_scheme
+
+USERS = 8
+PATHS = ["/auth/me", "/connections/all", "/history/?limit=50", "/subscription/current", "/connections/stats/usage"]
+
+async def blocking_get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """The previous dependency: declared async, but its query blocks the event loop"""
+    try:
+        email = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm]).get("sub")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    user = db.query(User).filter(User.email == email).first()
+    if user is None:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    return user
+
+def prepare() -> list:
+    """Create USERS users with a connection and some history; returns their auth headers"""
+    init_db()
+    client = TestClient(app)
+    headers = []
+    for i in range(USERS):
+        credentials = {"email": f"bench{i}@example.com", "password": "bench"}
+        client.post("/auth/register", json=credentials)
+        token = client.post("/auth/login", json=credentials).json()["token"]
+        headers.append({"Authorization": f"Bearer {token}"})
+        client.post("/connections/add", json={"name": "bench", "type": "csv", "details": {"file_path": "bench.csv"}}, headers=headers[-1])
+        for _ in range(20):
+            client.post("/history/log?query=total+sales+by+region", headers=headers[-1])
+    return headers
+
+async def drive(headers: list, concurrency: int, seconds: float) -> tuple:
+    """Run concurrency request loops for seconds; returns (latencies in ms, error count)"""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    transport = httpx.ASGITransport(app=app)
+    
+    async def loop(index: int):
+        nonlocal errors
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            step = index
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get(PATHS[step % len(PATHS)], headers=headers[index % len(headers)])
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+                step += 1
+    
+    await asyncio.gather(*(loop(i) for i in range(concurrency)))
+    return latencies, errors
+
+async def compare(headers: list, concurrency: int, seconds: float) -> list:
+    """Run both modes on the same event loop (async engine connections belong to the loop that opened them)"""
+    results = []
+    for label, override in [("blocking auth lookup (before)", blocking_get_current_user), ("async sessions", None)]:
+        if override is not None:
+            app.dependency_overrides[get_current_user] = override
+        latencies, errors = await drive(headers, concurrency, seconds)
+        app.dependency_overrides.clear()
+        results.append((label, latencies, errors))
+    return results
+
+def run_benchmark(concurrency: int, seconds: float):
+    headers = prepare()
+    print(f"{concurrency} concurrent requests on one event loop, {seconds:g} s per mode")
+    print(f"  {'':<30} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for label, latencies, errors in asyncio.run(compare(headers, concurrency, seconds)):
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"  {label:<30} {len(latencies) / seconds:8.0f} {p50:8.1f} {p95:8.1f} {errors:7d}")
+
+if __name__ == "__main__":
+    run_benchmark(
+        # Stays under the sync pool size: past it, the blocking lookup can stall the loop until pool timeouts
+        int(sys.argv[1]) if len(sys.argv) > 1 else 24,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    )
@@ -0,0 +1,60 @@
+"""
+CSV parsing throughput benchmark
+Compares single-threaded pd.read_csv against the parallel loader at increasing worker counts
+
+Run from the backend directory:
+    python -m benchmarks.bench_csv_parsing [size_mb]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from connectors.parallel_csv import read_csv_parallel
+
+def make_csv(path: str, size_mb: int):
+    """Write a mixed-type CSV of roughly size_mb megabytes, including quoted fields with newlines"""
+    rng = np.random.default_rng(42)
+    rows = 200_000
+    chunk = pd.DataFrame({
+        "order_id": np.arange(rows),
+        "amount": rng.random(rows) * 1000,
+        "quantity": rng.integers(1, 50, rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "note": rng.choice(["", "fragile", "gift, wrapped", "leave at\nback door"], rows),
+        "order_date": pd.date_range("2026-01-01", periods=rows, freq="s").strftime("%Y-%m-%d %H:%M:%S")
+    })
+    chunk.to_csv(path, index=False)
+    with open(path, "a") as f:
+        while os.path.getsize(path) < size_mb * 1024 * 1024:
+            chunk.to_csv(f, index=False, header=False)
+            f.flush()
+
+def time_it(fn, repeat: int = 2) -> float:
+    """Return best seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_benchmark(size_mb: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.csv")
+        make_csv(path, size_mb)
+        megabytes = os.path.getsize(path) / (1024 * 1024)
+        cores = os.cpu_count() or 1
+        print(f"{megabytes:.0f} MB file, {cores} cores")
+        
+        baseline = time_it(lambda: pd.read_csv(path, low_memory=False))
+        print(f"  {'pd.read_csv':<24} {baseline:8.2f} s  {megabytes / baseline:8.1f} MB/s")
+        workers = 2
+        while workers <= max(2, cores):
+            seconds = time_it(lambda: read_csv_parallel(path, workers))
+            print(f"  {f'parallel, {workers} workers':<24} {seconds:8.2f} s  {megabytes / seconds:8.1f} MB/s  {baseline / seconds:5.1f}x")
+            workers *= 2
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 256)
@@ -0,0 +1,124 @@
+"""
+Metadata store concurrency benchmark
+Drives the auth, connections and history endpoints from concurrent clients against SQLite with the
+previous engine settings, SQLite through the metadata store (WAL, pragmas, sized pool) and, if a
+URL is given, a Postgres database through both (needs psycopg2 from requirements.txt)
+
+Run from the backend directory:
+    python -m benchmarks.bench_metadata_store [clients] [seconds] [postgres_url]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+import database
+from database import Base, SessionLocal, ThreadedSessionLocal
+from history_logger import history_logger
+from main import app
+from metadata_store import create_metadata_engine
+from usage import usage_counters
+
+USERS = 8
+# Each client cycles through these requests; {id} is its user's connection
+REQUESTS = [
+    ("GET", "/auth/me"),
+    ("GET", "/connections/"),
+    ("PUT", "/connections/{id}"),
+    ("POST", "/history/log?query=total+sales+by+region"),
+    ("GET", "/history/?limit=50"),
+    ("GET", "/connections/stats/usage"),
+]
+
+def legacy_engine(url: str):
+    """The engine database.py created before the metadata store"""
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(make_url(url).set(drivername="postgresql+psycopg2"))
+
+def prepare(engine) -> list:
+    """
+    Point the app at engine, create the schema and one user with a connection per USERS; returns (headers, connection id) pairs.
+    Async routes run on engine in the threadpool too, so every backend is measured through the same session code.
+    """
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+    ThreadedSessionLocal.configure(bind=engine)
+    database.AsyncSessionLocal = None
+    usage_counters.clear()
+    client = TestClient(app)
+    users = []
+    for i in range(USERS):
+        credentials = {"email": f"bench{i}@example.com", "password": "bench"}
+        client.post("/auth/register", json=credentials)
+        token = client.post("/auth/login", json=credentials).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        connection = client.post("/connections/add", json={"name": "bench", "type": "csv", "details": {"file_path": "bench.csv"}}, headers=headers)
+        users.append((headers, connection.json()["id"]))
+    return users
+
+def run_clients(users: list, clients: int, seconds: float) -> tuple:
+    """Run clients threads for seconds; returns (latencies in ms, error count)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    
+    def client_loop(index: int):
+        client = TestClient(app)
+        headers, connection_id = users[index % len(users)]
+        local, failed, step = [], 0, 0
+        while time.perf_counter() < deadline:
+            method, path = REQUESTS[step % len(REQUESTS)]
+            body = {"name": f"bench-{step}"} if method == "PUT" else None
+            start = time.perf_counter()
+            try:
+                response = client.request(method, path.format(id=connection_id), json=body, headers=headers)
+                if response.status_code >= 500:
+                    failed += 1
+            except Exception:
+                failed += 1
+            local.append((time.perf_counter() - start) * 1000)
+            step += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+    
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    history_logger.flush()
+    return latencies, errors[0]
+
+def run_benchmark(clients: int, seconds: float, postgres_url: str = None):
+    with tempfile.TemporaryDirectory() as tmp:
+        setups = [
+            ("sqlite, previous engine", legacy_engine(f"sqlite:///{os.path.join(tmp, 'legacy.db')}")),
+            ("sqlite, metadata store", create_metadata_engine(f"sqlite:///{os.path.join(tmp, 'tuned.db')}")),
+        ]
+        if postgres_url:
+            setups.append(("postgres, previous engine", legacy_engine(postgres_url)))
+            setups.append(("postgres, metadata store", create_metadata_engine(postgres_url)))
+        
+        print(f"{clients} clients, {seconds:g} s per backend, {len(REQUESTS)} endpoints")
+        print(f"  {'':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for label, engine in setups:
+            users = prepare(engine)
+            latencies, errors = run_clients(users, clients, seconds)
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"  {label:<26} {len(latencies) / seconds:8.0f} {p50:8.1f} {p95:8.1f} {errors:7d}")
+            engine.dispose()
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 16,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        sys.argv[3] if len(sys.argv) > 3 else None
+    )
@@ -0,0 +1,77 @@
+"""
+Serialization benchmark for query results
+Compares the current row-oriented JSON path against columnar JSON, NDJSON and Arrow IPC
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization
+"""
+import json
+import time
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from routers.query import QueryResponse
+from execution.serialization import (
+    columnar_json, iter_ndjson, arrow_schema, iter_arrow_stream, ARROW_AVAILABLE
+)
+
+def make_frame(rows: int, columns: int) -> pd.DataFrame:
+    """Build a mixed-type DataFrame similar to typical query results"""
+    rng = np.random.default_rng(42)
+    data = {}
+    for i in range(columns):
+        kind = i % 4
+        if kind == 0:
+            data[f"int_{i}"] = rng.integers(0, 1_000_000, rows)
+        elif kind == 1:
+            data[f"float_{i}"] = rng.random(rows) * 1000
+        elif kind == 2:
+            data[f"text_{i}"] = rng.choice(["north", "south", "east", "west"], rows)
+        else:
+            data[f"date_{i}"] = pd.date_range("2026-01-01", periods=rows, freq="min")
+    return pd.DataFrame(data)
+
+def current_path(df: pd.DataFrame) -> bytes:
+    """to_dict(records) -> QueryResponse -> jsonable_encoder -> json, as /query/run does today"""
+    response = QueryResponse(summary="", results=df.to_dict(orient="records"), suggestions=[])
+    return json.dumps(jsonable_encoder(response)).encode("utf-8")
+
+def columnar_path(df: pd.DataFrame) -> bytes:
+    return columnar_json(df).encode("utf-8")
+
+def ndjson_path(df: pd.DataFrame) -> bytes:
+    return b"".join(iter_ndjson({}, df))
+
+def arrow_path(df: pd.DataFrame) -> bytes:
+    return b"".join(iter_arrow_stream(df, arrow_schema(df)))
+
+def time_it(fn, df: pd.DataFrame, repeat: int) -> tuple:
+    """Return (best seconds, payload bytes)"""
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = fn(df)
+        best = min(best, time.perf_counter() - start)
+        size = len(payload)
+    return best, size
+
+def run_benchmark():
+    paths = [("current (records + pydantic)", current_path), ("columnar json", columnar_path), ("ndjson", ndjson_path)]
+    if ARROW_AVAILABLE:
+        paths.append(("arrow ipc", arrow_path))
+    else:
+        print("pyarrow not installed - skipping Arrow IPC")
+    
+    for rows, columns in [(100, 50), (10_000, 20), (200_000, 10)]:
+        df = make_frame(rows, columns)
+        repeat = 5 if rows <= 10_000 else 2
+        print(f"\n{rows} rows x {columns} columns")
+        baseline = None
+        for name, fn in paths:
+            seconds, size = time_it(fn, df, repeat)
+            baseline = baseline or seconds
+            print(f"  {name:<30} {seconds * 1000:9.2f} ms  {size / 1024:10.1f} KB  {baseline / seconds:6.1f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
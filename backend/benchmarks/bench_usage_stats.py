@@ -0,0 +1,107 @@
+"""
+Usage statistics benchmark
+Compares the previous five COUNT queries (with DATE() filters) against the single aggregated
+statement, before and after adding the query history indexes
+
+Run from the backend directory:
+    python -m benchmarks.bench_usage_stats [history_rows]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Connection, QueryHistory
+from routers.connections import usage_stats_query
+
+USERS = 1000
+BATCH_ROWS = 500_000
+
+def load_history(path: str, rows: int):
+    """Fill query_history with rows spread over USERS users and the past year"""
+    rng = np.random.default_rng(42)
+    now = datetime.utcnow()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO connections (id, name, type, details, user_id, status) VALUES (?, ?, 'csv', '{}', ?, ?)",
+        [(i, f"c{i}", i % USERS + 1, "active" if i % 3 else "inactive") for i in range(1, USERS * 3 + 1)]
+    )
+    for start in range(0, rows, BATCH_ROWS):
+        count = min(BATCH_ROWS, rows - start)
+        users = rng.integers(1, USERS + 1, count)
+        sources = rng.integers(1, USERS * 3 + 1, count)
+        ages = rng.integers(0, 365 * 24 * 3600, count)
+        conn.executemany(
+            "INSERT INTO query_history (user_id, query_text, source_id, created_at) VALUES (?, 'total sales by region', ?, ?)",
+            (
+                (int(user), int(source), (now - timedelta(seconds=int(age))).strftime("%Y-%m-%d %H:%M:%S"))
+                for user, source, age in zip(users, sources, ages)
+            )
+        )
+        conn.commit()
+    conn.close()
+
+def legacy_stats(db, user_id: int) -> dict:
+    """The previous implementation: five separate COUNT queries"""
+    today = datetime.utcnow().date()
+    month_start = datetime.utcnow().replace(day=1).date()
+    return {
+        "total_connections": db.query(Connection).filter(Connection.user_id == user_id).count(),
+        "active_connections": db.query(Connection).filter(Connection.user_id == user_id, Connection.status == "active").count(),
+        "total_queries": db.query(QueryHistory).filter(QueryHistory.user_id == user_id).count(),
+        "queries_today": db.query(QueryHistory).filter(
+            QueryHistory.user_id == user_id, func.date(QueryHistory.created_at) == today
+        ).count(),
+        "queries_this_month": db.query(QueryHistory).filter(
+            QueryHistory.user_id == user_id, func.date(QueryHistory.created_at) >= month_start
+        ).count()
+    }
+
+def aggregated_stats(db, user_id: int) -> dict:
+    return dict(db.execute(usage_stats_query(user_id, datetime.utcnow())).one()._mapping)
+
+def time_it(fn, db, repeat: int = 20) -> float:
+    """Return mean milliseconds per call over a spread of users"""
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(db, i * (USERS // repeat) + 1)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def run_benchmark(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine, tables=[Base.metadata.tables["users"], Connection.__table__, QueryHistory.__table__])
+        indexes = [index for index in QueryHistory.__table__.indexes if index.name != "ix_query_history_id"]
+        for index in indexes:
+            index.drop(bind=engine)
+        
+        start = time.perf_counter()
+        load_history(path, rows)
+        print(f"{rows:,} history rows, {USERS} users (loaded in {time.perf_counter() - start:.0f} s)")
+        
+        db = sessionmaker(bind=engine)()
+        assert legacy_stats(db, 1) == aggregated_stats(db, 1)
+        results = [("no indexes", time_it(legacy_stats, db), time_it(aggregated_stats, db))]
+        
+        start = time.perf_counter()
+        for index in indexes:
+            index.create(bind=engine)
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+        print(f"indexes built in {time.perf_counter() - start:.1f} s")
+        results.append(("with indexes", time_it(legacy_stats, db), time_it(aggregated_stats, db)))
+        assert legacy_stats(db, 1) == aggregated_stats(db, 1)
+        db.close()
+        
+        print(f"  {'':<14} {'5 queries':>12} {'1 query':>12}")
+        for label, legacy, aggregated in results:
+            print(f"  {label:<14} {legacy:9.1f} ms {aggregated:9.1f} ms  {legacy / aggregated:5.1f}x")
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
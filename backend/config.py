@@ -4,15 +4,72 @@ from typing import List
 class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./data_analyzer.db"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: int = 30
+    db_pool_recycle_seconds: int = 1800  # Server databases only
+    sqlite_busy_timeout_ms: int = 5000  # How long a writer waits for the write lock before "database is locked"
+    sqlite_cache_size_kb: int = 64 * 1024
+    sqlite_mmap_size_bytes: int = 256 * 1024 * 1024
     
     # JWT Settings
     secret_key: str = "your-secret-key-change-this-in-production-please-use-a-strong-random-key"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # Prometheus scraping; /metrics answers 404 until a token is set and then requires "Authorization: Bearer <token>"
+    metrics_token: str = ""
+    
     # OpenAI API (optional, for advanced NLP)
     openai_api_key: str = ""
     
+    # Query result cache
+    result_cache_max_bytes: int = 256 * 1024 * 1024
+    result_cache_default_ttl_seconds: int = 600
+    result_cache_unversioned_ttl_seconds: int = 60
+    mysql_data_version_ttl_seconds: int = 30  # MySQL table statistics are estimates, so its data versions also expire
+    mongodb_data_version_ttl_seconds: int = 30  # MongoDB collection stats miss in-place updates, so its data versions also expire
+    
+    # Server-side result store for paginated results (per API process: run one worker or use sticky sessions)
+    result_store_max_memory_bytes: int = 512 * 1024 * 1024
+    result_store_ttl_seconds: int = 1800
+    result_store_spill_dir: str = ""  # Empty uses the system temp directory
+    
+    # Approximate (sample-based) queries
+    approximate_sample_rows: int = 50000
+    approximate_sample_ttl_seconds: int = 3600
+    sketch_min_rows: int = 1000000  # Distinct counts and percentiles use sketches from this many rows, or when approximate is set
+    
+    # Parsed CSV/Excel datasets shared across queries
+    dataset_cache_max_bytes: int = 1024 * 1024 * 1024
+    dataset_snapshot_dir: str = ""  # Empty uses a per-user directory under the system temp directory; must be private (0700, owned by the API user)
+    zone_map_row_group_rows: int = 65536
+    parallel_csv_workers: int = 0  # 0 uses every core, 1 disables parallel parsing
+    parallel_csv_min_bytes: int = 64 * 1024 * 1024  # Smaller files are parsed in-process
+    max_decompressed_bytes: int = 4 * 1024 * 1024 * 1024  # Compressed files may not inflate past this (0 disables)
+    secondary_index_min_filters: int = 3  # Equality filters on a column before it gets an index
+    bitmap_index_max_cardinality: int = 32  # Up to this many distinct values use bitmaps instead of row-id lists
+    
+    # Worker processes running plans for file connections. Per-query memory and CPU-time limits are only enforced
+    # inside workers; 0 runs plans in the API process, where only estimates, result sizes and response deadlines apply.
+    # -1 starts one worker per core (up to 4) when any plan limits query memory or CPU time, else none.
+    query_worker_processes: int = -1
+    
+    # Rollup cubes for frequent group-by queries
+    rollup_min_hits: int = 3  # Group-by queries seen in history before a cube is built
+    rollup_history_window: int = 1000  # Most recent history entries mined per connection
+    rollup_max_cubes_per_connection: int = 8
+    rollup_mining_interval_seconds: int = 60
+    
+    # Monthly query counts cached in front of the usage_counters table
+    usage_cache_ttl_seconds: int = 30  # Bounds how stale counts from other API processes can be
+    usage_cache_max_users: int = 10000
+    
+    # Query history written in batches by a background thread
+    history_flush_interval_seconds: float = 1.0
+    history_batch_size: int = 500
+    history_max_pending: int = 10000  # Callers write a batch themselves when this many entries are waiting
+    
     # CORS
     cors_origins: List[str] = ["http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:3000"]
     
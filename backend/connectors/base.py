@@ -1,6 +1,19 @@
 from abc import ABC, abstractmethod
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+def execute_pandas_query(df: pd.DataFrame, query: str) -> pd.DataFrame:
+    """Execute a pandas expression against df and return the result as a DataFrame"""
+    local_vars = {"df": df, "pd": pd}
+    exec(f"result = {query}", {"pd": pd}, local_vars)
+    result = local_vars.get("result")
+    
+    if isinstance(result, pd.DataFrame):
+        return result
+    elif isinstance(result, pd.Series):
+        return result.to_frame()
+    else:
+        return pd.DataFrame({"result": [result]})
 
 class BaseConnector(ABC):
     """Base class for all database connectors"""
@@ -24,4 +37,53 @@ class BaseConnector(ABC):
     def close(self):
         """Close the connection"""
         pass
+    
+    @abstractmethod
+    def is_connected(self) -> bool:
+        """Check whether the connector currently holds an open connection"""
+        pass
+    
+    def get_data_version(self, connection_details: dict) -> Optional[str]:
+        """
+        Get a token that changes whenever the underlying data changes.
+        Returns None when the source cannot report a version.
+        """
+        return None
+    
+    def sample(self, connection_details: dict, sample_rows: int) -> Optional[Tuple[pd.DataFrame, int]]:
+        """
+        Draw a uniform random sample of up to sample_rows rows.
+        Returns (sample, population_rows), or None when the source can't be sampled, so callers run queries exactly.
+        """
+        return None
+    
+    def row_count(self, connection_details: dict) -> Optional[int]:
+        """
+        Get the number of rows without reading them, exactly or as a cheap estimate.
+        Returns None when the source can't tell, so callers assume the data is small.
+        """
+        return None
+    
+    def iter_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        Stream the given columns in chunks of up to chunk_rows rows.
+        Used to build sketches and rollups without materializing the whole dataset.
+        """
+        raise NotImplementedError("Chunked reads are not supported for this data source")
+    
+    def discard_cached(self, connection_details: dict):
+        """Drop data cached for this source in memory and on disk (called when its connection goes away)"""
+        pass
+    
+    def iter_appended_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int, since_version: str, data_version: str) -> Optional[Iterator[pd.DataFrame]]:
+        """
+        Stream only the rows appended between since_version and data_version, in chunks of up to chunk_rows rows.
+        Returns None when the source can't tell what changed, so callers rebuild from iter_chunks.
+        """
+        return None
+    
+    def iter_column_chunks(self, connection_details: dict, column: str, chunk_rows: int) -> Iterator[pd.Series]:
+        """Stream a single column in chunks of up to chunk_rows values"""
+        for chunk in self.iter_chunks(connection_details, [column], chunk_rows):
+            yield chunk[column]
 
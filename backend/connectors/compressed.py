@@ -0,0 +1,147 @@
+"""
+Compressed file sources
+Streams gzip/bz2/xz/zstd files and single-file zip archives through a byte counter so size limits apply to
+decompressed data as it is read
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import zipfile
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Leading bytes of each supported format
+MAGIC_NUMBERS = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+    b"PK\x03\x04": "zip",
+}
+COMPRESSION_SUFFIXES = (".gz", ".gzip", ".bz2", ".xz", ".zst", ".zstd", ".zip")
+
+# Containers that can't be read; plain files must not carry these or compression suffixes either,
+# since pandas would otherwise pick a decompressor from the name and bypass the size limit
+UNSUPPORTED_MAGIC_NUMBERS = {
+    b"PK\x05\x06": "empty zip",
+    b"PK\x07\x08": "spanned zip",
+    b"7z\xbc\xaf\x27\x1c": "7z",
+    b"Rar!\x1a\x07": "rar",
+}
+UNSUPPORTED_SUFFIXES = (".tar", ".tgz", ".tbz2", ".txz", ".7z", ".rar")
+TAR_MAGIC_OFFSET = 257
+
+# Decompressed bytes read per step when measuring a file
+READ_BLOCK_BYTES = 1024 * 1024
+
+class DecompressedSizeExceeded(ValueError):
+    """Raised when a compressed file inflates past its size limit"""
+
+class LimitedReader(io.RawIOBase):
+    """Read-only stream that counts bytes read from the wrapped stream and fails past a limit"""
+    
+    def __init__(self, stream: IO[bytes], max_bytes: Optional[int]):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.max_bytes is not None and self.bytes_read > self.max_bytes:
+            raise DecompressedSizeExceeded(f"Decompressed data exceeds the {self.max_bytes / (1024 * 1024):.0f}MB limit")
+        buffer[:len(data)] = data
+        return len(data)
+    
+    def close(self):
+        self.stream.close()
+        super().close()
+
+def detect_compression(file_path: str) -> Optional[str]:
+    """
+    Get the compression format of a file from its magic number, or None if it is a plain file.
+    Raises ValueError for archives that can't be read and for plain files named like compressed ones.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(TAR_MAGIC_OFFSET + 5)
+    for magic, codec in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return codec
+    for magic, container in UNSUPPORTED_MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            raise ValueError(f"Unsupported file format ({container}): {os.path.basename(file_path)}")
+    if head[TAR_MAGIC_OFFSET:TAR_MAGIC_OFFSET + 5] == b"ustar" or file_path.lower().endswith(UNSUPPORTED_SUFFIXES):
+        raise ValueError(f"Unsupported file format (tar or other archive): {os.path.basename(file_path)}")
+    if file_path.lower().endswith(COMPRESSION_SUFFIXES):
+        raise ValueError(f"File name says compressed but the contents aren't a supported format: {os.path.basename(file_path)}")
+    return None
+
+def _open_zip_member(file_path: str) -> IO[bytes]:
+    """Open the only file in a zip archive (the member stream keeps the archive open until it is closed)"""
+    with zipfile.ZipFile(file_path) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) != 1:
+            raise ValueError(f"Zip archives must contain exactly one file, found {len(members)}: {os.path.basename(file_path)}")
+        return archive.open(members[0])
+
+def _open_codec(file_path: str, codec: str) -> IO[bytes]:
+    if codec == "zip":
+        return _open_zip_member(file_path)
+    if codec == "gzip":
+        return gzip.open(file_path, "rb")
+    if codec == "bz2":
+        return bz2.open(file_path, "rb")
+    if codec == "xz":
+        return lzma.open(file_path, "rb")
+    if not ZSTD_AVAILABLE:
+        raise ValueError("zstd files require the zstandard package")
+    return zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), closefd=True)
+
+def open_decompressed(file_path: str, max_bytes: Optional[int] = None) -> LimitedReader:
+    """Open a compressed file as a stream of decompressed bytes, failing once more than max_bytes are read"""
+    codec = detect_compression(file_path)
+    if codec is None:
+        raise ValueError(f"File is not compressed: {file_path}")
+    return LimitedReader(_open_codec(file_path, codec), max_bytes)
+
+@contextmanager
+def open_source(file_path: str, max_bytes: Optional[int] = None) -> Iterator[IO[bytes]]:
+    """
+    Yield a binary stream for pd.read_csv: the plain file, or a size-limited decompressing stream.
+    Streams (unlike paths) never make pandas guess a compression from the file name.
+    """
+    if detect_compression(file_path) is None:
+        with open(file_path, "rb") as f:
+            yield f
+        return
+    with io.BufferedReader(open_decompressed(file_path, max_bytes)) as stream:
+        yield stream
+
+def source_size(file_path: str, max_bytes: Optional[int] = None) -> int:
+    """
+    Get the data size of a file: its decompressed size if compressed, else its size on disk.
+    Compressed files are read only until they pass max_bytes, so the result is capped at max_bytes + 1.
+    """
+    codec = detect_compression(file_path)
+    if codec is None:
+        return os.path.getsize(file_path)
+    limit = None if max_bytes is None else max_bytes + 1
+    with _open_codec(file_path, codec) as stream:
+        total = 0
+        while limit is None or total < limit:
+            block = stream.read(READ_BLOCK_BYTES if limit is None else min(READ_BLOCK_BYTES, limit - total))
+            if not block:
+                break
+            total += len(block)
+        return total
@@ -1,12 +1,106 @@
 import pandas as pd
+import hashlib
+import io
 import os
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from config import settings
 from .base import BaseConnector
+from .compressed import READ_BLOCK_BYTES, detect_compression, open_source
+from .dataset_cache import CachedDataset, dataset_cache
+from .parallel_csv import CSV_READ_OPTIONS, read_csv_parallel
+
+# Rows parsed at a time while sampling a file that isn't cached
+SAMPLE_CHUNK_ROWS = 100000
+
+def read_csv_file(file_path: str, max_decompressed_bytes: Optional[int] = None) -> pd.DataFrame:
+    """Parse a CSV file, across worker processes when it is large"""
+    if detect_compression(file_path) is not None:
+        # Compressed streams can't be split by byte offset, so they are parsed in one streaming pass
+        with open_source(file_path, max_decompressed_bytes) as source:
+            return pd.read_csv(source, **CSV_READ_OPTIONS)
+    if settings.parallel_csv_workers != 1 and os.path.getsize(file_path) >= settings.parallel_csv_min_bytes:
+        return read_csv_parallel(file_path, settings.parallel_csv_workers or None)
+    return pd.read_csv(file_path, **CSV_READ_OPTIONS)
+
+def count_csv_rows(file_path: str, max_decompressed_bytes: Optional[int] = None) -> int:
+    """Count the data rows of a CSV file from its line breaks (line breaks inside quoted values make this an overestimate)"""
+    lines, last = 0, b"\n"
+    with open_source(file_path, max_decompressed_bytes) as source:
+        for block in iter(lambda: source.read(READ_BLOCK_BYTES), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    # The header isn't a row; an unterminated last line is
+    return max(0, lines - 1 + (last != b"\n"))
+
+def chunk_dtypes(file_path: str, columns: List[str], chunk_rows: int, max_decompressed_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Infer column dtypes once from the first chunk of a file, widened so every later chunk parses the same way:
+    integers become nullable Int64 and booleans nullable boolean. Chunks that don't fit raise ValueError.
+    Letting each chunk infer its own dtypes could read the same value as 5 in one chunk and "5" in another.
+    """
+    with open_source(file_path, max_decompressed_bytes) as source:
+        head = pd.read_csv(source, usecols=columns, nrows=chunk_rows, **CSV_READ_OPTIONS)
+    dtypes = {}
+    for column, dtype in head.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            dtypes[column] = "boolean"
+        elif pd.api.types.is_integer_dtype(dtype):
+            dtypes[column] = "Int64"
+        elif pd.api.types.is_float_dtype(dtype):
+            dtypes[column] = "float64"
+        else:
+            dtypes[column] = str
+    return dtypes
+
+def decompressed_limit(connection_details: dict) -> Optional[int]:
+    """
+    Get the most bytes a compressed file may decompress to, or None for no limit.
+    The query route sets max_decompressed_bytes in the details from the owner's plan; the global cap is the fallback.
+    """
+    return connection_details.get("max_decompressed_bytes") or settings.max_decompressed_bytes or None
+
+def file_version(file_path: str) -> str:
+    """Get a data version from file modification time and size"""
+    stat = os.stat(file_path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+# Bytes hashed at each end of the parsed prefix to detect rewrites of an append-only file
+FINGERPRINT_BLOCK_BYTES = 1024 * 1024
+
+def prefix_fingerprint(file_path: str, offset: int) -> str:
+    """Hash the first and last blocks of a file's first offset bytes"""
+    digest = hashlib.sha256(str(offset).encode("utf-8"))
+    with open(file_path, "rb") as f:
+        digest.update(f.read(min(offset, FINGERPRINT_BLOCK_BYTES)))
+        tail_start = max(FINGERPRINT_BLOCK_BYTES, offset - FINGERPRINT_BLOCK_BYTES)
+        if tail_start < offset:
+            f.seek(tail_start)
+            digest.update(f.read(offset - tail_start))
+    return digest.hexdigest()
+
+def ends_with_newline(file_path: str, size: int) -> bool:
+    """Check that a file's first size bytes end with a complete line, so appends start a new row"""
+    if size == 0:
+        return False
+    with open(file_path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+def _compatible_dtypes(existing: pd.Series, appended: pd.Series) -> bool:
+    """Check that concatenating two parses of a column gives the dtype one parse of both would"""
+    if existing.dtype == appended.dtype:
+        return True
+    # int/float widen to float either way; anything else (e.g. text in a numeric column) needs a full parse
+    numeric = pd.api.types.is_numeric_dtype
+    is_bool = pd.api.types.is_bool_dtype
+    return numeric(existing) and numeric(appended) and not is_bool(existing) and not is_bool(appended)
 
 class CSVConnector(BaseConnector):
     def __init__(self):
         self.df = None
         self.file_path = None
+        self.dataset = None
     
     def connect(self, connection_details: dict) -> bool:
         """Connect to CSV file"""
@@ -15,7 +109,20 @@ class CSVConnector(BaseConnector):
             raise ValueError(f"CSV file not found: {self.file_path}")
         
         try:
-            self.df = pd.read_csv(self.file_path)
+            # Parsed data is shared across queries until the file changes; appends only parse the new rows
+            data_version = self.get_data_version(connection_details)
+            self.dataset = dataset_cache.get(
+                os.path.abspath(self.file_path), data_version,
+                lambda: read_csv_file(self.file_path, decompressed_limit(connection_details)),
+                lambda previous: self._read_appended(self.file_path, previous, data_version)
+            )
+            self.df = self.dataset.df
+            # The parsed bytes are known only if the file didn't change while it was read. Without a trailing newline
+            # an append would continue the last row, so such files are always re-parsed.
+            if not self.dataset.source_state and data_version == self.get_data_version(connection_details) and detect_compression(self.file_path) is None:
+                size = os.path.getsize(self.file_path)
+                if ends_with_newline(self.file_path, size):
+                    self.dataset.source_state = {"offset": size, "fingerprint": prefix_fingerprint(self.file_path, size)}
             return True
         except Exception as e:
             raise ValueError(f"Error reading CSV file: {str(e)}")
@@ -25,10 +132,16 @@ class CSVConnector(BaseConnector):
         if self.df is None:
             raise ValueError("Not connected to CSV file")
         
+        # Comparison filters skip row groups that can't match
+        filtered = self.dataset.execute_filter(query) if self.dataset else None
+        if filtered is not None:
+            return filtered
+        
         try:
             # Use eval to execute pandas operations (in a real app, use a safer method)
             # For now, we'll use exec with a controlled environment
-            local_vars = {"df": self.df.copy(), "pd": pd}
+            # A shallow copy: copy-on-write keeps the query's writes off the shared (often read-only mapped) frame
+            local_vars = {"df": self.df.copy(deep=False), "pd": pd}
             exec(f"result = {query}", {"pd": pd}, local_vars)
             result = local_vars.get("result")
             
@@ -51,8 +164,150 @@ class CSVConnector(BaseConnector):
             "dtypes": {col: str(dtype) for col, dtype in self.df.dtypes.items()}
         }
     
+    def is_connected(self) -> bool:
+        """Check if CSV data is loaded"""
+        return self.df is not None
+    
+    def get_data_version(self, connection_details: dict) -> Optional[str]:
+        """Get data version from file modification time and size"""
+        file_path = connection_details.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            return None
+        return file_version(file_path)
+    
+    def sample(self, connection_details: dict, sample_rows: int) -> Tuple[pd.DataFrame, int]:
+        """
+        Sample the CSV file uniformly: from the parsed dataset if it is cached at the current version,
+        otherwise with one streaming pass that keeps at most sample_rows rows plus one chunk in memory
+        """
+        file_path = connection_details.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            raise ValueError(f"CSV file not found: {file_path}")
+        
+        cached = dataset_cache.peek(os.path.abspath(file_path))
+        if cached is not None and cached.data_version == file_version(file_path):
+            population = len(cached.df)
+            return cached.df.sample(n=min(sample_rows, population)).reset_index(drop=True), population
+        
+        # Keeping the rows with the smallest random keys gives a uniform sample without replacement
+        rng = np.random.default_rng()
+        reservoir = None
+        population = 0
+        with open_source(file_path, decompressed_limit(connection_details)) as source:
+            for chunk in pd.read_csv(source, chunksize=SAMPLE_CHUNK_ROWS):
+                population += len(chunk)
+                keys = rng.random(len(chunk))
+                if reservoir is not None and len(reservoir) == sample_rows:
+                    # Once the reservoir is full, only rows beating its largest key can get in
+                    selected = keys < reservoir["__sample_key"].iat[-1]
+                    chunk, keys = chunk[selected], keys[selected]
+                    if chunk.empty:
+                        continue
+                chunk = chunk.assign(__sample_key=keys)
+                reservoir = chunk if reservoir is None else pd.concat([reservoir, chunk], ignore_index=True)
+                reservoir = reservoir.nsmallest(sample_rows, "__sample_key")
+        
+        if reservoir is None:
+            return pd.DataFrame(), 0
+        return reservoir.drop(columns="__sample_key").reset_index(drop=True), population
+    
+    def row_count(self, connection_details: dict) -> Optional[int]:
+        """Get the row count of the parsed dataset if it is current, otherwise count the file's lines"""
+        file_path = connection_details.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            return None
+        cached = dataset_cache.peek(os.path.abspath(file_path))
+        if cached is not None and cached.data_version == file_version(file_path):
+            return len(cached.df)
+        return count_csv_rows(file_path, decompressed_limit(connection_details))
+    
+    def iter_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        Read only the requested columns chunk by chunk: sliced from the parsed dataset if it is current,
+        otherwise parsed from the file with dtypes inferred once for all chunks
+        """
+        file_path = connection_details.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            raise ValueError(f"CSV file not found: {file_path}")
+        
+        cached = dataset_cache.peek(os.path.abspath(file_path))
+        if cached is not None and cached.data_version == file_version(file_path):
+            missing = [col for col in columns if col not in cached.df.columns]
+            if missing:
+                raise ValueError(f"Columns not found: {', '.join(missing)}")
+            values = cached.df[columns]
+            for start in range(0, len(values), chunk_rows):
+                yield values.iloc[start:start + chunk_rows]
+            return
+        
+        limit = decompressed_limit(connection_details)
+        dtypes = chunk_dtypes(file_path, columns, chunk_rows, limit)
+        with open_source(file_path, limit) as source:
+            for chunk in pd.read_csv(source, usecols=columns, dtype=dtypes, chunksize=chunk_rows):
+                yield chunk[columns]
+    
+    def iter_appended_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int, since_version: str, data_version: str) -> Optional[Iterator[pd.DataFrame]]:
+        """
+        Stream rows appended since an earlier version without parsing the whole file: from the cached dataset
+        if it is already at data_version, or by parsing only the new bytes if it is still at since_version.
+        """
+        file_path = connection_details.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            return None
+        cached = dataset_cache.peek(os.path.abspath(file_path))
+        if cached is None:
+            return None
+        if cached.data_version == data_version:
+            start = cached.appended_since(since_version)
+            if start is None:
+                return None
+            df = cached.df
+            return (df.iloc[i:i + chunk_rows][columns] for i in range(start, len(df), chunk_rows))
+        if cached.data_version != since_version:
+            return None
+        appended = self._read_appended(file_path, cached, data_version)
+        if appended is None:
+            return None
+        rows = appended[0]
+        return (rows.iloc[i:i + chunk_rows][columns] for i in range(0, len(rows), chunk_rows))
+    
+    def _read_appended(self, file_path: str, previous: CachedDataset, data_version: Optional[str]) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+        """
+        Parse only the bytes appended between a cached version and data_version.
+        Returns None (forcing a full parse) if the parsed prefix changed or the tail can't be parsed on its own.
+        """
+        state = previous.source_state
+        if not state or detect_compression(file_path) is not None:
+            return None
+        offset = state["offset"]
+        size = os.path.getsize(file_path)
+        # The file must still be at the version being built (bytes written since are left for the next version)
+        if file_version(file_path) != data_version or size <= offset or prefix_fingerprint(file_path, offset) != state["fingerprint"]:
+            return None
+        
+        with open(file_path, "rb") as f:
+            header = f.readline()
+            f.seek(offset)
+            tail = f.read(size - offset)
+        # A partially written last line is picked up by a full parse once the write completes
+        if not tail.endswith(b"\n"):
+            return None
+        rows = pd.read_csv(io.BytesIO(header + tail), **CSV_READ_OPTIONS)
+        if list(rows.columns) != list(previous.df.columns):
+            return None
+        if not all(_compatible_dtypes(previous.df[col], rows[col]) for col in rows.columns):
+            return None
+        return rows, {"offset": size, "fingerprint": prefix_fingerprint(file_path, size)}
+    
+    def discard_cached(self, connection_details: dict):
+        """Drop the cached dataset and its shared snapshot"""
+        file_path = connection_details.get("file_path")
+        if file_path:
+            dataset_cache.discard(os.path.abspath(file_path))
+    
     def close(self):
         """Close CSV connection"""
         self.df = None
         self.file_path = None
+        self.dataset = None
 
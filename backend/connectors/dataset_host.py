@@ -0,0 +1,100 @@
+"""
+Shared dataset hosting
+Dataset snapshots stored as Arrow IPC files and memory-mapped read-only, so every API worker process
+serves the same page-cache pages instead of holding its own copy of each DataFrame's numeric
+(and, on pandas 3, string) columns
+"""
+import os
+import threading
+from typing import Dict, Optional
+import pandas as pd
+from metrics import metrics
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+metrics.describe("dataset_shared_maps_total", "Dataset snapshots memory-mapped from shared files")
+metrics.describe("dataset_shared_mapped_bytes", "Bytes of shared dataset snapshots mapped by this process")
+
+def _to_table(df: pd.DataFrame) -> Optional["pa.Table"]:
+    """Convert a DataFrame to an Arrow table that maps back to the same dtypes, or None if it can't"""
+    if not all(isinstance(name, str) for name in df.columns) or df.columns.has_duplicates:
+        return None
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        return None
+    arrays = {}
+    try:
+        for name, values in df.items():
+            if values.dtype.kind in "iuf":
+                # Plain numpy conversion keeps NaN as a value, so float columns map back without a copy
+                arrays[name] = pa.array(values.to_numpy())
+            else:
+                arrays[name] = pa.array(values, from_pandas=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        # e.g. object columns mixing text and numbers
+        return None
+    return pa.table(arrays)
+
+class SharedDatasetHost:
+    """
+    Publishes dataset snapshots as Arrow files and maps them read-only.
+    The kernel reference-counts the mapped pages: a retired (unlinked) snapshot stays valid for processes
+    that still map it and is freed when the last of them drops it.
+    """
+    
+    def __init__(self):
+        # Snapshot path -> (mappings held by this process, mapped bytes)
+        self._mapped: Dict[str, list] = {}
+        self._lock = threading.Lock()
+    
+    def publish(self, df: pd.DataFrame, path: str) -> bool:
+        """Write a snapshot atomically (readers never see a partial file); returns False if df can't be stored as Arrow"""
+        if not ARROW_AVAILABLE:
+            return False
+        table = _to_table(df)
+        if table is None:
+            return False
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+    
+    def attach(self, path: str) -> pd.DataFrame:
+        """
+        Map a published snapshot. Numeric columns are views of the shared pages, and so are string columns on pandas 3
+        (Arrow-backed str dtype); pandas 2 converts string columns to Python objects in each process.
+        """
+        source = pa.memory_map(path, "r")
+        table = pa.ipc.open_file(source).read_all()
+        # split_blocks keeps each column on its own mapped buffer instead of consolidating into copies
+        df = table.to_pandas(split_blocks=True)
+        with self._lock:
+            entry = self._mapped.setdefault(path, [0, source.size()])
+            if entry[0] == 0:
+                metrics.add_gauge("dataset_shared_mapped_bytes", entry[1])
+            entry[0] += 1
+        metrics.inc("dataset_shared_maps_total")
+        return df
+    
+    def release(self, path: str):
+        """Drop one of this process's references to a mapped snapshot (the pages go once its frames are freed)"""
+        with self._lock:
+            entry = self._mapped.get(path)
+            if entry is None:
+                return
+            entry[0] -= 1
+            if entry[0] <= 0:
+                del self._mapped[path]
+                metrics.add_gauge("dataset_shared_mapped_bytes", -entry[1])
+
+# Shared dataset host for the API process
+dataset_host = SharedDatasetHost()
@@ -0,0 +1,145 @@
+"""
+Secondary indexes for cached file datasets
+Equality lookups in O(matches) via value-to-row-id lists or packed bitmaps, and trigram lookups for text filters
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+def encode_array(array: np.ndarray) -> np.ndarray:
+    """Convert an array to a dtype numpy can save without pickle; raises ValueError for mixed or non-string objects"""
+    if array.dtype.kind != "O":
+        return array
+    if not all(isinstance(item, str) for item in array):
+        raise ValueError("Only string object arrays can be stored")
+    return array.astype(str)
+
+def decode_array(array: np.ndarray) -> np.ndarray:
+    """Undo encode_array: fixed-width strings become Python strings again"""
+    return array.astype(object) if array.dtype.kind == "U" else array
+
+class SecondaryIndex:
+    """Maps each distinct value of a column to the positions of the rows holding it"""
+    
+    def __init__(self, values: pd.Index, total_rows: int, kind: str, data: tuple):
+        self.values = values
+        self.total_rows = total_rows
+        self.kind = kind
+        self.data = data
+    
+    @classmethod
+    def build(cls, column: pd.Series, bitmap_max_cardinality: int) -> "SecondaryIndex":
+        """Build a bitmap index for low-cardinality columns, otherwise a hash (row-id list) index"""
+        codes, uniques = pd.factorize(column, use_na_sentinel=True)
+        total_rows = len(codes)
+        if len(uniques) <= bitmap_max_cardinality:
+            # One bit per row per distinct value
+            bitmaps = np.stack([np.packbits(codes == code) for code in range(len(uniques))]) if len(uniques) else np.empty((0, 0), dtype=np.uint8)
+            return cls(pd.Index(uniques), total_rows, "bitmap", (bitmaps,))
+        
+        # Row ids grouped by value: rows for code k are row_ids[offsets[k]:offsets[k + 1]]
+        dtype = np.int32 if total_rows < 2 ** 31 else np.int64
+        valid = np.flatnonzero(codes >= 0).astype(dtype)
+        row_ids = valid[np.argsort(codes[valid], kind="stable")]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[valid], minlength=len(uniques)))])
+        return cls(pd.Index(uniques), total_rows, "hash", (row_ids, offsets))
+    
+    def lookup(self, value) -> Optional[np.ndarray]:
+        """Get ascending row positions equal to value, or None if the value can't be looked up"""
+        if not pd.api.types.is_scalar(value):
+            # Lists and tuples would be read as several keys (or a MultiIndex key) rather than one value
+            return None
+        try:
+            code = self.values.get_indexer([value])[0]
+        except (TypeError, ValueError):
+            return None
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        if self.kind == "bitmap":
+            return np.flatnonzero(np.unpackbits(self.data[0][code], count=self.total_rows))
+        row_ids, offsets = self.data
+        return row_ids[offsets[code]:offsets[code + 1]]
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Get the index as plain arrays for a sidecar file"""
+        arrays = {"values": encode_array(self.values.to_numpy()), "total_rows": np.array(self.total_rows), "kind": np.array(self.kind)}
+        arrays.update({f"data{i}": array for i, array in enumerate(self.data)})
+        return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "SecondaryIndex":
+        data = tuple(arrays[f"data{i}"] for i in range(sum(name.startswith("data") for name in arrays)))
+        return cls(pd.Index(decode_array(arrays["values"])), int(arrays["total_rows"]), str(arrays["kind"]), data)
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.data)
+
+class NgramIndex:
+    """Trigram inverted index over the distinct values of a string column"""
+    
+    def __init__(self, codes: np.ndarray, lowered: np.ndarray, postings: Dict[str, np.ndarray]):
+        self.codes = codes
+        self.lowered = lowered
+        self.postings = postings
+    
+    @classmethod
+    def build(cls, column: pd.Series) -> "NgramIndex":
+        """Index each distinct value by the lowercase trigrams it contains"""
+        codes, uniques = pd.factorize(column, use_na_sentinel=True)
+        lowered = np.array([value.lower() if isinstance(value, str) else None for value in uniques], dtype=object)
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for value_id, text in enumerate(lowered):
+            if text is None:
+                continue
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                postings[gram].append(value_id)
+        return cls(
+            codes.astype(np.int32 if len(uniques) < 2 ** 31 else np.int64),
+            lowered,
+            {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        )
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Get the index as plain arrays for a sidecar file, with the posting lists concatenated"""
+        nulls = np.array([text is None for text in self.lowered], dtype=bool)
+        grams = list(self.postings)
+        lists = [self.postings[gram] for gram in grams]
+        return {
+            "codes": self.codes,
+            "lowered": np.array(["" if text is None else text for text in self.lowered], dtype=str),
+            "nulls": nulls,
+            "grams": np.array(grams, dtype=str),
+            "offsets": np.cumsum([0] + [len(ids) for ids in lists]),
+            "ids": np.concatenate(lists) if lists else np.empty(0, dtype=np.int32)
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "NgramIndex":
+        lowered = arrays["lowered"].astype(object)
+        lowered[arrays["nulls"]] = None
+        offsets, ids = arrays["offsets"], arrays["ids"]
+        postings = {str(gram): ids[offsets[i]:offsets[i + 1]] for i, gram in enumerate(arrays["grams"])}
+        return cls(arrays["codes"], lowered, postings)
+    
+    def search(self, pattern: str, prefix: bool = False) -> np.ndarray:
+        """Get ascending positions of rows whose value contains (or starts with) pattern, ignoring case"""
+        pattern = pattern.lower()
+        grams = {pattern[i:i + 3] for i in range(len(pattern) - 2)}
+        if grams:
+            # Only values holding every trigram of the pattern can match
+            lists = sorted((self.postings.get(gram, np.empty(0, dtype=np.int32)) for gram in grams), key=len)
+            candidates = lists[0]
+            for ids in lists[1:]:
+                candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        else:
+            candidates = np.arange(len(self.lowered))
+        
+        # Verify the candidate values; -1 (null) codes map to the trailing False slot
+        matched = np.zeros(len(self.lowered) + 1, dtype=bool)
+        for value_id in candidates:
+            text = self.lowered[value_id]
+            if text is not None and (text.startswith(pattern) if prefix else pattern in text):
+                matched[value_id] = True
+        return np.flatnonzero(matched[self.codes])
@@ -1,13 +1,15 @@
 import pandas as pd
 import os
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
 from .base import BaseConnector
+from .dataset_cache import dataset_cache
 
 class ExcelConnector(BaseConnector):
     def __init__(self):
         self.df = None
         self.file_path = None
         self.sheet_name = None
+        self.dataset = None
     
     def connect(self, connection_details: dict) -> bool:
         """Connect to Excel file"""
@@ -18,7 +20,11 @@ class ExcelConnector(BaseConnector):
             raise ValueError(f"Excel file not found: {self.file_path}")
         
         try:
-            self.df = pd.read_excel(self.file_path, sheet_name=self.sheet_name)
+            # Parsed data is shared across queries until the file changes
+            data_version = self.get_data_version(connection_details)
+            key = self._dataset_key(connection_details)
+            self.dataset = dataset_cache.get(key, data_version, lambda: pd.read_excel(self.file_path, sheet_name=self.sheet_name))
+            self.df = self.dataset.df
             return True
         except Exception as e:
             raise ValueError(f"Error reading Excel file: {str(e)}")
@@ -28,8 +34,14 @@ class ExcelConnector(BaseConnector):
         if self.df is None:
             raise ValueError("Not connected to Excel file")
         
+        # Comparison filters skip row groups that can't match
+        filtered = self.dataset.execute_filter(query) if self.dataset else None
+        if filtered is not None:
+            return filtered
+        
         try:
-            local_vars = {"df": self.df.copy(), "pd": pd}
+            # A shallow copy: copy-on-write keeps the query's writes off the shared (often read-only mapped) frame
+            local_vars = {"df": self.df.copy(deep=False), "pd": pd}
             exec(f"result = {query}", {"pd": pd}, local_vars)
             result = local_vars.get("result")
             
@@ -51,8 +63,54 @@ class ExcelConnector(BaseConnector):
             "dtypes": {col: str(dtype) for col, dtype in self.df.dtypes.items()}
         }
     
+    def is_connected(self) -> bool:
+        """Check if Excel data is loaded"""
+        return self.df is not None
+    
+    def get_data_version(self, connection_details: dict) -> Optional[str]:
+        """Get data version from file modification time and size"""
+        file_path = connection_details.get("file_path")
+        if not file_path or not os.path.exists(file_path):
+            return None
+        stat = os.stat(file_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+    
+    def sample(self, connection_details: dict, sample_rows: int) -> Tuple[pd.DataFrame, int]:
+        """Sample rows from the Excel sheet (workbooks can't be read incrementally)"""
+        if self.df is None:
+            self.connect(connection_details)
+        population = len(self.df)
+        return self.df.sample(n=min(sample_rows, population)).reset_index(drop=True), population
+    
+    def row_count(self, connection_details: dict) -> Optional[int]:
+        """Get the row count of the loaded sheet"""
+        if self.df is None:
+            self.connect(connection_details)
+        return len(self.df)
+    
+    def iter_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Slice the requested columns of the loaded sheet into chunks"""
+        if self.df is None:
+            self.connect(connection_details)
+        missing = [col for col in columns if col not in self.df.columns]
+        if missing:
+            raise ValueError(f"Columns not found: {', '.join(missing)}")
+        values = self.df[columns]
+        for start in range(0, len(values), chunk_rows):
+            yield values.iloc[start:start + chunk_rows]
+    
+    def discard_cached(self, connection_details: dict):
+        """Drop the cached sheet and its shared snapshot"""
+        if connection_details.get("file_path"):
+            dataset_cache.discard(self._dataset_key(connection_details))
+    
+    def _dataset_key(self, connection_details: dict) -> str:
+        """Cache key for one sheet of a workbook"""
+        return f"{os.path.abspath(connection_details['file_path'])}#{connection_details.get('sheet_name', 0)}"
+    
     def close(self):
         """Close Excel connection"""
         self.df = None
         self.file_path = None
+        self.dataset = None
 
@@ -4,6 +4,7 @@ from .sql_connector import SQLConnector
 from .mongodb_connector import MongoDBConnector
 from .supabase_connector import SupabaseConnector
 from .firebase_connector import FirebaseConnector
+from .partitioned_connector import PartitionedCSVConnector
 from .base import BaseConnector
 
 def get_connector(connection_type: str) -> BaseConnector:
@@ -16,6 +17,7 @@ def get_connector(connection_type: str) -> BaseConnector:
         "mongodb": MongoDBConnector,
         "supabase": SupabaseConnector,
         "firebase": FirebaseConnector,
+        "partitioned": PartitionedCSVConnector,
     }
     
     connector_class = connectors.get(connection_type.lower())
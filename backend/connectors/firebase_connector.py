@@ -152,6 +152,10 @@ class FirebaseConnector(BaseConnector):
         
         return schema
     
+    def is_connected(self) -> bool:
+        """Check if Firestore client is open"""
+        return self.db is not None
+    
     def close(self):
         """Close Firebase connection"""
         # Firestore client doesn't need explicit closing
@@ -1,7 +1,9 @@
+import time
 import pandas as pd
 from pymongo import MongoClient
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
 from .base import BaseConnector
+from config import settings
 
 class MongoDBConnector(BaseConnector):
     def __init__(self):
@@ -80,6 +82,68 @@ class MongoDBConnector(BaseConnector):
         except Exception as e:
             return {}
     
+    def is_connected(self) -> bool:
+        """Check if MongoDB client is open"""
+        return self.client is not None
+    
+    def get_data_version(self, connection_details: dict) -> Optional[str]:
+        """
+        Get data version from collection stats (document count and data size) and the newest _id.
+        In-place updates change neither, so the version also rolls over every mongodb_data_version_ttl_seconds
+        to bound how long stale results are served.
+        """
+        if self.client is None:
+            self.connect(connection_details)
+        if self.collection is None:
+            return None
+        
+        try:
+            stats = self.db.command("collStats", self.collection.name)
+            newest = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+            bucket = int(time.time() // max(1, settings.mongodb_data_version_ttl_seconds))
+            return f"{stats.get('count', 0)}:{stats.get('size', 0)}:{newest['_id'] if newest else ''}:{bucket}"
+        except Exception:
+            return None
+    
+    def sample(self, connection_details: dict, sample_rows: int) -> Tuple[pd.DataFrame, int]:
+        """Sample documents server-side with $sample"""
+        if self.client is None:
+            self.connect(connection_details)
+        if self.collection is None:
+            raise ValueError("Collection not specified")
+        
+        population = self.collection.estimated_document_count()
+        cursor = self.collection.aggregate([{"$sample": {"size": int(sample_rows)}}])
+        df = pd.DataFrame(list(cursor))
+        if "_id" in df.columns:
+            df = df.drop("_id", axis=1)
+        return df, population
+    
+    def row_count(self, connection_details: dict) -> Optional[int]:
+        """Get the collection's document count from its metadata"""
+        if self.client is None:
+            self.connect(connection_details)
+        if self.collection is None:
+            return None
+        return self.collection.estimated_document_count()
+    
+    def iter_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Project only the requested fields and read documents in batches"""
+        if self.client is None:
+            self.connect(connection_details)
+        if self.collection is None:
+            raise ValueError("Collection not specified")
+        
+        projection = {**{col: 1 for col in columns}, "_id": 0}
+        batch = []
+        for document in self.collection.find({}, projection, batch_size=chunk_rows):
+            batch.append(document)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    
     def close(self):
         """Close MongoDB connection"""
         if self.client:
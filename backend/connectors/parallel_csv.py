@@ -0,0 +1,124 @@
+"""
+Parallel CSV parsing
+Splits a CSV file at newline-aligned byte ranges outside quoted fields and parses the ranges in a process pool
+"""
+import io
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+QUOTE = ord('"')
+
+# Bytes scanned per step when counting quotes, bounding the temporary mask size
+COUNT_BLOCK_BYTES = 64 * 1024 * 1024
+
+# read_csv options for every full parse, serial or parallel: one dtype per column, inferred from all its values,
+# and no decompression picked from the file name (compressed files are detected and streamed by connectors.compressed)
+CSV_READ_OPTIONS = {"low_memory": False, "compression": None}
+
+def _count_quotes(data: np.ndarray, start: int, end: int) -> int:
+    """Count quote characters in data[start:end]"""
+    total = 0
+    for block_start in range(start, end, COUNT_BLOCK_BYTES):
+        total += int(np.count_nonzero(data[block_start:min(end, block_start + COUNT_BLOCK_BYTES)] == QUOTE))
+    return total
+
+def _next_record_start(buffer: mmap.mmap, data: np.ndarray, position: int, in_quotes: bool) -> Tuple[int, int]:
+    """
+    Find the first record boundary at or after position, given the quote state at position.
+    Returns (boundary, quotes seen between position and boundary); boundary is len(buffer) at EOF.
+    """
+    size = len(buffer)
+    quotes = 0
+    while position < size:
+        newline = buffer.find(b"\n", position)
+        if newline < 0:
+            return size, quotes + _count_quotes(data, position, size)
+        quotes += _count_quotes(data, position, newline)
+        # A newline is a record boundary only outside quoted fields ("" escapes keep parity)
+        if (quotes % 2 == 1) == in_quotes:
+            return newline + 1, quotes
+        position = newline + 1
+    return size, quotes
+
+def split_ranges(file_path: str, parts: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    Split a CSV file into about `parts` byte ranges that each start at a record boundary.
+    Returns (header line bytes, [(start, end), ...]) covering all data rows.
+    """
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        size = len(buffer)
+        # Zero-copy view of the mapped file
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        try:
+            header_end, _ = _next_record_start(buffer, data, 0, False)
+            header = buffer[:header_end]
+            
+            ranges = []
+            start = header_end
+            target_size = max(1, (size - header_end) // max(1, parts))
+            while start < size:
+                target = min(size, start + target_size)
+                # Quote parity from the range start tells whether target falls inside a quoted field
+                in_quotes = _count_quotes(data, start, target) % 2 == 1
+                end, _ = _next_record_start(buffer, data, target, in_quotes)
+                ranges.append((start, end))
+                start = end
+            return header, ranges
+        finally:
+            # The mapping can't be closed while a view of it is alive
+            del data
+
+def _parse_range(file_path: str, header: bytes, start: int, end: int, dtype: Optional[dict]) -> pd.DataFrame:
+    """Parse one byte range, with the header line prepended (runs in a worker process)"""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(header + data), dtype=dtype, **CSV_READ_OPTIONS)
+
+def _is_text(values: pd.Series) -> bool:
+    """Check if a parsed column holds text (object or string dtype)"""
+    return pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+
+def _unify_dtypes(file_path: str, header: bytes, ranges: List[Tuple[int, int]], frames: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    """
+    Make per-range dtypes match what a single read_csv pass would infer.
+    Where one range inferred text and another numbers, the numeric ranges are re-read as text.
+    """
+    # Empty ranges carry no type information (every column reads as text)
+    typed = [frame for frame in frames if len(frame)]
+    mixed = [
+        col for col in frames[0].columns
+        if any(_is_text(frame[col]) for frame in typed) and any(not _is_text(frame[col]) for frame in typed)
+    ]
+    if not mixed:
+        return typed or frames[:1]
+    for i, frame in enumerate(frames):
+        if len(frame) and any(not _is_text(frame[col]) for col in mixed):
+            frames[i] = _parse_range(file_path, header, *ranges[i], {col: str for col in mixed})
+    return [frame for frame in frames if len(frame)]
+
+def read_csv_parallel(file_path: str, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Parse a CSV file with a pool of worker processes.
+    Equivalent to pd.read_csv(file_path, **CSV_READ_OPTIONS): each column gets one dtype inferred from all its values.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or os.path.getsize(file_path) == 0:
+        return pd.read_csv(file_path, **CSV_READ_OPTIONS)
+    header, ranges = split_ranges(file_path, workers)
+    if len(ranges) <= 1:
+        return pd.read_csv(file_path, **CSV_READ_OPTIONS)
+    
+    # forkserver children don't inherit locks held by the API process's threads
+    context = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context) as pool:
+        futures = [pool.submit(_parse_range, file_path, header, start, end, None) for start, end in ranges]
+        frames = [future.result() for future in futures]
+    
+    frames = _unify_dtypes(file_path, header, ranges, frames)
+    return pd.concat(frames, ignore_index=True, copy=False)
@@ -0,0 +1,212 @@
+import ast
+import glob
+import hashlib
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional
+import pandas as pd
+from metrics import metrics
+from .base import BaseConnector, execute_pandas_query
+from .compressed import COMPRESSION_SUFFIXES, open_source
+from .csv_connector import chunk_dtypes, count_csv_rows, decompressed_limit, file_version, read_csv_file
+from .dataset_cache import FILTER_PATTERN, dataset_cache
+
+# Group-by plans, e.g. df.groupby('date')['amount'].sum().reset_index()
+GROUPBY_PATTERN = re.compile(r"^df\.groupby\('([^']+)'\)\['([^']+)'\]\.")
+INTEGER_PATTERN = re.compile(r"^-?\d+$")
+GLOB_CHARS = set("*?[")
+
+metrics.describe("partition_files_read_total", "Partition files read by partitioned dataset queries")
+metrics.describe("partition_files_pruned_total", "Partition files skipped by partition pruning")
+
+def discover_files(path: str) -> List[str]:
+    """List the CSV files (plain or compressed) of a partitioned dataset, given its root directory or a glob"""
+    if os.path.isdir(path):
+        suffixes = (".csv",) + tuple(".csv" + suffix for suffix in COMPRESSION_SUFFIXES)
+        return sorted(
+            f for f in glob.glob(os.path.join(path, "**", "*.csv*"), recursive=True)
+            if f.endswith(suffixes) and os.path.isfile(f)
+        )
+    return sorted(f for f in glob.glob(path, recursive=True) if os.path.isfile(f))
+
+def partition_root(path: str) -> str:
+    """Get the directory partition paths are relative to (the part of a glob before any wildcard)"""
+    if os.path.isdir(path):
+        return path
+    parts = []
+    for part in path.split(os.sep):
+        if GLOB_CHARS & set(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+def parse_partition_values(file_path: str, root: str) -> Dict[str, str]:
+    """Read Hive-style key=value directory names between the root and the file"""
+    values = {}
+    for part in os.path.relpath(os.path.dirname(file_path), root).split(os.sep):
+        key, sep, value = part.partition("=")
+        if sep and key:
+            values[key] = value
+    return values
+
+class PartitionedCSVConnector(BaseConnector):
+    """CSV files under Hive-style partition directories, e.g. sales/date=2026-10-16/part-0.csv"""
+    
+    def __init__(self):
+        self.path = None
+        self.files: List[str] = []
+        self.partitions: List[Dict[str, Any]] = []
+        self.partition_keys: List[str] = []
+        self.columns: List[str] = []
+        self.max_decompressed_bytes: Optional[int] = None
+    
+    def connect(self, connection_details: dict) -> bool:
+        """Discover partition files and read the column header (data is read per query)"""
+        self.path = connection_details.get("path") or connection_details.get("file_path")
+        if not self.path:
+            raise ValueError("Partitioned dataset path not specified")
+        self.files = discover_files(self.path)
+        if not self.files:
+            raise ValueError(f"No CSV files found under: {self.path}")
+        self.max_decompressed_bytes = decompressed_limit(connection_details)
+        
+        root = partition_root(self.path)
+        raw = [parse_partition_values(f, root) for f in self.files]
+        self.partition_keys = list(dict.fromkeys(key for values in raw for key in values))
+        # Keys whose values are all integers are typed as integers, the rest stay strings
+        integer_keys = {
+            key for key in self.partition_keys
+            if all(key in values and INTEGER_PATTERN.match(values[key]) for values in raw)
+        }
+        self.partitions = [
+            {key: int(value) if key in integer_keys else value for key, value in values.items()}
+            for values in raw
+        ]
+        
+        try:
+            with open_source(self.files[0], self.max_decompressed_bytes) as source:
+                header = pd.read_csv(source, nrows=0)
+        except Exception as e:
+            raise ValueError(f"Error reading CSV file: {str(e)}")
+        self.columns = [col for col in header.columns if col not in self.partition_keys]
+        return True
+    
+    def execute_query(self, query: str) -> pd.DataFrame:
+        """Execute pandas query on the partition files the plan can match"""
+        if not self.files:
+            raise ValueError("Not connected to partitioned dataset")
+        
+        try:
+            selected = self._prune(query)
+            metrics.inc("partition_files_read_total", len(selected))
+            metrics.inc("partition_files_pruned_total", len(self.files) - len(selected))
+            df = self._load(selected, self._projection(query))
+            return execute_pandas_query(df, query)
+        except Exception as e:
+            raise ValueError(f"Error executing query: {str(e)}")
+    
+    def get_schema(self) -> Dict[str, List[str]]:
+        """Get data columns followed by partition keys"""
+        if not self.files:
+            return {}
+        return {
+            "columns": self.columns + self.partition_keys,
+            "partition_keys": self.partition_keys
+        }
+    
+    def is_connected(self) -> bool:
+        """Check if partition files have been discovered"""
+        return bool(self.files)
+    
+    def get_data_version(self, connection_details: dict) -> Optional[str]:
+        """Get data version from the file list and each file's modification time and size"""
+        path = connection_details.get("path") or connection_details.get("file_path")
+        if not path:
+            return None
+        files = discover_files(path)
+        if not files:
+            return None
+        return hashlib.sha256(repr([(f, file_version(f)) for f in files]).encode("utf-8")).hexdigest()
+    
+    def row_count(self, connection_details: dict) -> Optional[int]:
+        """Count the rows of every partition file from its line breaks"""
+        if not self.files:
+            self.connect(connection_details)
+        return sum(count_csv_rows(file_path, self.max_decompressed_bytes) for file_path in self.files)
+    
+    def iter_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Read the requested columns file by file, adding partition values from the path"""
+        if not self.files:
+            self.connect(connection_details)
+        data_columns = [col for col in columns if col in self.columns] or self.columns[:1]
+        # Every file is parsed with the dtypes of the first, so values group the same way across partitions
+        dtypes = chunk_dtypes(self.files[0], data_columns, chunk_rows, self.max_decompressed_bytes)
+        for file_path, values in zip(self.files, self.partitions):
+            with open_source(file_path, self.max_decompressed_bytes) as source:
+                for chunk in pd.read_csv(source, usecols=data_columns, dtype=dtypes, chunksize=chunk_rows):
+                    yield chunk.assign(**{key: values.get(key) for key in self.partition_keys})[columns]
+    
+    def discard_cached(self, connection_details: dict):
+        """Drop the cached dataset and shared snapshot of every partition file"""
+        path = connection_details.get("path") or connection_details.get("file_path")
+        if path:
+            for file_path in discover_files(path):
+                dataset_cache.discard(os.path.abspath(file_path))
+    
+    def close(self):
+        """Close partitioned dataset"""
+        self.path = None
+        self.files = []
+        self.partitions = []
+        self.partition_keys = []
+        self.columns = []
+        self.max_decompressed_bytes = None
+    
+    def _prune(self, query: str) -> List[int]:
+        """Get the files a comparison filter on a partition key can match (all files for other plans)"""
+        everything = list(range(len(self.files)))
+        match = FILTER_PATTERN.match(query)
+        if match is None or match.group(1) not in self.partition_keys:
+            return everything
+        column, op, literal = match.groups()
+        try:
+            value = ast.literal_eval(literal)
+        except (ValueError, SyntaxError):
+            return everything
+        
+        selected = []
+        for i, values in enumerate(self.partitions):
+            # Files without the key read it as null, which never matches a comparison
+            if column not in values:
+                continue
+            try:
+                if op == ">":
+                    matches = values[column] > value
+                elif op == "<":
+                    matches = values[column] < value
+                else:
+                    matches = values[column] == value
+            except TypeError:
+                return everything
+            if matches:
+                selected.append(i)
+        return selected
+    
+    def _projection(self, query: str) -> Optional[List[str]]:
+        """Get the data columns a group-by on a partition key needs, or None for all columns"""
+        match = GROUPBY_PATTERN.match(query)
+        if match and match.group(1) in self.partition_keys and match.group(2) in self.columns:
+            return [match.group(2)]
+        return None
+    
+    def _load(self, selected: List[int], columns: Optional[List[str]]) -> pd.DataFrame:
+        """Load the selected files (each cached per file version) with partition columns attached"""
+        frames = []
+        for i in selected:
+            file_path = self.files[i]
+            dataset = dataset_cache.get(os.path.abspath(file_path), file_version(file_path), lambda: read_csv_file(file_path, self.max_decompressed_bytes))
+            frame = dataset.df if columns is None else dataset.df[columns]
+            frames.append(frame.assign(**{key: self.partitions[i].get(key) for key in self.partition_keys}))
+        if not frames:
+            return pd.DataFrame(columns=(columns or self.columns) + self.partition_keys)
+        return pd.concat(frames, ignore_index=True)
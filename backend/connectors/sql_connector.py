@@ -1,6 +1,9 @@
 import pandas as pd
 from sqlalchemy import create_engine, text
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import time
+from config import settings
 from .base import BaseConnector
 
 class SQLConnector(BaseConnector):
@@ -75,6 +78,89 @@ class SQLConnector(BaseConnector):
             # Fallback for MySQL or other databases
             return {}
     
+    def is_connected(self) -> bool:
+        """Check if database engine is open"""
+        return self.engine is not None
+    
+    def get_data_version(self, connection_details: dict) -> Optional[str]:
+        """
+        Get data version from table modification counters.
+        MySQL only has estimates (InnoDB table_rows, update_time that can be NULL or cached for a day), so its
+        version also rolls over every mysql_data_version_ttl_seconds to bound how long stale results are served.
+        """
+        if self.engine is None:
+            self.connect(connection_details)
+        
+        if self.engine.dialect.name == "postgresql":
+            # Cumulative insert/update/delete counters for all user tables
+            query = """
+            SELECT COUNT(*), COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)
+            FROM pg_stat_user_tables
+            """
+        else:
+            query = """
+            SELECT COUNT(*), COALESCE(SUM(table_rows), 0), MAX(update_time)
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE()
+            """
+        
+        try:
+            with self.engine.connect() as conn:
+                row = tuple(conn.execute(text(query)).fetchone())
+            if self.engine.dialect.name != "postgresql":
+                row += (int(time.time() // max(1, settings.mysql_data_version_ttl_seconds)),)
+            return hashlib.sha256(repr(row).encode("utf-8")).hexdigest()
+        except Exception:
+            return None
+    
+    def _resolve_table(self, connection_details: dict) -> str:
+        """Get the quoted name of the configured table, or the first table in the schema"""
+        table = connection_details.get("table") or next(iter(self.get_schema()), None)
+        if not table:
+            raise ValueError("No table available")
+        return self.engine.dialect.identifier_preparer.quote(table)
+    
+    def sample(self, connection_details: dict, sample_rows: int) -> Tuple[pd.DataFrame, int]:
+        """Sample rows server-side (TABLESAMPLE on Postgres, ORDER BY RAND() on MySQL)"""
+        if self.engine is None:
+            self.connect(connection_details)
+        
+        quoted_table = self._resolve_table(connection_details)
+        
+        with self.engine.connect() as conn:
+            population = conn.execute(text(f"SELECT COUNT(*) FROM {quoted_table}")).scalar() or 0
+        if population == 0:
+            return pd.DataFrame(), 0
+        
+        if self.engine.dialect.name == "postgresql":
+            # BERNOULLI samples individual rows; oversample slightly and trim to size
+            percent = min(100.0, sample_rows / population * 100 * 1.1)
+            query = f"SELECT * FROM {quoted_table} TABLESAMPLE BERNOULLI ({percent})"
+        else:
+            query = f"SELECT * FROM {quoted_table} ORDER BY RAND() LIMIT {int(sample_rows)}"
+        df = pd.read_sql(query, self.engine)
+        return df.head(sample_rows), population
+    
+    def row_count(self, connection_details: dict) -> Optional[int]:
+        """Count the rows of the configured table"""
+        if self.engine is None:
+            self.connect(connection_details)
+        
+        quoted_table = self._resolve_table(connection_details)
+        with self.engine.connect() as conn:
+            return conn.execute(text(f"SELECT COUNT(*) FROM {quoted_table}")).scalar() or 0
+    
+    def iter_chunks(self, connection_details: dict, columns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Select only the requested columns and fetch them in chunks"""
+        if self.engine is None:
+            self.connect(connection_details)
+        
+        quoted_table = self._resolve_table(connection_details)
+        quoted_columns = ", ".join(self.engine.dialect.identifier_preparer.quote(col) for col in columns)
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(text(f"SELECT {quoted_columns} FROM {quoted_table}"), conn, chunksize=chunk_rows):
+                yield chunk
+    
     def close(self):
         """Close database connection"""
         if self.engine:
@@ -1,12 +1,51 @@
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 from config import settings
+from metadata_store import create_async_metadata_engine, create_metadata_engine
 
-engine = create_engine(settings.database_url, connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {})
+engine = create_metadata_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async sessions for routes that only read and write metadata, so lookups don't block the event loop.
+# Objects stay loaded after commit; lazy loads aren't possible outside the session's awaits.
+# Backends without an installed asyncio driver get ThreadedSession instead.
+async_engine = create_async_metadata_engine(settings.database_url)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False) if async_engine else None
+ThreadedSessionLocal = sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
+
+class ThreadedSession:
+    """The AsyncSession methods the routes use, running a sync session's database calls in the threadpool"""
+    
+    def __init__(self, session: Session):
+        self._session = session
+    
+    def add(self, instance):
+        self._session.add(instance)
+    
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(self._session.execute, *args, **kwargs)
+    
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self._session.scalar, *args, **kwargs)
+    
+    async def refresh(self, instance):
+        await run_in_threadpool(self._session.refresh, instance)
+    
+    async def delete(self, instance):
+        await run_in_threadpool(self._session.delete, instance)
+    
+    async def commit(self):
+        await run_in_threadpool(self._session.commit)
+    
+    async def rollback(self):
+        await run_in_threadpool(self._session.rollback)
+    
+    async def close(self):
+        await run_in_threadpool(self._session.close)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -14,6 +53,17 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        db = ThreadedSession(ThreadedSessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
@@ -0,0 +1,2 @@
+# Execution package
+
@@ -0,0 +1,159 @@
+"""
+Query admission control
+Bounds concurrent query execution and admits waiting queries by plan with weighted fair queuing.
+Queries wait on the event loop, so a full queue never ties up threadpool threads.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict
+from metrics import metrics
+from plan_limits import MAX_CONCURRENT_QUERIES, get_admission_policy
+
+metrics.describe("query_admission_queue_depth", "Queries waiting for an execution slot")
+metrics.describe("query_admission_in_flight", "Queries holding an execution slot")
+metrics.describe("query_admission_admitted_total", "Queries admitted to an execution slot")
+metrics.describe("query_admission_wait_seconds_total", "Total time admitted queries waited for a slot")
+metrics.describe("query_admission_rejected_total", "Queries rejected because the queue was full or the wait too long")
+
+# Weight of the latest query duration in the running average used for Retry-After
+SERVICE_TIME_SMOOTHING = 0.2
+
+class AdmissionRejected(Exception):
+    """A query could not get an execution slot; retry_after is a suggested wait in seconds"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionTicket:
+    """A query's place in line, and then its execution slot"""
+    
+    def __init__(self, plan: str, finish_tag: float, granted_future: asyncio.Future):
+        self.plan = plan
+        self.finish_tag = finish_tag
+        self.granted = False
+        self.granted_future = granted_future
+        # The request plus any background run still using the slot (see AdmissionScheduler.hold)
+        self.holders = 1
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+
+class AdmissionScheduler:
+    """
+    Fixed pool of execution slots shared by all plans.
+    Each plan has a FIFO queue; freed slots go to the queue head with the smallest weighted-fair-queuing
+    finish tag, so under contention plans get slots in proportion to their weights.
+    """
+    
+    def __init__(self, total_slots: int):
+        self.total_slots = total_slots
+        self._queues: Dict[str, Deque[AdmissionTicket]] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._last_finish_tag: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._running = 0
+        self._service_seconds = 1.0
+        # Short critical sections only: taken on the event loop by acquire and in worker threads by release
+        self._lock = threading.Lock()
+    
+    async def acquire(self, plan: str) -> AdmissionTicket:
+        """Wait for an execution slot, or raise AdmissionRejected if the plan's queue is full or the wait runs out"""
+        policy = get_admission_policy(plan)
+        with self._lock:
+            queue = self._queues.setdefault(plan, deque())
+            if len(queue) >= policy["max_queued"]:
+                raise self._reject(plan, "queue_full", f"Too many {plan} plan queries are waiting to run.")
+            
+            # A plan's finish tags advance by 1 / weight per query, so heavier plans are served more often
+            finish_tag = max(self._virtual_time, self._last_finish_tag.get(plan, 0.0)) + 1.0 / policy["weight"]
+            self._last_finish_tag[plan] = finish_tag
+            ticket = AdmissionTicket(plan, finish_tag, asyncio.get_running_loop().create_future())
+            queue.append(ticket)
+            self._dispatch()
+        
+        if not ticket.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.granted_future), policy["max_wait_seconds"])
+            except asyncio.TimeoutError:
+                with self._lock:
+                    # A slot granted just as the wait ran out is still taken
+                    if not ticket.granted:
+                        queue.remove(ticket)
+                        self._update_gauges(plan)
+                        raise self._reject(plan, "timeout", "The server is busy and the query could not start in time.")
+            except asyncio.CancelledError:
+                # The request went away while waiting
+                with self._lock:
+                    if ticket.granted:
+                        self._release(ticket, time.monotonic())
+                    else:
+                        queue.remove(ticket)
+                        self._update_gauges(plan)
+                raise
+        
+        ticket.admitted_at = time.monotonic()
+        metrics.inc("query_admission_admitted_total", plan=plan)
+        metrics.inc("query_admission_wait_seconds_total", ticket.admitted_at - ticket.enqueued_at, plan=plan)
+        return ticket
+    
+    def hold(self, ticket: AdmissionTicket) -> Callable[[], None]:
+        """Keep a ticket's slot taken until the returned function is called too, e.g. by a run that outlives its request"""
+        with self._lock:
+            ticket.holders += 1
+        return lambda: self.release(ticket)
+    
+    def release(self, ticket: AdmissionTicket):
+        """Drop a hold on a slot; the last one gives it back and admits the next waiting query (safe from any thread)"""
+        with self._lock:
+            ticket.holders -= 1
+            if ticket.holders == 0:
+                self._release(ticket, ticket.admitted_at)
+    
+    def _release(self, ticket: AdmissionTicket, admitted_at: float):
+        """Free a granted slot and dispatch it (caller holds the lock)"""
+        self._in_flight[ticket.plan] -= 1
+        self._running -= 1
+        duration = time.monotonic() - admitted_at
+        self._service_seconds += SERVICE_TIME_SMOOTHING * (duration - self._service_seconds)
+        self._update_gauges(ticket.plan)
+        self._dispatch()
+    
+    def _dispatch(self):
+        """Grant free slots to the eligible queue heads with the smallest finish tags (caller holds the lock)"""
+        while self._running < self.total_slots:
+            heads = [
+                queue[0] for plan, queue in self._queues.items()
+                if queue and self._in_flight.get(plan, 0) < get_admission_policy(plan)["max_concurrent"]
+            ]
+            if not heads:
+                break
+            ticket = min(heads, key=lambda head: head.finish_tag)
+            self._queues[ticket.plan].popleft()
+            ticket.granted = True
+            self._virtual_time = ticket.finish_tag
+            self._in_flight[ticket.plan] = self._in_flight.get(ticket.plan, 0) + 1
+            self._running += 1
+            self._update_gauges(ticket.plan)
+            # Wake the waiter on its event loop; release may run in a worker thread
+            ticket.granted_future.get_loop().call_soon_threadsafe(_set_granted, ticket.granted_future)
+    
+    def _update_gauges(self, plan: str):
+        metrics.set_gauge("query_admission_queue_depth", len(self._queues.get(plan, ())), plan=plan)
+        metrics.set_gauge("query_admission_in_flight", self._in_flight.get(plan, 0), plan=plan)
+    
+    def _reject(self, plan: str, reason: str, message: str) -> AdmissionRejected:
+        """Build a rejection with a Retry-After estimate from queue depth and recent query durations (caller holds the lock)"""
+        metrics.inc("query_admission_rejected_total", plan=plan, reason=reason)
+        queued = sum(len(queue) for queue in self._queues.values())
+        retry_after = max(1, math.ceil(self._service_seconds * (queued + 1) / max(1, self.total_slots)))
+        return AdmissionRejected(f"{message} Please retry in {retry_after} second(s).", retry_after)
+
+def _set_granted(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
+
+# Shared admission scheduler for the API process
+admission_scheduler = AdmissionScheduler(MAX_CONCURRENT_QUERIES)
@@ -0,0 +1,144 @@
+"""
+Query resource governor
+Per-plan memory, wall-clock and CPU-time budgets for query execution
+"""
+import threading
+from typing import Any, Callable, Optional
+import pandas as pd
+from metrics import metrics
+
+metrics.describe("query_governor_rejections_total", "Queries stopped by the resource governor")
+metrics.describe("query_governor_abandoned_running", "Timed-out in-process queries still running in the background")
+
+class QueryLimitExceeded(Exception):
+    """A query went over its plan's resource budget"""
+    status_code = 413
+    kind = "memory"
+
+class QueryMemoryLimitExceeded(QueryLimitExceeded):
+    status_code = 413
+    kind = "memory"
+
+class QueryTimeLimitExceeded(QueryLimitExceeded):
+    status_code = 408
+    kind = "time"
+
+class QueryBudget:
+    """Resource ceilings for one query (None means unlimited)"""
+    
+    def __init__(self, memory_bytes: Optional[int] = None, wall_seconds: Optional[float] = None, cpu_seconds: Optional[float] = None):
+        self.memory_bytes = memory_bytes
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+    
+    @classmethod
+    def from_limits(cls, limits: dict) -> "QueryBudget":
+        """Build a budget from a PLAN_LIMITS entry (-1 means unlimited)"""
+        def limit(key: str, scale: float = 1):
+            value = limits.get(key, -1)
+            return None if value == -1 else value * scale
+        memory = limit("max_query_memory_mb", 1024 * 1024)
+        return cls(
+            int(memory) if memory is not None else None,
+            limit("max_query_seconds"),
+            limit("max_query_cpu_seconds")
+        )
+    
+    def to_dict(self) -> dict:
+        return {"memory_bytes": self.memory_bytes, "wall_seconds": self.wall_seconds, "cpu_seconds": self.cpu_seconds}
+
+def estimate_query_memory(df: pd.DataFrame, query: str) -> int:
+    """Estimate the peak bytes a pandas plan allocates on top of the loaded frame"""
+    frame_bytes = int(df.memory_usage(index=False, deep=False).sum())
+    # Connectors run plans on a working copy of the frame
+    estimate = frame_bytes
+    if "groupby(" in query:
+        # Group codes plus the sort indexer, one int64 each per row
+        estimate += len(df) * 16
+    if query.startswith("df[") or "sort_values(" in query or "merge(" in query:
+        # Boolean masks, filtered and sorted copies can be as large as the frame
+        estimate += frame_bytes
+    return estimate
+
+def check_estimate(df: Optional[pd.DataFrame], query: str, budget: QueryBudget):
+    """Refuse plans whose estimated memory is over budget before they start"""
+    if df is None or budget.memory_bytes is None:
+        return
+    estimate = estimate_query_memory(df, query)
+    if estimate > budget.memory_bytes:
+        raise QueryMemoryLimitExceeded(
+            f"Query needs about {estimate / (1024 * 1024):.0f}MB, over the plan's "
+            f"{budget.memory_bytes / (1024 * 1024):.0f}MB per-query memory limit. Filter the data or upgrade your plan."
+        )
+
+def check_result(result: pd.DataFrame, budget: QueryBudget):
+    """Refuse results larger than the memory budget"""
+    if budget.memory_bytes is None:
+        return
+    size = int(result.memory_usage(index=True, deep=False).sum())
+    if size > budget.memory_bytes:
+        raise QueryMemoryLimitExceeded(
+            f"Query result is {size / (1024 * 1024):.0f}MB, over the plan's "
+            f"{budget.memory_bytes / (1024 * 1024):.0f}MB per-query memory limit. Narrow the query or upgrade your plan."
+        )
+
+def memory_exceeded(budget: QueryBudget) -> QueryMemoryLimitExceeded:
+    """Error for a query that ran out of its memory allowance while executing"""
+    return QueryMemoryLimitExceeded(
+        f"Query ran out of its {budget.memory_bytes / (1024 * 1024):.0f}MB per-query memory limit. "
+        "Filter the data or upgrade your plan."
+    )
+
+def time_exceeded(budget: QueryBudget, cpu: bool = False) -> QueryTimeLimitExceeded:
+    """Error for a query that ran past its wall-clock or CPU-time allowance"""
+    seconds = budget.cpu_seconds if cpu else budget.wall_seconds
+    error = QueryTimeLimitExceeded(
+        f"Query exceeded the plan's {seconds:g}s {'CPU time' if cpu else 'time'} limit. "
+        "Narrow the query or upgrade your plan."
+    )
+    if cpu:
+        error.kind = "cpu"
+    return error
+
+def run_with_deadline(fn: Callable[[], Any], budget: QueryBudget, hold: Optional[Callable[[], Callable[[], None]]] = None) -> Any:
+    """
+    Run fn, answering with QueryTimeLimitExceeded once the wall-clock budget is spent.
+    This is a response deadline, not enforcement: in-process pandas work can't be interrupted, so a timed-out
+    run keeps going in the background and its result is dropped (the worker pool kills the worker instead).
+    hold, if given, is called before fn starts and returns a function called once fn has finished, so the caller's
+    resources (its admission slot) stay taken while an abandoned run is still using the CPU.
+    """
+    if budget.wall_seconds is None:
+        return fn()
+    
+    outcome = {}
+    state = {"done": False, "abandoned": False}
+    lock = threading.Lock()
+    finished = threading.Event()
+    release = hold() if hold else None
+    
+    def target():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            with lock:
+                state["done"] = True
+                if state["abandoned"]:
+                    metrics.add_gauge("query_governor_abandoned_running", -1)
+            finished.set()
+            if release:
+                release()
+    
+    threading.Thread(target=target, name="governed-query", daemon=True).start()
+    finished.wait(budget.wall_seconds)
+    with lock:
+        if not state["done"]:
+            state["abandoned"] = True
+            metrics.add_gauge("query_governor_abandoned_running", 1)
+    if state["abandoned"]:
+        raise time_exceeded(budget)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
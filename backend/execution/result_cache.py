@@ -0,0 +1,127 @@
+"""
+Query result cache
+Caches executed query results keyed by connection, plan hash and source data version
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import pandas as pd
+from config import settings
+
+# Time-to-live (seconds) for cached results, per query plan operation
+PLAN_TTLS = {
+    "select": 600,
+    "top_n": 600,
+    "filter": 600,
+    "count": 900,
+    "average": 900,
+    "sum": 900,
+    "max": 900,
+    "min": 900,
+    "median": 900,
+    "trend": 900,
+    "comparison": 1800,
+    "statistical": 1800,
+}
+
+def plan_hash(executed_query: str) -> str:
+    """Get a stable hash of an executed query plan"""
+    return hashlib.sha256(executed_query.encode("utf-8")).hexdigest()
+
+def get_plan_ttl(parsed_query: Dict[str, Any], data_version: Optional[str]) -> int:
+    """Get cache TTL for a parsed query plan"""
+    ttl = PLAN_TTLS.get(parsed_query.get("operation"), settings.result_cache_default_ttl_seconds)
+    if data_version is None:
+        # Without a data version, the TTL is the only invalidation we have
+        ttl = min(ttl, settings.result_cache_unversioned_ttl_seconds)
+    return ttl
+
+def estimate_size(df: pd.DataFrame) -> int:
+    """Estimate memory footprint of a DataFrame in bytes"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+class QueryResultCache:
+    """Byte-bounded LRU cache of query result DataFrames"""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[Tuple, Tuple[pd.DataFrame, int, float]]" = OrderedDict()
+        self._schemas: Dict[int, Tuple[str, Dict]] = {}
+        self._lock = threading.Lock()
+    
+    def make_key(self, connection_id: int, executed_query: str, data_version: Optional[str]) -> Tuple:
+        """Build a cache key for a query on a connection"""
+        return (connection_id, plan_hash(executed_query), data_version)
+    
+    def get(self, key: Tuple) -> Optional[pd.DataFrame]:
+        """Get a cached result, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            df, size, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return df
+    
+    def put(self, key: Tuple, df: pd.DataFrame, ttl: int):
+        """Store a result, evicting least recently used entries to stay within the byte budget"""
+        size = estimate_size(df)
+        if size > self.max_bytes or ttl <= 0:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # Entries for older data versions of the same plan can never be hit again
+            for stale_key in [k for k in self._entries if k[:2] == key[:2]]:
+                self._remove(stale_key)
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+            self._entries[key] = (df, size, time.monotonic() + ttl)
+            self.current_bytes += size
+    
+    def get_schema(self, connection_id: int, data_version: Optional[str]) -> Optional[Dict]:
+        """Get cached schema for a connection at a data version"""
+        if data_version is None:
+            return None
+        with self._lock:
+            entry = self._schemas.get(connection_id)
+            if entry and entry[0] == data_version:
+                return entry[1]
+            return None
+    
+    def put_schema(self, connection_id: int, data_version: Optional[str], schema: Dict):
+        """Cache schema for a connection at a data version"""
+        if data_version is None:
+            return
+        with self._lock:
+            self._schemas[connection_id] = (data_version, schema)
+    
+    def invalidate_connection(self, connection_id: int):
+        """Drop all cached results and schema for a connection"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == connection_id]:
+                self._remove(key)
+            self._schemas.pop(connection_id, None)
+    
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self._schemas.clear()
+            self.current_bytes = 0
+    
+    def _remove(self, key: Tuple):
+        """Remove an entry (caller must hold the lock)"""
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+# Shared cache for the API process
+result_cache = QueryResultCache(settings.result_cache_max_bytes)
@@ -0,0 +1,185 @@
+"""
+Server-side query result store
+Holds materialized query results behind an opaque token so pages can be fetched without re-executing.
+Tokens and spill files belong to the API process that stored them, so paging needs a single uvicorn worker
+or sticky sessions; on any other worker later pages answer 404.
+"""
+import atexit
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import pandas as pd
+from config import settings
+from execution.result_cache import estimate_size
+
+class _StoredResult:
+    """A stored result, held in memory or spilled to disk"""
+    
+    def __init__(self, user_id: int, df: pd.DataFrame, size: int, expires_at: float):
+        self.user_id = user_id
+        self.df = df
+        self.size = size
+        self.total_rows = len(df)
+        self.expires_at = expires_at
+        self.spill_path: Optional[str] = None
+        # Being written to disk by a put that no longer holds the lock
+        self.spilling = False
+
+class ResultStore:
+    """TTL-bound result store that spills least recently used results to disk"""
+    
+    def __init__(self, max_memory_bytes: int, ttl_seconds: int, spill_dir: str = ""):
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory_bytes = 0
+        self._spilling_bytes = 0
+        self._spill_root = spill_dir or None
+        self._spill_dir: Optional[str] = None
+        self._results: "OrderedDict[str, _StoredResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._purger: Optional[threading.Thread] = None
+    
+    def put(self, df: pd.DataFrame, user_id: int) -> str:
+        """Store a result and return its token"""
+        token = secrets.token_urlsafe(24)
+        entry = _StoredResult(user_id, df, estimate_size(df), time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            self._purge_expired()
+            self._results[token] = entry
+            self.memory_bytes += entry.size
+            spills = self._choose_spills(keep=token)
+            if self._purger is None:
+                # Expired results are also dropped while nobody is storing or reading results
+                self._purger = threading.Thread(target=self._run_purger, name="result-store-purger", daemon=True)
+                self._purger.start()
+        self._spill(spills)
+        return token
+    
+    def get(self, token: str, user_id: int) -> Optional[pd.DataFrame]:
+        """Get a full stored result, or None if the token is unknown, expired or owned by another user"""
+        page = self.get_page(token, user_id, 0, None)
+        return page[0] if page else None
+    
+    def get_page(self, token: str, user_id: int, cursor: int, page_size: Optional[int]) -> Optional[Tuple[pd.DataFrame, int]]:
+        """
+        Get a page of rows starting at cursor.
+        Returns (page, total_rows), or None if the token is unknown, expired or owned by another user.
+        """
+        with self._lock:
+            self._purge_expired()
+            entry = self._results.get(token)
+            if entry is None or entry.user_id != user_id:
+                return None
+            self._results.move_to_end(token)
+            # Browsing keeps the result alive
+            entry.expires_at = time.monotonic() + self.ttl_seconds
+            df, spill_path = entry.df, entry.spill_path
+        
+        if df is None:
+            # Read the spilled result without holding the lock
+            try:
+                df = pd.read_pickle(spill_path)
+            except OSError:
+                # Expired and deleted meanwhile
+                return None
+            with self._lock:
+                if self._results.get(token) is entry and entry.df is None:
+                    entry.df = df
+                    self.memory_bytes += entry.size
+                spills = self._choose_spills(keep=token)
+            self._spill(spills)
+        end = cursor + page_size if page_size is not None else None
+        return df.iloc[cursor:end], entry.total_rows
+    
+    def close(self):
+        """Drop every result and delete the spill directory"""
+        with self._lock:
+            for entry in self._results.values():
+                self._discard(entry)
+            self._results.clear()
+            spill_dir, self._spill_dir = self._spill_dir, None
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+    
+    def _choose_spills(self, keep: str) -> List[Tuple[str, _StoredResult, pd.DataFrame, str, bool]]:
+        """
+        Pick least recently used in-memory results to spill until within budget (caller holds the lock).
+        Returns (token, entry, frame, spill path, whether the file still has to be written) for each.
+        """
+        excess = self.memory_bytes - self._spilling_bytes - self.max_memory_bytes
+        spills = []
+        for token, entry in self._results.items():
+            if excess <= 0:
+                break
+            if token == keep or entry.df is None or entry.spilling:
+                continue
+            entry.spilling = True
+            self._spilling_bytes += entry.size
+            excess -= entry.size
+            path = entry.spill_path or os.path.join(self._get_spill_dir(), f"{token}.pkl")
+            spills.append((token, entry, entry.df, path, entry.spill_path is None))
+        return spills
+    
+    def _spill(self, spills: List[Tuple[str, _StoredResult, pd.DataFrame, str, bool]]):
+        """Write chosen results to disk without holding the lock, then drop them from memory"""
+        for token, entry, df, path, write in spills:
+            written = True
+            if write:
+                try:
+                    df.to_pickle(path)
+                except OSError:
+                    written = False
+            with self._lock:
+                entry.spilling = False
+                self._spilling_bytes -= entry.size
+                if not written:
+                    continue
+                if self._results.get(token) is not entry:
+                    # Expired or evicted while being written
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                entry.spill_path = path
+                if entry.df is not None:
+                    entry.df = None
+                    self.memory_bytes -= entry.size
+    
+    def _run_purger(self):
+        interval = max(1, min(60, self.ttl_seconds))
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                self._purge_expired()
+    
+    def _purge_expired(self):
+        """Drop expired results (caller holds the lock)"""
+        now = time.monotonic()
+        for token in [t for t, e in self._results.items() if e.expires_at <= now]:
+            self._discard(self._results.pop(token))
+    
+    def _discard(self, entry: _StoredResult):
+        """Release memory and spill file of a removed result (caller holds the lock)"""
+        if entry.df is not None:
+            self.memory_bytes -= entry.size
+            entry.df = None
+        if entry.spill_path and os.path.exists(entry.spill_path):
+            os.remove(entry.spill_path)
+    
+    def _get_spill_dir(self) -> str:
+        """Create the per-process spill directory on first use (caller holds the lock)"""
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="query_results_", dir=self._spill_root)
+        return self._spill_dir
+
+# Shared result store for the API process
+result_store = ResultStore(
+    settings.result_store_max_memory_bytes,
+    settings.result_store_ttl_seconds,
+    settings.result_store_spill_dir
+)
+atexit.register(result_store.close)
@@ -0,0 +1,198 @@
+"""
+Rollup cubes
+Pre-aggregates the group-by queries that show up most in query history so they can be answered without a scan
+"""
+import copy
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy.orm import Session
+from config import settings
+from connectors.base import BaseConnector
+from execution.single_flight import query_flights
+from metrics import metrics
+from models import QueryHistory
+
+# Plans produced by AdvancedQueryEngine for "<agg> <measure> by <dimension>" and trend queries
+ROLLUP_PATTERN = re.compile(r"^df\.groupby\('([^']+)'\)\['([^']+)'\]\.(sum|mean|min|max|count)\(\)\.reset_index\(\)$")
+
+# Rows read per chunk when building cubes
+ROLLUP_CHUNK_ROWS = 200000
+
+metrics.describe("query_rollup_hits_total", "Group-by queries answered from a rollup cube")
+metrics.describe("query_rollup_builds_total", "Passes over a data source to build rollup cubes")
+metrics.describe("query_rollup_appends_total", "Rollup cubes brought up to date from appended rows only")
+
+class RollupCube:
+    """Sum, count, min and max of one measure per dimension value"""
+    
+    def __init__(self, dimension: str, measure: str):
+        self.dimension = dimension
+        self.measure = measure
+        self.stats: Optional[pd.DataFrame] = None
+        self.rows = 0
+    
+    def update(self, chunk: pd.DataFrame):
+        """Fold a chunk of source rows into the cube (partial aggregates merge, so chunks can arrive in any order)"""
+        if not pd.api.types.is_numeric_dtype(chunk[self.measure]):
+            raise ValueError(f"Measure column is not numeric: {self.measure}")
+        partial = chunk.groupby(self.dimension)[self.measure].agg(["sum", "count", "min", "max"])
+        if self.stats is None:
+            self.stats = partial
+        else:
+            self.stats = pd.concat([self.stats, partial]).groupby(level=0).agg(
+                {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+            )
+        self.rows += len(chunk)
+    
+    def answer(self, agg: str) -> pd.DataFrame:
+        """Build the same frame as df.groupby(dimension)[measure].<agg>().reset_index()"""
+        if self.stats is None:
+            return pd.DataFrame(columns=[self.dimension, self.measure])
+        if agg == "mean":
+            values = self.stats["sum"] / self.stats["count"]
+        else:
+            values = self.stats[agg]
+        return values.rename(self.measure).rename_axis(self.dimension).reset_index()
+
+class RollupManager:
+    """Mines query history for hot (dimension, measure) pairs and keeps a cube for each per connection"""
+    
+    def __init__(self):
+        # connection_id -> (dimension, measure) -> (data_version, cube or None if the pair can't be rolled up)
+        self._cubes: Dict[int, Dict[Tuple[str, str], Tuple[str, Optional[RollupCube]]]] = {}
+        self._hot: Dict[int, Tuple[float, List[Tuple[str, str]]]] = {}
+        self._lock = threading.Lock()
+    
+    def hot_combinations(self, db: Session, connection_id: int) -> List[Tuple[str, str]]:
+        """Get the (dimension, measure) pairs grouped on most often in recent history for a connection"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._hot.get(connection_id)
+            if cached and now - cached[0] < settings.rollup_mining_interval_seconds:
+                return cached[1]
+        
+        rows = db.query(QueryHistory.executed_query).filter(
+            QueryHistory.source_id == connection_id,
+            QueryHistory.executed_query.isnot(None)
+        ).order_by(QueryHistory.id.desc()).limit(settings.rollup_history_window).all()
+        
+        counts = Counter()
+        for (executed_query,) in rows:
+            match = ROLLUP_PATTERN.match(executed_query)
+            if match:
+                counts[(match.group(1), match.group(2))] += 1
+        hot = [
+            combination
+            for combination, hits in counts.most_common(settings.rollup_max_cubes_per_connection)
+            if hits >= settings.rollup_min_hits
+        ]
+        
+        with self._lock:
+            self._hot[connection_id] = (now, hot)
+        return hot
+    
+    def answer(self, connector: BaseConnector, connection_id: int, connection_details: dict, data_version: Optional[str], parsed_query: Dict, db: Session) -> Optional[pd.DataFrame]:
+        """
+        Answer a group-by plan from its rollup cube, building or refreshing cubes as needed.
+        Returns None when the plan isn't a hot group-by or the source can't be rolled up.
+        """
+        match = ROLLUP_PATTERN.match(parsed_query["query"])
+        # Without a data version there is no way to tell when a cube goes stale
+        if match is None or data_version is None:
+            return None
+        dimension, measure, agg = match.groups()
+        hot = self.hot_combinations(db, connection_id)
+        if (dimension, measure) not in hot:
+            return None
+        
+        entry = self._get(connection_id, (dimension, measure), data_version)
+        if entry is None:
+            try:
+                # Concurrent requests for the same connection and version share one build pass
+                query_flights.do(
+                    ("rollup", connection_id, data_version),
+                    lambda: self._refresh(connector, connection_id, connection_details, data_version, hot)
+                )
+            except (NotImplementedError, ValueError):
+                return None
+            entry = self._get(connection_id, (dimension, measure), data_version)
+        if entry is None or entry[1] is None:
+            return None
+        
+        metrics.inc("query_rollup_hits_total")
+        return entry[1].answer(agg)
+    
+    def invalidate_connection(self, connection_id: int):
+        """Drop cubes and mined history for a connection"""
+        with self._lock:
+            self._cubes.pop(connection_id, None)
+            self._hot.pop(connection_id, None)
+    
+    def _get(self, connection_id: int, combination: Tuple[str, str], data_version: str) -> Optional[Tuple[str, Optional[RollupCube]]]:
+        """Get the cube entry for a pair if it is current"""
+        with self._lock:
+            entry = self._cubes.get(connection_id, {}).get(combination)
+            return entry if entry and entry[0] == data_version else None
+    
+    def _refresh(self, connector: BaseConnector, connection_id: int, connection_details: dict, data_version: str, hot: List[Tuple[str, str]]):
+        """Bring stale cubes for all hot pairs up to date: from appended rows where possible, else in a single pass"""
+        stale = [combination for combination in hot if self._get(connection_id, combination, data_version) is None]
+        if not stale:
+            return
+        with self._lock:
+            previous = dict(self._cubes.get(connection_id, {}))
+        
+        cubes: Dict[Tuple[str, str], Optional[RollupCube]] = {}
+        rebuild = []
+        for combination in stale:
+            entry = previous.get(combination)
+            appended = None
+            if entry and entry[1] is not None:
+                appended = connector.iter_appended_chunks(connection_details, list(combination), ROLLUP_CHUNK_ROWS, entry[0], data_version)
+            if appended is None:
+                rebuild.append(combination)
+                continue
+            # Update a copy so readers of the older version keep consistent numbers
+            cube = copy.copy(entry[1])
+            try:
+                for chunk in appended:
+                    cube.update(chunk)
+            except ValueError:
+                cube = None
+            cubes[combination] = cube
+            metrics.inc("query_rollup_appends_total")
+        
+        if rebuild:
+            cubes.update(self._build(connector, connection_details, rebuild))
+        
+        with self._lock:
+            current = self._cubes.setdefault(connection_id, {})
+            # Pairs that cooled off are dropped to keep the per-connection cube count bounded
+            for combination in [c for c in current if c not in hot]:
+                del current[combination]
+            for combination, cube in cubes.items():
+                current[combination] = (data_version, cube)
+    
+    def _build(self, connector: BaseConnector, connection_details: dict, combinations: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[RollupCube]]:
+        """Build cubes for several pairs in a single pass over the needed columns (None for pairs that can't be rolled up)"""
+        cubes = {combination: RollupCube(*combination) for combination in combinations}
+        failed = set()
+        columns = list(dict.fromkeys(col for combination in combinations for col in combination))
+        
+        metrics.inc("query_rollup_builds_total")
+        for chunk in connector.iter_chunks(connection_details, columns, ROLLUP_CHUNK_ROWS):
+            for combination, cube in cubes.items():
+                if combination in failed:
+                    continue
+                try:
+                    cube.update(chunk)
+                except ValueError:
+                    failed.add(combination)
+        return {combination: None if combination in failed else cube for combination, cube in cubes.items()}
+
+# Shared rollup manager for the API process
+rollup_manager = RollupManager()
@@ -0,0 +1,190 @@
+"""
+Approximate query execution
+Runs query plans on a per-connection random sample and reports 95% confidence intervals
+"""
+import math
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import settings
+from connectors.base import BaseConnector, execute_pandas_query
+
+Z_95 = 1.96
+
+GROUPBY_PATTERN = re.compile(r"df\.groupby\('([^']+)'\)")
+AGGREGATE_PATTERN = re.compile(r"\['([^']+)'\]\.(mean|sum)\(\)")
+MEDIAN_PATTERN = re.compile(r"^df\['([^']+)'\]\.median\(\)$")
+COUNT_PATTERN = re.compile(r"^df\['([^']+)'\]\.count\(\)$")
+
+class SampleStore:
+    """Per-connection random samples, reused until the source data version changes"""
+    
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._samples: Dict[int, Tuple[Optional[str], pd.DataFrame, int, float]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, connection_id: int, data_version: Optional[str]) -> Optional[Tuple[pd.DataFrame, int]]:
+        """Get (sample, population_rows) if a current sample exists"""
+        with self._lock:
+            entry = self._samples.get(connection_id)
+            if entry is None:
+                return None
+            version, sample, population, created_at = entry
+            if version != data_version or time.monotonic() - created_at > self.ttl_seconds:
+                del self._samples[connection_id]
+                return None
+            return sample, population
+    
+    def put(self, connection_id: int, data_version: Optional[str], sample: pd.DataFrame, population: int):
+        """Store the sample for a connection"""
+        with self._lock:
+            self._samples[connection_id] = (data_version, sample, population, time.monotonic())
+    
+    def invalidate_connection(self, connection_id: int):
+        """Drop the sample for a connection"""
+        with self._lock:
+            self._samples.pop(connection_id, None)
+
+# Shared sample store for the API process
+sample_store = SampleStore(settings.approximate_sample_ttl_seconds)
+
+def _fpc(n: int, population: int) -> float:
+    """Finite population correction"""
+    if population <= 1 or n >= population:
+        return 0.0
+    return math.sqrt((population - n) / (population - 1))
+
+def _interval(label: Any, estimate: float, half_width: float) -> Dict[str, Any]:
+    """Build a symmetric confidence interval"""
+    return {
+        "label": str(label),
+        "estimate": float(estimate),
+        "lower": float(estimate - half_width),
+        "upper": float(estimate + half_width)
+    }
+
+def _estimate_proportion_total(matches: int, n: int, population: int, label: str) -> Dict[str, Any]:
+    """Estimate a population count from the number of matching sample rows"""
+    p = matches / n
+    half_width = Z_95 * math.sqrt(p * (1 - p) / n) * _fpc(n, population) * population
+    return _interval(label, p * population, half_width)
+
+def _estimate_aggregate(sample: pd.DataFrame, population: int, value_col: str, agg: str, group_col: Optional[str]) -> Tuple[pd.DataFrame, List[Dict]]:
+    """Estimate mean/sum (optionally per group) with normal-approximation confidence intervals"""
+    n = len(sample)
+    fpc = _fpc(n, population)
+    values = pd.to_numeric(sample[value_col], errors="coerce")
+    groups = [(None, pd.Series(True, index=sample.index))]
+    if group_col:
+        groups = [(key, sample[group_col] == key) for key in sample[group_col].dropna().unique()]
+    
+    estimates, intervals = [], []
+    for key, mask in groups:
+        if agg == "mean":
+            x = values[mask].dropna()
+            estimate = x.mean() if len(x) else float("nan")
+            half_width = Z_95 * x.std() / math.sqrt(len(x)) * fpc if len(x) > 1 else float("nan")
+        else:
+            # Sum of a masked variable over the whole sample, scaled to the population
+            y = values.where(mask, 0).fillna(0)
+            estimate = y.mean() * population
+            half_width = Z_95 * y.std() / math.sqrt(n) * fpc * population if n > 1 else float("nan")
+        estimates.append(estimate)
+        intervals.append(_interval(value_col if key is None else key, estimate, half_width))
+    
+    if group_col:
+        result = pd.DataFrame({group_col: [key for key, _ in groups], value_col: estimates})
+        return result.sort_values(group_col).reset_index(drop=True), sorted(intervals, key=lambda i: i["label"])
+    return pd.DataFrame({"result": estimates}), intervals
+
+def _estimate_median(sample: pd.DataFrame, column: str) -> Tuple[pd.DataFrame, List[Dict]]:
+    """Estimate a median with a distribution-free order-statistic interval"""
+    values = np.sort(pd.to_numeric(sample[column], errors="coerce").dropna().to_numpy())
+    n = len(values)
+    if n == 0:
+        return pd.DataFrame({"result": [float("nan")]}), []
+    offset = Z_95 * math.sqrt(n) / 2
+    lower = values[max(0, int(math.floor(n / 2 - offset)))]
+    upper = values[min(n - 1, int(math.ceil(n / 2 + offset)))]
+    median = float(np.median(values))
+    return pd.DataFrame({"result": [median]}), [{"label": column, "estimate": median, "lower": float(lower), "upper": float(upper)}]
+
+def estimate(sample: pd.DataFrame, population: int, parsed_query: Dict) -> Optional[Tuple[pd.DataFrame, List[Dict], int]]:
+    """
+    Run a parsed query plan on a sample and scale it to the population.
+    Returns (result, confidence_intervals, estimated total rows of the exact result), or None if the plan has no sample-based estimator.
+    """
+    query = parsed_query["query"]
+    operation = parsed_query.get("operation")
+    n = len(sample)
+    if n == 0:
+        return None
+    
+    aggregate = AGGREGATE_PATTERN.search(query)
+    if aggregate and operation in ("average", "sum", "trend"):
+        group = GROUPBY_PATTERN.search(query)
+        result, intervals = _estimate_aggregate(sample, population, aggregate.group(1), aggregate.group(2), group.group(1) if group else None)
+        return result, intervals, len(result)
+    
+    median = MEDIAN_PATTERN.match(query)
+    if median:
+        return _estimate_median(sample, median.group(1)) + (1,)
+    
+    if query == "len(df)":
+        return pd.DataFrame({"result": [population]}), [], 1
+    
+    count = COUNT_PATTERN.match(query)
+    if count:
+        interval = _estimate_proportion_total(int(sample[count.group(1)].notna().sum()), n, population, count.group(1))
+        return pd.DataFrame({"result": [interval["estimate"]]}), [interval], 1
+    
+    if operation == "filter":
+        # Matching sample rows stand in for the full result; the match count is scaled up
+        result = execute_pandas_query(sample, query)
+        interval = _estimate_proportion_total(len(result), n, population, "matching rows")
+        return result, [interval], int(round(interval["estimate"]))
+    
+    return None
+
+def run_approximate(connector: BaseConnector, connection_id: int, connection_details: dict, data_version: Optional[str], parsed_query: Dict) -> Optional[Dict[str, Any]]:
+    """
+    Answer a parsed query from the connection's sample.
+    Returns None when the plan or the source doesn't support approximation, so the caller runs it exactly.
+    """
+    cached = sample_store.get(connection_id, data_version)
+    sample_cached = cached is not None
+    if cached is None:
+        cached = connector.sample(connection_details, settings.approximate_sample_rows)
+        if cached is None:
+            return None
+        sample_store.put(connection_id, data_version, *cached)
+    sample, population = cached
+    
+    estimated = estimate(sample, population, parsed_query)
+    if estimated is None:
+        return None
+    result_df, intervals, total_rows = estimated
+    return {
+        "result": result_df,
+        "total_rows": total_rows,
+        "intervals": intervals,
+        "sample_rows": len(sample),
+        "population_rows": population,
+        "sample_cached": sample_cached
+    }
+
+def describe_intervals(intervals: List[Dict], limit: int = 5) -> str:
+    """Format confidence intervals for the query summary"""
+    parts = []
+    for interval in intervals[:limit]:
+        if math.isnan(interval["lower"]) or math.isnan(interval["upper"]):
+            parts.append(f"{interval['label']}: {interval['estimate']:,.2f}")
+        else:
+            parts.append(f"{interval['label']}: {interval['estimate']:,.2f} ({interval['lower']:,.2f} to {interval['upper']:,.2f})")
+    if len(intervals) > limit:
+        parts.append(f"... {len(intervals) - limit} more")
+    return "; ".join(parts)
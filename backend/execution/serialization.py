@@ -0,0 +1,168 @@
+"""
+Query result serialization
+Wire formats for query results that avoid building full Python row lists in memory
+"""
+import io
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator
+import numpy as np
+import pandas as pd
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+COLUMNAR_JSON_MEDIA_TYPE = "application/vnd.columnar+json"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Rows serialized per streamed chunk
+STREAM_CHUNK_ROWS = 5000
+
+# Significant digits for floats written by DataFrame.to_json (pandas' maximum; its default is 10)
+JSON_DOUBLE_PRECISION = 15
+
+def _default(obj: Any) -> Any:
+    """Convert pandas/numpy objects the JSON encoder doesn't handle natively"""
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict(orient="records")
+    if isinstance(obj, pd.Series):
+        return obj.to_dict()
+    if isinstance(obj, pd.Timestamp):
+        return None if pd.isna(obj) else obj.isoformat()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def _replace_nan(obj: Any) -> Any:
+    """Replace NaN/inf with None for the stdlib json fallback"""
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return {key: _replace_nan(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_replace_nan(value) for value in obj]
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray, np.floating)):
+        return _replace_nan(_default(obj))
+    return obj
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode content as JSON, handling DataFrames, numpy types and timestamps natively.
+    NaN and NaT become null; datetimes become ISO strings.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(_replace_nan(content), default=_default, allow_nan=False).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response that encodes DataFrames and numpy values directly.
+    Return it from an endpoint to skip Pydantic validation and jsonable_encoder.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def accepts(accept_header: str, media_type: str) -> bool:
+    """Check if an Accept header lists a media type"""
+    if not accept_header:
+        return False
+    return any(part.split(";")[0].strip() == media_type for part in accept_header.split(","))
+
+def negotiate_format(accept_header: str) -> str:
+    """
+    Pick the result wire format for an Accept header.
+    Falls back to plain JSON; raises ValueError if only Arrow is acceptable and pyarrow is missing.
+    """
+    if accepts(accept_header, ARROW_STREAM_MEDIA_TYPE):
+        if ARROW_AVAILABLE:
+            return ARROW_STREAM_MEDIA_TYPE
+        if not any(accepts(accept_header, t) for t in (COLUMNAR_JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE, JSON_MEDIA_TYPE, "*/*")):
+            raise ValueError("Arrow output requires pyarrow. Install with: pip install pyarrow")
+    for media_type in (COLUMNAR_JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE):
+        if accepts(accept_header, media_type):
+            return media_type
+    return JSON_MEDIA_TYPE
+
+def iter_ndjson(header: Dict[str, Any], df: pd.DataFrame, chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a JSON header line followed by the DataFrame rows as NDJSON, one chunk at a time"""
+    yield (json.dumps(header, default=str) + "\n").encode("utf-8")
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_json(orient="records", lines=True, date_format="iso", double_precision=JSON_DOUBLE_PRECISION).encode("utf-8")
+
+def ndjson_response(header: Dict[str, Any], df: pd.DataFrame, headers: Dict[str, str] = None) -> StreamingResponse:
+    """Stream a query result as NDJSON: summary header first, then all rows"""
+    return StreamingResponse(iter_ndjson(header, df), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+def columnar_json(df: pd.DataFrame) -> str:
+    """Serialize a DataFrame as {"columns": [...], "data": [[...]]} straight from its buffers"""
+    # orient="values" is much faster than orient="split" for mixed dtypes
+    columns = json.dumps([str(col) for col in df.columns])
+    return f'{{"columns": {columns}, "data": {df.to_json(orient="values", date_format="iso", double_precision=JSON_DOUBLE_PRECISION)}}}'
+
+def columnar_json_response(fields: Dict[str, Any], df: pd.DataFrame, headers: Dict[str, str] = None) -> Response:
+    """Return response fields with the rows embedded as columnar JSON under the results key"""
+    head = json.dumps(fields, default=str)
+    separator = ", " if fields else ""
+    body = f'{head[:-1]}{separator}"results": {columnar_json(df)}}}'
+    return Response(content=body.encode("utf-8"), media_type=COLUMNAR_JSON_MEDIA_TYPE, headers=headers)
+
+def arrow_schema(df: pd.DataFrame, metadata: Dict[str, Any] = None) -> "pa.Schema":
+    """Infer the Arrow schema of a DataFrame, with JSON-encoded metadata attached"""
+    if not ARROW_AVAILABLE:
+        raise ValueError("Arrow output requires pyarrow. Install with: pip install pyarrow")
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    if metadata:
+        schema = schema.with_metadata({
+            **(schema.metadata or {}),
+            **{key: json.dumps(value, default=str) for key, value in metadata.items()}
+        })
+    return schema
+
+def iter_arrow_stream(df: pd.DataFrame, schema: "pa.Schema", chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield an Arrow IPC stream of the DataFrame, one record batch at a time"""
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, schema)
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    writer.close()
+    yield buffer.getvalue()
+
+def arrow_response(metadata: Dict[str, Any], df: pd.DataFrame, headers: Dict[str, str] = None) -> StreamingResponse:
+    """Stream a query result as Arrow IPC, with response fields stored in the schema metadata"""
+    # Infer the schema up front so conversion errors surface before the response starts
+    schema = arrow_schema(df, metadata)
+    return StreamingResponse(iter_arrow_stream(df, schema), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
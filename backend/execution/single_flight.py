@@ -0,0 +1,71 @@
+"""
+Single-flight request coalescing
+Concurrent identical queries wait on one in-flight execution and share its result
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+from metrics import metrics
+
+metrics.describe("query_singleflight_executions_total", "Query executions started by a single-flight leader")
+metrics.describe("query_singleflight_shared_total", "Queries answered by waiting on an identical in-flight execution")
+metrics.describe("query_singleflight_waiters", "Requests currently waiting on an in-flight execution")
+
+class _Call:
+    """An in-flight execution shared by concurrent callers"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution"""
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once per key among concurrent callers.
+        Returns (result, shared) where shared is True if the result came from another caller's execution.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+        
+        if not leader:
+            metrics.add_gauge("query_singleflight_waiters", 1)
+            try:
+                call.done.wait()
+            finally:
+                metrics.add_gauge("query_singleflight_waiters", -1)
+            metrics.inc("query_singleflight_shared_total")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        metrics.inc("query_singleflight_executions_total")
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+    
+    def in_flight(self) -> int:
+        """Number of executions currently in flight"""
+        with self._lock:
+            return len(self._calls)
+
+# Shared coalescer for query execution
+query_flights = SingleFlight()
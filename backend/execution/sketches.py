@@ -0,0 +1,240 @@
+"""
+Mergeable column sketches
+HyperLogLog for distinct counts and t-digest for medians/percentiles, built chunk by chunk in constant memory
+"""
+import copy
+import math
+import threading
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import settings
+from connectors.base import BaseConnector
+
+# Rows read per chunk when building sketches
+SKETCH_CHUNK_ROWS = 200000
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch (relative error about 1.04 / sqrt(2 ** precision))"""
+    
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = np.zeros(self.num_registers, dtype=np.uint8)
+        self.rows = 0  # Rows seen, nulls included
+    
+    def add(self, values: pd.Series):
+        """Add a chunk of values (nulls are ignored)"""
+        self.rows += len(values)
+        values = values.dropna()
+        if values.empty:
+            return
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remaining = hashes << np.uint64(self.precision)
+        # Rank = position of the leftmost 1-bit in the remaining bits
+        bit_length = np.floor(np.log2(np.maximum(remaining, 1).astype(np.float64))).astype(np.int64) + 1
+        rank = np.where(remaining == 0, 64 - self.precision + 1, 64 - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+    
+    def merge(self, other: "HyperLogLog"):
+        """Merge another sketch with the same precision into this one"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.rows += other.rows
+    
+    def count(self) -> int:
+        """Estimate the number of distinct values"""
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+    
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.num_registers)
+
+class TDigest:
+    """Merging t-digest for quantile estimation, accurate at the tails"""
+    
+    def __init__(self, compression: int = 400):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self.rows = 0  # Rows seen, nulls included
+    
+    def add(self, values: pd.Series):
+        """Add a chunk of numeric values (nulls and non-numeric values are ignored)"""
+        self.rows += len(values)
+        values = pd.to_numeric(values, errors="coerce").dropna().to_numpy(dtype=np.float64)
+        if values.size == 0:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(values.size)]))
+    
+    def merge(self, other: "TDigest"):
+        """Merge another digest into this one"""
+        self.rows += other.rows
+        if other.weights.size == 0:
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+    
+    def quantile(self, q: float) -> float:
+        """Estimate the q-th quantile (0 <= q <= 1)"""
+        if self.weights.size == 0:
+            return float("nan")
+        if self.weights.size == 1:
+            return float(self.means[0])
+        total = self.weights.sum()
+        # Interpolate between centroid centers, anchored at the observed min and max
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centers, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * total, positions, values))
+    
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        """Merge sorted points into centroids whose k-scale span is at most 1"""
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        # k1 scale function: small centroids near the tails, large ones in the middle
+        k = self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1))
+        bins = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.diff(bins, prepend=-1))
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+class SketchStore:
+    """Per-column sketches, reused until the source data version changes"""
+    
+    def __init__(self):
+        self._sketches: Dict[Tuple[int, str, str], Tuple[Optional[str], Any]] = {}
+        # Source row counts that decided whether a sketch is worth building, per connection
+        self._row_counts: Dict[int, Tuple[str, Optional[int]]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, connection_id: int, column: str, kind: str, data_version: Optional[str]) -> Optional[Any]:
+        with self._lock:
+            entry = self._sketches.get((connection_id, column, kind))
+            if entry and entry[0] == data_version and data_version is not None:
+                return entry[1]
+            return None
+    
+    def get_any_version(self, connection_id: int, column: str, kind: str) -> Optional[Tuple[Optional[str], Any]]:
+        """Get (data_version, sketch) for a column whatever version it was built at"""
+        with self._lock:
+            return self._sketches.get((connection_id, column, kind))
+    
+    def put(self, connection_id: int, column: str, kind: str, data_version: Optional[str], sketch: Any):
+        with self._lock:
+            self._sketches[(connection_id, column, kind)] = (data_version, sketch)
+    
+    def get_row_count(self, connector: BaseConnector, connection_id: int, connection_details: dict, data_version: Optional[str]) -> Optional[int]:
+        """Get the source's row count, counted once per data version (None if the source can't tell)"""
+        with self._lock:
+            entry = self._row_counts.get(connection_id)
+        if entry is not None and data_version is not None and entry[0] == data_version:
+            return entry[1]
+        rows = connector.row_count(connection_details)
+        if data_version is not None:
+            with self._lock:
+                self._row_counts[connection_id] = (data_version, rows)
+        return rows
+    
+    def invalidate_connection(self, connection_id: int):
+        """Drop all sketches for a connection"""
+        with self._lock:
+            for key in [k for k in self._sketches if k[0] == connection_id]:
+                del self._sketches[key]
+            self._row_counts.pop(connection_id, None)
+
+# Shared sketch store for the API process
+sketch_store = SketchStore()
+
+def build_sketch(connector: BaseConnector, connection_details: dict, column: str, kind: str) -> Any:
+    """Build a sketch by streaming a column chunk by chunk, merging per-chunk sketches"""
+    sketch = HyperLogLog() if kind == "hll" else TDigest()
+    for chunk in connector.iter_column_chunks(connection_details, column, SKETCH_CHUNK_ROWS):
+        chunk_sketch = HyperLogLog() if kind == "hll" else TDigest()
+        chunk_sketch.add(chunk)
+        sketch.merge(chunk_sketch)
+    return sketch
+
+def extend_sketch(connector: BaseConnector, connection_details: dict, column: str, since_version: str, data_version: str, sketch: Any) -> Optional[Any]:
+    """Fold rows appended since a sketch's version into a copy of it, or return None if the source can't tell"""
+    appended = connector.iter_appended_chunks(connection_details, [column], SKETCH_CHUNK_ROWS, since_version, data_version)
+    if appended is None:
+        return None
+    sketch = copy.deepcopy(sketch)
+    for chunk in appended:
+        chunk_sketch = HyperLogLog() if isinstance(sketch, HyperLogLog) else TDigest()
+        chunk_sketch.add(chunk[column])
+        sketch.merge(chunk_sketch)
+    return sketch
+
+def run_sketch(connector: BaseConnector, connection_id: int, connection_details: dict, data_version: Optional[str], parsed_query: Dict, approximate: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Answer distinct-count, median and percentile plans from column sketches, when approximate results were asked for
+    or the source has at least settings.sketch_min_rows rows.
+    Returns None when the plan isn't sketchable, the source can't stream columns or an exact answer is cheap enough
+    (including when the source can't report its row count).
+    """
+    operation = parsed_query.get("operation")
+    if operation == "distinct_count" and not parsed_query.get("group_column"):
+        column, kind = parsed_query.get("column"), "hll"
+    elif operation == "percentile":
+        column, kind = parsed_query.get("column"), "tdigest"
+    elif operation == "median" and parsed_query["query"] == f"df['{parsed_query.get('agg_column')}'].median()":
+        column, kind = parsed_query.get("agg_column"), "tdigest"
+    else:
+        return None
+    if not column:
+        return None
+    
+    sketch = sketch_store.get(connection_id, column, kind, data_version)
+    sketch_cached = sketch is not None
+    if sketch is None:
+        # Small sources get the exact answer, so check the row count before streaming the column
+        if not approximate:
+            rows = sketch_store.get_row_count(connector, connection_id, connection_details, data_version)
+            if rows is None or rows < settings.sketch_min_rows:
+                return None
+        try:
+            # Append-only sources only need the new rows folded into the previous sketch
+            previous = sketch_store.get_any_version(connection_id, column, kind) if data_version is not None else None
+            if previous is not None and previous[0] is not None:
+                sketch = extend_sketch(connector, connection_details, column, previous[0], data_version, previous[1])
+            if sketch is None:
+                sketch = build_sketch(connector, connection_details, column, kind)
+        except (NotImplementedError, ValueError):
+            # ValueError: a chunk didn't fit the dtypes inferred for the column, so the exact path decides
+            return None
+        sketch_store.put(connection_id, column, kind, data_version, sketch)
+    
+    # A sketch built for an approximate query may cover a column too small for exact queries to use it
+    if not approximate and sketch.rows < settings.sketch_min_rows:
+        return None
+    
+    if kind == "hll":
+        value = sketch.count()
+        summary = f"About {value:,} distinct values of {column} (HyperLogLog estimate, ±{sketch.relative_error * 100:.1f}%)."
+    else:
+        q = parsed_query.get("quantile", 0.5)
+        value = sketch.quantile(q)
+        summary = f"{column} p{q * 100:g} is about {value:,.2f} (t-digest estimate over {len(sketch.weights)} centroids)."
+    
+    return {
+        "result": pd.DataFrame({"result": [value]}),
+        "summary": summary,
+        "sketch_cached": sketch_cached
+    }
@@ -0,0 +1,286 @@
+"""
+Query worker processes
+Runs pandas plans for file connections in long-lived worker processes that keep datasets loaded,
+routing each connection to the same worker and returning large results through shared memory
+"""
+import atexit
+import hashlib
+import itertools
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+from config import settings
+from execution.governor import QueryBudget, QueryLimitExceeded, check_estimate, check_result, memory_exceeded, time_exceeded
+from metrics import metrics
+
+try:
+    import resource
+    RESOURCE_LIMITS_AVAILABLE = hasattr(resource, "RLIMIT_DATA")
+except ImportError:
+    RESOURCE_LIMITS_AVAILABLE = False
+
+# Connection types whose plans run on in-memory DataFrames (database connectors push work to the database)
+WORKER_CONNECTION_TYPES = {"csv", "excel", "partitioned"}
+
+# Most workers started when query_worker_processes is -1
+AUTO_MAX_WORKERS = 4
+
+# Results whose array buffers total less than this are sent inline over the pipe
+SHARED_MEMORY_MIN_BYTES = 1024 * 1024
+
+# Shared memory blocks are named <prefix><worker pid>_<n>, so the API process can find a killed worker's blocks
+SHARED_MEMORY_PREFIX = "query_worker_"
+SHARED_MEMORY_DIR = "/dev/shm"
+
+metrics.describe("query_worker_requests_total", "Requests handled by query worker processes")
+metrics.describe("query_worker_shared_memory_bytes_total", "Result bytes returned from query workers through shared memory")
+metrics.describe("query_worker_restarts_total", "Query worker processes restarted after exiting")
+
+def _pack(value: Any, block_name: str) -> Tuple[bytes, Optional[str], list]:
+    """
+    Serialize a result, moving large array buffers into one shared memory block called block_name.
+    Returns (pickle payload, shared memory name or None, buffer sizes, or the buffers themselves when sent inline).
+    """
+    buffers = []
+    payload = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    total = sum(raw.nbytes for raw in raws)
+    if total < SHARED_MEMORY_MIN_BYTES:
+        return payload, None, [raw.tobytes() for raw in raws]
+    
+    block = shared_memory.SharedMemory(name=block_name, create=True, size=total)
+    offset = 0
+    for raw in raws:
+        block.buf[offset:offset + raw.nbytes] = raw
+        offset += raw.nbytes
+    # The receiving process unlinks the block once it has copied the buffers out
+    block.close()
+    return payload, block.name, [raw.nbytes for raw in raws]
+
+def _unpack(payload: bytes, name: Optional[str], sizes: list) -> Any:
+    """Rebuild a result packed by _pack, releasing its shared memory block"""
+    if name is None:
+        return pickle.loads(payload, buffers=sizes)
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        buffers = []
+        offset = 0
+        for size in sizes:
+            buffers.append(bytearray(block.buf[offset:offset + size]))
+            offset += size
+        metrics.inc("query_worker_shared_memory_bytes_total", offset)
+        return pickle.loads(payload, buffers=buffers)
+    finally:
+        block.close()
+        block.unlink()
+
+def _sweep_shared_memory(pid: int):
+    """Unlink shared memory blocks a stopped worker created but no one received (e.g. killed right after _pack)"""
+    prefix = f"{SHARED_MEMORY_PREFIX}{pid}_"
+    try:
+        names = [name for name in os.listdir(SHARED_MEMORY_DIR) if name.startswith(prefix)]
+    except OSError:
+        return
+    for name in names:
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        except OSError:
+            continue
+        block.close()
+        block.unlink()
+
+def auto_pool_size() -> int:
+    """Size the pool for query_worker_processes = -1: one worker per core if any plan limits query memory or CPU time"""
+    from plan_limits import PLAN_LIMITS
+    limited = any(
+        limits.get("max_query_memory_mb", -1) != -1 or limits.get("max_query_cpu_seconds", -1) != -1
+        for limits in PLAN_LIMITS.values()
+    )
+    return min(AUTO_MAX_WORKERS, os.cpu_count() or 1) if limited else 0
+
+class _CpuTimeExceeded(Exception):
+    pass
+
+def _on_cpu_timer(signum, frame):
+    raise _CpuTimeExceeded()
+
+def _data_segment_bytes() -> int:
+    """Get this process's current data segment size (what RLIMIT_DATA counts)"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmData:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def _apply_budget(budget: QueryBudget):
+    """Cap memory growth and CPU time for the next query (runs in a worker process)"""
+    if budget.memory_bytes is not None and RESOURCE_LIMITS_AVAILABLE:
+        try:
+            _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+            # Growth is capped on top of the datasets this worker already holds
+            soft = _data_segment_bytes() + budget.memory_bytes
+            resource.setrlimit(resource.RLIMIT_DATA, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+        except (OSError, ValueError):
+            pass
+    if budget.cpu_seconds is not None:
+        signal.setitimer(signal.ITIMER_PROF, budget.cpu_seconds)
+
+def _clear_budget():
+    signal.setitimer(signal.ITIMER_PROF, 0)
+    if RESOURCE_LIMITS_AVAILABLE:
+        try:
+            _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+            resource.setrlimit(resource.RLIMIT_DATA, (hard, hard))
+        except (OSError, ValueError):
+            pass
+
+def _worker_main(conn):
+    """Serve requests from the API process until the pipe closes (runs in a worker process)"""
+    from connectors.factory import get_connector
+    
+    signal.signal(signal.SIGPROF, _on_cpu_timer)
+    block_names = (f"{SHARED_MEMORY_PREFIX}{os.getpid()}_{n}" for n in itertools.count())
+    while True:
+        try:
+            operation, connection_type, connection_details, query, budget = conn.recv()
+        except (EOFError, OSError):
+            return
+        budget = QueryBudget(**budget)
+        try:
+            # Connecting reuses this worker's cached dataset until the file changes
+            connector = get_connector(connection_type)
+            connector.connect(connection_details)
+            if operation == "schema":
+                result = connector.get_schema()
+            else:
+                check_estimate(getattr(connector, "df", None), query, budget)
+                _apply_budget(budget)
+                try:
+                    result = connector.execute_query(query)
+                finally:
+                    _clear_budget()
+                check_result(result, budget)
+            conn.send(("ok",) + _pack(result, next(block_names)))
+        except _CpuTimeExceeded:
+            conn.send(("error", time_exceeded(budget, cpu=True), None, []))
+        except MemoryError:
+            conn.send(("error", memory_exceeded(budget), None, []))
+        except Exception as e:
+            # Connectors wrap failures (including MemoryError) in ValueError; report the limit when that was the cause
+            if isinstance(e.__context__, MemoryError) and budget.memory_bytes is not None:
+                e = memory_exceeded(budget)
+            elif isinstance(e.__context__, _CpuTimeExceeded):
+                e = time_exceeded(budget, cpu=True)
+            conn.send(("error", e if isinstance(e, QueryLimitExceeded) else ValueError(str(e)), None, []))
+
+class _Worker:
+    """One worker process and the pipe to it; requests to a worker run one at a time"""
+    
+    def __init__(self, context):
+        self.context = context
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+    
+    def start(self):
+        parent_conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+    
+    def request(self, message: tuple, wall_seconds: Optional[float] = None) -> Any:
+        with self.lock:
+            if self.process is None or not self.process.is_alive():
+                if self.process is not None:
+                    metrics.inc("query_worker_restarts_total")
+                    self.process.join()
+                    _sweep_shared_memory(self.process.pid)
+                self.start()
+            try:
+                self.conn.send(message)
+                if wall_seconds is not None and not self.conn.poll(wall_seconds):
+                    # Past its deadline: stop the worker rather than let the query keep running
+                    self._kill()
+                    raise time_exceeded(QueryBudget(wall_seconds=wall_seconds))
+                status, payload, name, sizes = self.conn.recv()
+            except (EOFError, OSError):
+                # The worker died mid-request (e.g. killed for memory); the next request starts a new one
+                self._kill()
+                raise ValueError("Query worker exited while running the query")
+        if status == "error":
+            raise payload
+        return _unpack(payload, name, sizes)
+    
+    def _kill(self):
+        """Make sure the worker is gone, with any shared memory it left (the next request restarts it)"""
+        self.process.kill()
+        self.process.join()
+        _sweep_shared_memory(self.process.pid)
+    
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.conn.close()
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=5)
+            _sweep_shared_memory(self.process.pid)
+
+class QueryWorkerPool:
+    """Fixed set of worker processes with connection-affinity routing, so each worker's dataset cache stays warm"""
+    
+    def __init__(self, size: int):
+        # -1 is sized on first use, so worker processes importing this module don't load the plan tables
+        self.size = size
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+    
+    def handles(self, connection_type: str) -> bool:
+        """Check if plans for a connection type run in the worker pool"""
+        return self._pool_size() > 0 and connection_type.lower() in WORKER_CONNECTION_TYPES
+    
+    def execute(self, connection_id: int, connection_type: str, connection_details: dict, query: str, budget: Optional[QueryBudget] = None) -> pd.DataFrame:
+        """Run a pandas plan on the worker that owns the connection, within the query's resource budget"""
+        budget = budget or QueryBudget()
+        return self._worker_for(connection_id).request(
+            ("execute", connection_type, connection_details, query, budget.to_dict()),
+            budget.wall_seconds
+        )
+    
+    def get_schema(self, connection_id: int, connection_type: str, connection_details: dict) -> Dict[str, Any]:
+        """Get a connection's schema from the worker that owns it (loading the dataset there, not in the API process)"""
+        return self._worker_for(connection_id).request(("schema", connection_type, connection_details, None, QueryBudget().to_dict()))
+    
+    def shutdown(self):
+        """Stop all worker processes"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
+    
+    def _worker_for(self, connection_id: int) -> _Worker:
+        """Pick the worker for a connection, starting the pool on first use"""
+        with self._lock:
+            if not self._workers:
+                # forkserver children don't inherit locks held by the API process's threads
+                context = multiprocessing.get_context("forkserver")
+                self._workers = [_Worker(context) for _ in range(self._pool_size())]
+            workers = self._workers
+        metrics.inc("query_worker_requests_total")
+        index = int(hashlib.sha1(str(connection_id).encode("utf-8")).hexdigest(), 16) % len(workers)
+        return workers[index]
+    
+    def _pool_size(self) -> int:
+        if self.size < 0:
+            self.size = auto_pool_size()
+        return self.size
+
+# Shared query worker pool for the API process
+query_worker_pool = QueryWorkerPool(settings.query_worker_processes)
+atexit.register(query_worker_pool.shutdown)
@@ -0,0 +1,226 @@
+"""
+Write-behind query history
+Buffers history entries in memory and writes them from a background thread in batched multi-row inserts,
+together with their usage counts and coalesced Connection.last_used updates
+"""
+import atexit
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+from metrics import metrics
+from models import Connection, QueryHistory
+from usage import current_period, usage_counters
+
+# Entries that fail this many times are dropped (e.g. rows referencing a connection deleted meanwhile)
+MAX_WRITE_ATTEMPTS = 3
+
+# Errors caused by the rows themselves rather than the database; batches hitting them are split to find the bad rows
+ROW_ERRORS = (IntegrityError, DataError)
+
+metrics.describe("history_pending_entries", "History entries waiting to be written")
+metrics.describe("history_entries_written_total", "History entries written to the database")
+metrics.describe("history_batches_written_total", "History batches written to the database")
+metrics.describe("history_write_failures_total", "History batch writes that failed and were split or retried")
+metrics.describe("history_entries_dropped_total", "History entries given up on after repeated write failures")
+
+def _entry(user_id: int, query_text: str, source_id: Optional[int], executed_query: Optional[str],
+           result_count: Optional[int]) -> dict:
+    """Build the row values of a history entry, stamped with the current UTC time"""
+    return {
+        "user_id": user_id,
+        "query_text": query_text,
+        "source_id": source_id,
+        "executed_query": executed_query,
+        "result_count": result_count,
+        "created_at": datetime.now(timezone.utc)
+    }
+
+class HistoryLogger:
+    """
+    Bounded buffer of history entries, flushed every flush_interval seconds or once batch_size are waiting.
+    When the buffer is full the caller writes a batch itself, so memory stays bounded without losing entries.
+    """
+    
+    def __init__(self, session_factory: Callable[[], Session], max_pending: int, batch_size: int, flush_interval: float):
+        self.session_factory = session_factory
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # (write attempts so far, row values)
+        self._entries: Deque[Tuple[int, dict]] = deque()
+        # Connection id -> latest use, so many queries on a connection make one UPDATE
+        self._last_used: Dict[int, datetime] = {}
+        self._cond = threading.Condition()
+        # Batches are written one at a time, whether by the background thread or a caller
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+    
+    def log(self, user_id: int, query_text: str, source_id: Optional[int] = None,
+            executed_query: Optional[str] = None, result_count: Optional[int] = None):
+        """Queue a history entry; it counts toward the user's monthly usage and the connection's last use"""
+        entry = _entry(user_id, query_text, source_id, executed_query, result_count)
+        now = entry["created_at"]
+        while True:
+            with self._cond:
+                if len(self._entries) < self.max_pending:
+                    self._entries.append((0, entry))
+                    if source_id is not None:
+                        self._last_used[source_id] = now
+                    metrics.set_gauge("history_pending_entries", len(self._entries))
+                    if len(self._entries) >= self.batch_size:
+                        self._cond.notify()
+                    stopping = self._stopping
+                    if not stopping and self._thread is None:
+                        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                        self._thread.start()
+                    break
+            # Full: write a batch on this thread rather than grow past the bound
+            self._write_batch()
+        usage_counters.note_query(user_id, current_period(now))
+        if stopping:
+            # The background writer has already exited
+            self.flush()
+    
+    def write(self, user_id: int, query_text: str, source_id: Optional[int] = None,
+              executed_query: Optional[str] = None, result_count: Optional[int] = None) -> int:
+        """Write a history entry right away instead of queueing it; returns the new row's id"""
+        entry = _entry(user_id, query_text, source_id, executed_query, result_count)
+        period = current_period(entry["created_at"])
+        db = self.session_factory()
+        try:
+            usage_counters.add_queries(db, {(user_id, period): 1})
+            history_entry = QueryHistory(**entry)
+            db.add(history_entry)
+            if source_id is not None:
+                db.execute(update(Connection).where(Connection.id == source_id).values(last_used=entry["created_at"]))
+            db.flush()
+            entry_id = history_entry.id
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        usage_counters.note_query(user_id, period)
+        metrics.inc("history_entries_written_total")
+        return entry_id
+    
+    def flush(self):
+        """Write everything queued so far"""
+        while self._write_batch():
+            pass
+    
+    def close(self):
+        """Stop the background writer and write what is left"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=30)
+        self.flush()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._entries) < self.batch_size and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+    
+    def _write_batch(self) -> bool:
+        """Write up to batch_size queued entries and all pending last_used updates; returns False if nothing was written"""
+        with self._write_lock:
+            with self._cond:
+                batch = [self._entries.popleft() for _ in range(min(self.batch_size, len(self._entries)))]
+                last_used, self._last_used = self._last_used, {}
+                metrics.set_gauge("history_pending_entries", len(self._entries))
+            if not batch and not last_used:
+                return False
+            
+            try:
+                self._commit(batch, last_used)
+            except ROW_ERRORS:
+                # One bad row fails the whole insert: write the rest, retrying only rows that fail on their own
+                metrics.inc("history_write_failures_total")
+                failed = self._split_write(batch)
+                if last_used:
+                    try:
+                        self._commit([], last_used)
+                    except Exception:
+                        self._requeue([], last_used)
+                self._requeue(failed, {})
+                return len(failed) < len(batch)
+            except Exception:
+                metrics.inc("history_write_failures_total")
+                self._requeue(batch, last_used)
+                return False
+            return True
+    
+    def _split_write(self, batch: List[Tuple[int, dict]]) -> List[Tuple[int, dict]]:
+        """Write a batch that failed on a row error in halves, recursively; returns the entries that still fail"""
+        if len(batch) <= 1:
+            return batch
+        failed = []
+        middle = len(batch) // 2
+        for half in (batch[:middle], batch[middle:]):
+            try:
+                self._commit(half, {})
+            except ROW_ERRORS:
+                failed.extend(self._split_write(half))
+            except Exception:
+                failed.extend(half)
+        return failed
+    
+    def _commit(self, batch: List[Tuple[int, dict]], last_used: Dict[int, datetime]):
+        """Write entries with their usage counts and last_used updates in one transaction"""
+        rows = [entry for _, entry in batch]
+        counts: Dict[Tuple[int, str], int] = {}
+        for row in rows:
+            key = (row["user_id"], current_period(row["created_at"]))
+            counts[key] = counts.get(key, 0) + 1
+        db = self.session_factory()
+        try:
+            # Counters first: a new month's row is seeded from history already in the table
+            usage_counters.add_queries(db, counts)
+            if rows:
+                db.execute(insert(QueryHistory), rows)
+            for connection_id, used_at in last_used.items():
+                db.execute(update(Connection).where(Connection.id == connection_id).values(last_used=used_at))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        if rows:
+            metrics.inc("history_entries_written_total", len(rows))
+            metrics.inc("history_batches_written_total")
+    
+    def _requeue(self, batch: List[Tuple[int, dict]], last_used: Dict[int, datetime]):
+        """Put a failed batch back at the front of the queue, dropping entries out of attempts"""
+        retry = [(attempts + 1, entry) for attempts, entry in batch if attempts + 1 < MAX_WRITE_ATTEMPTS]
+        if len(retry) < len(batch):
+            metrics.inc("history_entries_dropped_total", len(batch) - len(retry))
+        with self._cond:
+            self._entries.extendleft(reversed(retry))
+            for connection_id, used_at in last_used.items():
+                self._last_used[connection_id] = max(used_at, self._last_used.get(connection_id, used_at))
+            metrics.set_gauge("history_pending_entries", len(self._entries))
+
+# Shared history logger for the API process
+history_logger = HistoryLogger(
+    SessionLocal,
+    settings.history_max_pending,
+    settings.history_batch_size,
+    settings.history_flush_interval_seconds
+)
+atexit.register(history_logger.close)
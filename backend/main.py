@@ -1,6 +1,10 @@
-from fastapi import FastAPI
+import secrets
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from typing import Optional
 from config import settings
+from metrics import metrics
 from routers import auth, connections, query, history, subscription, export, ai_insights, team, api_keys, nlp_enhancement
 
 app = FastAPI(title="Data Visualizer & Analyzer Tool API", version="1.0.0")
@@ -34,6 +38,14 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    if not settings.metrics_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest((authorization or "").encode("utf-8"), f"Bearer {settings.metrics_token}".encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return metrics.render()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8888)
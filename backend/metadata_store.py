@@ -0,0 +1,90 @@
+"""
+Metadata store engines
+Builds the sync and async engines for the application database (users, connections, history) with settings
+suited to its backend: WAL and tuned pragmas for SQLite, a sized and health-checked connection pool for Postgres
+"""
+import importlib.util
+from typing import Callable, Dict, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from config import settings
+
+# Driver used when a URL names none: the ones requirements.txt installs, not SQLAlchemy's defaults
+# (which for Postgres is psycopg 3 from SQLAlchemy 2.1)
+SYNC_DRIVERS = {
+    "postgresql": "psycopg2",
+    "mysql": "pymysql",
+}
+
+# asyncio driver used for each backend's async engine
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+def _sqlite_engine(url: URL, create: Callable = create_engine):
+    """Single-node store: SQLite in WAL mode, so reads don't wait on the writer"""
+    in_memory = url.database in (None, "", ":memory:")
+    pool_options = {} if in_memory else {"pool_size": settings.db_pool_size, "max_overflow": settings.db_max_overflow}
+    engine = create(
+        url,
+        connect_args={"check_same_thread": False, "timeout": settings.sqlite_busy_timeout_ms / 1000},
+        **pool_options
+    )
+    
+    # Async engines run their connection events on the wrapped sync engine
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints; a crash can lose the last commits but never corrupts
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size_bytes)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+    
+    return engine
+
+def _pooled_engine(url: URL, create: Callable = create_engine):
+    """Server databases (Postgres, MySQL) shared by several API nodes"""
+    return create(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        # Replace connections dropped by the server or a proxy instead of failing the request
+        pool_pre_ping=True
+    )
+
+# Engine builder for each database backend; others get a pooled engine
+ENGINE_BUILDERS: Dict[str, Callable] = {
+    "sqlite": _sqlite_engine,
+    "postgresql": _pooled_engine,
+}
+
+def create_metadata_engine(database_url: str) -> Engine:
+    """Create the metadata store engine for a database URL"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if url.drivername == backend and backend in SYNC_DRIVERS:
+        url = url.set(drivername=f"{backend}+{SYNC_DRIVERS[backend]}")
+    return ENGINE_BUILDERS.get(backend, _pooled_engine)(url)
+
+def create_async_metadata_engine(database_url: str) -> Optional[AsyncEngine]:
+    """
+    Create an asyncio engine for the same metadata store, switching the URL to the backend's async driver.
+    Returns None when the backend has no async driver installed; callers then run the sync engine in the threadpool.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None or importlib.util.find_spec(driver) is None:
+        return None
+    url = url.set(drivername=f"{backend}+{driver}")
+    return ENGINE_BUILDERS.get(backend, _pooled_engine)(url, create_async_engine)
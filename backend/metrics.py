@@ -0,0 +1,62 @@
+"""
+In-process metrics registry
+Counters and gauges exposed in Prometheus text format at /metrics
+"""
+import threading
+from typing import Dict, Tuple
+
+class MetricsRegistry:
+    """Thread-safe store of labelled counters and gauges"""
+    
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def describe(self, name: str, help_text: str):
+        """Register help text for a metric"""
+        self._help[name] = help_text
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to an absolute value"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+    
+    def add_gauge(self, name: str, delta: float, **labels):
+        """Move a gauge up or down"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+    
+    def get(self, name: str, **labels) -> float:
+        """Get the current value of a counter or gauge"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+    
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for metric_type, values in (("counter", self._counters), ("gauge", self._gauges)):
+                seen = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in seen:
+                        seen.add(name)
+                        if name in self._help:
+                            lines.append(f"# HELP {name} {self._help[name]}")
+                        lines.append(f"# TYPE {name} {metric_type}")
+                    label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                    lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+# Shared registry for the API process
+metrics = MetricsRegistry()
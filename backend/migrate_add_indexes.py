@@ -0,0 +1,68 @@
+"""
+Migration script to add query history indexes and the usage_counters table
+Run this after updating models.py; create_all only creates missing tables, so existing
+query_history tables don't get the new indexes without it
+"""
+import sqlite3
+
+# Index name -> (table, columns)
+INDEXES = {
+    "ix_query_history_user_id_created_at": ("query_history", "user_id, created_at"),
+    "ix_query_history_source_id": ("query_history", "source_id"),
+}
+
+def migrate_database():
+    """Create query history indexes and the usage_counters table if they don't exist"""
+    db_path = "data_analyzer.db"
+    
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        existing = {row[0] for row in cursor.fetchall()}
+        for name, (table, columns) in INDEXES.items():
+            if name not in existing:
+                print(f"Creating index '{name}' on {table}({columns})...")
+                cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+                print(f"✓ Created index '{name}'")
+            else:
+                print(f"✓ Index '{name}' already exists")
+        
+        # Create usage_counters table if it doesn't exist
+        cursor.execute("""
+            SELECT name FROM sqlite_master 
+            WHERE type='table' AND name='usage_counters'
+        """)
+        if not cursor.fetchone():
+            print("Creating 'usage_counters' table...")
+            cursor.execute("""
+                CREATE TABLE usage_counters (
+                    user_id INTEGER NOT NULL,
+                    period VARCHAR NOT NULL,
+                    query_count INTEGER NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, period),
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            """)
+            print("✓ Created 'usage_counters' table")
+        else:
+            print("✓ 'usage_counters' table already exists")
+        
+        # Refresh planner statistics so the new indexes are picked up
+        cursor.execute("ANALYZE query_history")
+        
+        conn.commit()
+        conn.close()
+        print("\n✅ Migration completed successfully!")
+    
+    except Exception as e:
+        print(f"\n❌ Error during migration: {e}")
+        raise
+
+if __name__ == "__main__":
+    print("Starting database migration...")
+    print("=" * 50)
+    migrate_database()
+    print("=" * 50)
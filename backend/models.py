@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -33,17 +33,29 @@ class Connection(Base):
 
 class QueryHistory(Base):
     __tablename__ = "query_history"
+    __table_args__ = (
+        # Per-user history listings and date-range counts
+        Index("ix_query_history_user_id_created_at", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     query_text = Column(Text, nullable=False)
-    source_id = Column(Integer, ForeignKey("connections.id"), nullable=True)
+    source_id = Column(Integer, ForeignKey("connections.id"), nullable=True, index=True)
     executed_query = Column(Text, nullable=True)  # The actual SQL/Pandas query executed
     result_count = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="query_history")
 
+class UsageCounter(Base):
+    __tablename__ = "usage_counters"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    period = Column(String, primary_key=True)  # Calendar month (UTC), e.g. 2024-05
+    query_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class TeamMember(Base):
     __tablename__ = "team_members"
     
@@ -16,6 +16,8 @@ class AdvancedQueryEngine:
             "average": ["average", "avg", "mean", "typical"],
             "sum": ["sum", "total", "add", "aggregate", "combined"],
             "count": ["count", "number", "how many", "quantity", "total number"],
+            "distinct": ["unique", "distinct"],
+            "percentile": ["percentile", "p90", "p95", "p99", "quantile"],
             "group": ["by", "group", "grouped", "per", "for each", "for every"],
             "order": ["sort", "order", "arrange", "rank", "organize"],
             "filter": ["where", "filter", "with", "having", "that", "which", "whose"],
@@ -79,7 +81,11 @@ class AdvancedQueryEngine:
         intent = self._detect_intent(query_lower)
         
         # Parse based on intent and query type
-        if self._is_top_n_query(query_lower):
+        if self._is_percentile_query(query_lower):
+            return self._parse_percentile(query_text, query_lower, columns, intent)
+        elif self._is_distinct_query(query_lower):
+            return self._parse_distinct(query_text, query_lower, columns, intent)
+        elif self._is_top_n_query(query_lower):
             return self._parse_top_n(query_text, query_lower, columns, intent)
         elif self._is_aggregate_query(query_lower):
             return self._parse_aggregate(query_text, query_lower, columns, intent)
@@ -119,6 +125,14 @@ class AdvancedQueryEngine:
                     return intent
         return "general"
     
+    def _is_percentile_query(self, query: str) -> bool:
+        """Check if query is asking for a percentile"""
+        return self._extract_quantile(query) is not None
+    
+    def _is_distinct_query(self, query: str) -> bool:
+        """Check if query is asking for distinct values"""
+        return any(re.search(rf"\b{keyword}\b", query) for keyword in self.keywords["distinct"])
+    
     def _is_top_n_query(self, query: str) -> bool:
         """Check if query is asking for top N results"""
         top_patterns = [
@@ -145,7 +159,7 @@ class AdvancedQueryEngine:
     
     def _is_filter_query(self, query: str) -> bool:
         """Check if query has filter conditions"""
-        filter_keywords = ["where", "with", "having", "that", "which", "whose", "above", "below", "greater", "less"]
+        filter_keywords = ["where", "with", "having", "that", "which", "whose", "above", "below", "greater", "less", "containing", "starting", "after", "before"]
         return any(keyword in query for keyword in filter_keywords)
     
     def _is_comparison_query(self, query: str) -> bool:
@@ -184,14 +198,39 @@ class AdvancedQueryEngine:
         match = re.search(r'(\d+)', query)
         return int(match.group(1)) if match else None
     
+    def _extract_quantile(self, query: str) -> Optional[float]:
+        """Extract a quantile (0-1) from phrases like p95, 90th percentile or percentile 99"""
+        patterns = [
+            r"\bp(\d{1,2}(?:\.\d+)?)\b",
+            r"(\d{1,2}(?:\.\d+)?)(?:st|nd|rd|th)?\s+percentile",
+            r"percentile\s+(\d{1,2}(?:\.\d+)?)\b"
+        ]
+        for pattern in patterns:
+            match = re.search(pattern, query)
+            if match:
+                return float(match.group(1)) / 100
+        return None
+    
+    def _split_group_by(self, query_lower: str, columns: List[str]) -> Tuple[str, Optional[str]]:
+        """Split off a trailing "by/per/for each <column>" clause, returning (remaining query, group column)"""
+        match = re.search(r"\b(?:group(?:ed)? by|by|per|for each|for every)\s+(\w+)", query_lower)
+        if match:
+            group_column = self._extract_column(match.group(1), columns)
+            if group_column:
+                return query_lower[:match.start()] + query_lower[match.end():], group_column
+        return query_lower, None
+    
     def _extract_filter_condition(self, query: str, columns: List[str]) -> Optional[Tuple[str, str, str]]:
         """Extract filter condition (column, operator, value)"""
         # Pattern: column operator value
         patterns = [
             (r"(\w+)\s+(above|greater than|>|more than)\s+(\d+)", ">"),
             (r"(\w+)\s+(below|less than|<|lower than)\s+(\d+)", "<"),
-            (r"(\w+)\s+(equal to|equals|==|=)\s+(\w+)", "=="),
+            (r"(\w+)\s+(equal to|equals|==|=)\s+([\w\-.:]+)", "=="),
+            (r"(\w+)\s+(after|since)\s+(\d{4}-\d{2}-\d{2})", ">"),
+            (r"(\w+)\s+(before|until)\s+(\d{4}-\d{2}-\d{2})", "<"),
             (r"(\w+)\s+containing\s+(\w+)", "contains"),
+            (r"(\w+)\s+(starting with|starts with|beginning with)\s+(\w+)", "startswith"),
             (r"with\s+(\w+)\s+(above|greater than|>)\s+(\d+)", ">"),
             (r"with\s+(\w+)\s+(below|less than|<)\s+(\d+)", "<"),
         ]
@@ -202,7 +241,7 @@ class AdvancedQueryEngine:
                 col_name = match.group(1)
                 column = self._extract_column(col_name, columns)
                 if column:
-                    value = match.group(-1)  # Last group is the value
+                    value = match.group(match.lastindex)  # Last group is the value
                     return (column, operator, value)
         
         return None
@@ -318,6 +357,46 @@ class AdvancedQueryEngine:
             "agg_column": agg_column
         }
     
+    def _parse_distinct(self, query: str, query_lower: str, columns: List[str], intent: str) -> Dict:
+        """Parse distinct count query"""
+        remaining_query, group_column = self._split_group_by(query_lower, columns)
+        column = self._extract_column(remaining_query, columns)
+        
+        if column and group_column:
+            pandas_query = f"df.groupby('{group_column}')['{column}'].nunique().reset_index()"
+        elif column:
+            pandas_query = f"df['{column}'].nunique()"
+        else:
+            pandas_query = "df.nunique()"
+        
+        return {
+            "type": "pandas",
+            "query": pandas_query,
+            "operation": "distinct_count",
+            "intent": intent,
+            "column": column,
+            "group_column": group_column
+        }
+    
+    def _parse_percentile(self, query: str, query_lower: str, columns: List[str], intent: str) -> Dict:
+        """Parse percentile query"""
+        quantile = self._extract_quantile(query_lower)
+        column = self._extract_column(query_lower, columns)
+        
+        if column:
+            pandas_query = f"df['{column}'].quantile({quantile})"
+        else:
+            pandas_query = f"df.select_dtypes(include=['number']).quantile({quantile})"
+        
+        return {
+            "type": "pandas",
+            "query": pandas_query,
+            "operation": "percentile",
+            "intent": intent,
+            "column": column,
+            "quantile": quantile
+        }
+    
     def _parse_count(self, query: str, query_lower: str, columns: List[str], intent: str) -> Dict:
         """Parse count query"""
         # Check if counting specific column
@@ -344,10 +423,12 @@ class AdvancedQueryEngine:
         
         if condition:
             col, op, val = condition
+            # Dates (e.g. partition values) compare as strings
+            literal = val if val.isdigit() else f"'{val}'"
             if op == ">":
-                pandas_query = f"df[df['{col}'] > {val}]"
+                pandas_query = f"df[df['{col}'] > {literal}]"
             elif op == "<":
-                pandas_query = f"df[df['{col}'] < {val}]"
+                pandas_query = f"df[df['{col}'] < {literal}]"
             elif op == "==":
                 # Check if value is string or number
                 if val.isdigit():
@@ -356,6 +437,8 @@ class AdvancedQueryEngine:
                     pandas_query = f"df[df['{col}'] == '{val}']"
             elif op == "contains":
                 pandas_query = f"df[df['{col}'].str.contains('{val}', case=False, na=False)]"
+            elif op == "startswith":
+                pandas_query = f"df[df['{col}'].str.lower().str.startswith('{val}', na=False)]"
             else:
                 pandas_query = "df"
         else:
@@ -2,8 +2,11 @@
 Plan limits and feature flags for different subscription tiers
 """
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+from config import settings
 from models import User
+from usage import usage_counters
 
 # Plan limits configuration
 PLAN_LIMITS = {
@@ -12,6 +15,9 @@ PLAN_LIMITS = {
         "max_queries_per_month": 50,
         "query_history_days": 7,
         "max_file_size_mb": 5,
+        "max_query_memory_mb": 512,
+        "max_query_seconds": 15,
+        "max_query_cpu_seconds": 10,
         "export_enabled": False,
         "ai_insights_enabled": False,
         "custom_visualizations": False,
@@ -27,6 +33,9 @@ PLAN_LIMITS = {
         "max_queries_per_month": -1,  # -1 means unlimited
         "query_history_days": 90,
         "max_file_size_mb": 50,
+        "max_query_memory_mb": 2048,
+        "max_query_seconds": 60,
+        "max_query_cpu_seconds": 45,
         "export_enabled": True,
         "ai_insights_enabled": True,
         "custom_visualizations": True,
@@ -42,6 +51,9 @@ PLAN_LIMITS = {
         "max_queries_per_month": -1,  # -1 means unlimited
         "query_history_days": -1,  # -1 means unlimited
         "max_file_size_mb": -1,  # -1 means unlimited
+        "max_query_memory_mb": 8192,
+        "max_query_seconds": 300,
+        "max_query_cpu_seconds": 240,
         "export_enabled": True,
         "ai_insights_enabled": True,
         "custom_visualizations": True,
@@ -55,6 +67,35 @@ PLAN_LIMITS = {
     }
 }
 
+# Admission control for query execution
+# Queries run in at most MAX_CONCURRENT_QUERIES slots; when they are busy, waiting queries are admitted by
+# weighted fair queuing (a plan with twice the weight gets twice the share of freed slots)
+MAX_CONCURRENT_QUERIES = 8
+ADMISSION_POLICY = {
+    "free": {
+        "weight": 1,
+        "max_concurrent": 2,  # Slots this plan may hold at once
+        "max_queued": 16,  # Waiting queries beyond this are rejected immediately
+        "max_wait_seconds": 10  # Queries not admitted within this are rejected
+    },
+    "pro": {
+        "weight": 4,
+        "max_concurrent": 6,
+        "max_queued": 64,
+        "max_wait_seconds": 30
+    },
+    "business": {
+        "weight": 16,
+        "max_concurrent": 8,
+        "max_queued": 256,
+        "max_wait_seconds": 60
+    }
+}
+
+def get_admission_policy(plan: str) -> Dict[str, Any]:
+    """Get query admission settings for a specific plan"""
+    return ADMISSION_POLICY.get(plan, ADMISSION_POLICY["free"])
+
 def get_user_plan(user: User) -> str:
     """Get user's plan, defaulting to 'free' if not set"""
     return user.plan if user.plan else "free"
@@ -77,8 +118,8 @@ def can_add_connection(user: User, current_connections_count: int) -> tuple[bool
     
     return True, "OK"
 
-def can_execute_query(user: User, queries_this_month: int) -> tuple[bool, str]:
-    """Check if user can execute a query"""
+def can_execute_query(user: User, db: Session) -> tuple[bool, str]:
+    """Check if user can execute a query (unlimited plans never touch the database)"""
     plan = get_user_plan(user)
     limits = get_plan_limits(plan)
     max_queries = limits["max_queries_per_month"]
@@ -86,7 +127,7 @@ def can_execute_query(user: User, queries_this_month: int) -> tuple[bool, str]:
     if max_queries == -1:
         return True, "OK"
     
-    if queries_this_month >= max_queries:
+    if usage_counters.get_count(db, user.id) >= max_queries:
         return False, f"Monthly query limit reached. {plan.capitalize()} plan allows {max_queries} queries per month. Upgrade for unlimited queries."
     
     return True, "OK"
@@ -117,6 +158,13 @@ def get_max_file_size_mb(user: User) -> int:
     limits = get_plan_limits(plan)
     return limits["max_file_size_mb"]
 
+def get_decompressed_limit(user: User) -> Optional[int]:
+    """Get the most bytes the user's compressed files may decompress to when queried: the plan's file size limit, or the global cap"""
+    max_size_mb = get_max_file_size_mb(user)
+    if max_size_mb == -1:
+        return settings.max_decompressed_bytes or None
+    return max_size_mb * 1024 * 1024
+
 def check_file_size(file_size_bytes: int, user: User) -> tuple[bool, str]:
     """Check if file size is within plan limits"""
     plan = get_user_plan(user)
@@ -10,6 +10,7 @@ from database import get_db
 from models import User
 from routers.auth import get_current_user
 from plan_limits import can_access_feature
+from execution.serialization import FastJSONResponse
 import pandas as pd
 from datetime import datetime
 
@@ -25,7 +26,7 @@ class InsightResponse(BaseModel):
     statistics: Dict[str, Any]
     trends: List[Dict[str, Any]]
 
-@router.post("/analyze", response_model=InsightResponse)
+@router.post("/analyze", response_model=InsightResponse, response_class=FastJSONResponse)
 def analyze_data(insight_request: InsightRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Generate AI-powered insights from query results"""
     # Check if user has access to AI insights
@@ -37,12 +38,12 @@ def analyze_data(insight_request: InsightRequest, current_user: User = Depends(g
         df = pd.DataFrame(insight_request.data)
         
         if df.empty:
-            return {
+            return FastJSONResponse({
                 "insights": ["No data available for analysis"],
                 "recommendations": [],
                 "statistics": {},
                 "trends": []
-            }
+            })
         
         # Generate basic statistics
         statistics = {}
@@ -119,17 +120,17 @@ def analyze_data(insight_request: InsightRequest, current_user: User = Depends(g
                 "timestamp": datetime.utcnow().isoformat()
             })
         
-        return {
+        return FastJSONResponse({
             "insights": insights if insights else ["No significant insights found"],
             "recommendations": recommendations if recommendations else ["Data looks good!"],
             "statistics": statistics,
             "trends": trends
-        }
+        })
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating insights: {str(e)}")
 
-@router.post("/summary")
+@router.post("/summary", response_class=FastJSONResponse)
 def get_data_summary(insight_request: InsightRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get AI-powered summary of the data"""
     # Check if user has access to AI insights
@@ -164,7 +165,7 @@ def get_data_summary(insight_request: InsightRequest, current_user: User = Depen
                 for col in categorical_cols
             }
         
-        return summary
+        return FastJSONResponse(summary)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
@@ -1,14 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import case, func, select, true
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-from database import get_db
+from database import get_async_db, get_db
 from models import Connection, User, QueryHistory
 from routers.auth import get_current_user
 from connectors.factory import get_connector
-from plan_limits import can_add_connection, check_file_size
+from connectors.partitioned_connector import discover_files
+from connectors.compressed import source_size
+from plan_limits import can_add_connection, check_file_size, get_decompressed_limit, get_max_file_size_mb
+from execution.result_cache import result_cache
+from execution.sampling import sample_store
+from execution.sketches import sketch_store
+from execution.rollups import rollup_manager
+from history_logger import history_logger
 import os
 
 router = APIRouter()
@@ -16,7 +24,7 @@ router = APIRouter()
 # Pydantic models
 class ConnectionCreate(BaseModel):
     name: str
-    type: str  # csv, excel, postgres, mysql, mongodb
+    type: str  # csv, excel, partitioned, postgres, mysql, mongodb
     details: dict
 
 class ConnectionUpdate(BaseModel):
@@ -41,18 +49,29 @@ class ConnectionResponse(BaseModel):
 class ConnectionListResponse(BaseModel):
     connections: List[str]
 
+def _discard_cached_data(connection_id: int, connection_type: str, details: dict, db: Session):
+    """Drop cached datasets for connection details no other connection still uses"""
+    others = db.query(Connection).filter(Connection.type == connection_type, Connection.id != connection_id).all()
+    if any(other.details == details for other in others):
+        return
+    try:
+        get_connector(connection_type).discard_cached(details)
+    except ValueError:
+        # Unsupported connection type; nothing was cached for it
+        pass
+
 @router.get("/", response_model=ConnectionListResponse)
-def get_connections(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_connections(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Get all connections for the current user"""
-    connections = db.query(Connection).filter(Connection.user_id == current_user.id).all()
+    connections = (await db.execute(select(Connection).where(Connection.user_id == current_user.id))).scalars().all()
     # Return just the names for compatibility with frontend
     connection_names = [conn.name for conn in connections]
     return {"connections": connection_names}
 
 @router.get("/all", response_model=List[ConnectionResponse])
-def get_all_connections(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_all_connections(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Get all connections with full details"""
-    connections = db.query(Connection).filter(Connection.user_id == current_user.id).all()
+    connections = (await db.execute(select(Connection).where(Connection.user_id == current_user.id))).scalars().all()
     return connections
 
 @router.post("/add", response_model=ConnectionResponse)
@@ -73,15 +92,32 @@ def add_connection(connection: ConnectionCreate, current_user: User = Depends(ge
     if not can_add:
         raise HTTPException(status_code=403, detail=message)
     
-    # Check file size limits for CSV/Excel files
-    if connection.type in ['csv', 'excel'] and 'file_path' in connection.details:
+    # Check file size limits for CSV/Excel files (compressed files count their decompressed size).
+    # Unlimited plans have nothing to check, so their compressed files aren't decompressed here.
+    max_size_mb = get_max_file_size_mb(current_user)
+    max_bytes = None if max_size_mb == -1 else max_size_mb * 1024 * 1024
+    if max_bytes is not None and connection.type in ['csv', 'excel'] and 'file_path' in connection.details:
         file_path = connection.details.get('file_path')
         if file_path and os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
+            # Workbooks are zip files themselves, so only CSV files are measured decompressed
+            file_size = source_size(file_path, max_bytes) if connection.type == 'csv' else os.path.getsize(file_path)
             can_upload, size_message = check_file_size(file_size, current_user)
             if not can_upload:
                 raise HTTPException(status_code=403, detail=size_message)
     
+    # Partitioned datasets count the total size of their files
+    partition_path = connection.details.get('path') or connection.details.get('file_path')
+    if max_bytes is not None and connection.type == 'partitioned' and partition_path:
+        file_size = 0
+        for file_path in discover_files(partition_path):
+            # Stop measuring once the dataset is over the limit
+            file_size += source_size(file_path, max(0, max_bytes - file_size))
+            if file_size > max_bytes:
+                break
+        can_upload, size_message = check_file_size(file_size, current_user)
+        if not can_upload:
+            raise HTTPException(status_code=403, detail=size_message)
+    
     db_connection = Connection(
         name=connection.name,
         type=connection.type,
@@ -94,12 +130,12 @@ def add_connection(connection: ConnectionCreate, current_user: User = Depends(ge
     return db_connection
 
 @router.get("/{connection_id}", response_model=ConnectionResponse)
-def get_connection(connection_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_connection(connection_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Get a specific connection"""
-    connection = db.query(Connection).filter(
+    connection = (await db.execute(select(Connection).where(
         Connection.id == connection_id,
         Connection.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     if not connection:
         raise HTTPException(status_code=404, detail="Connection not found")
     return connection
@@ -131,6 +167,11 @@ def update_connection(
             raise HTTPException(status_code=400, detail="Connection with this name already exists")
         connection.name = connection_update.name
     
+    # Data cached for the old source is dropped when the connection points elsewhere
+    if (connection_update.type is not None and connection_update.type != connection.type) or \
+            (connection_update.details is not None and connection_update.details != connection.details):
+        _discard_cached_data(connection.id, connection.type, connection.details, db)
+    
     if connection_update.type is not None:
         connection.type = connection_update.type
     
@@ -142,6 +183,12 @@ def update_connection(
     
     db.commit()
     db.refresh(connection)
+    
+    # Cached results may no longer match the updated connection details
+    result_cache.invalidate_connection(connection_id)
+    sample_store.invalidate_connection(connection_id)
+    sketch_store.invalidate_connection(connection_id)
+    rollup_manager.invalidate_connection(connection_id)
     return connection
 
 @router.post("/{connection_id}/test")
@@ -165,6 +212,8 @@ def test_connection(
         # For SQL connectors, add type to details
         if connection.type in ['postgres', 'mysql']:
             connection_details['type'] = connection.type
+        # Compressed files may inflate no further than the plan allows
+        connection_details['max_decompressed_bytes'] = get_decompressed_limit(current_user)
         
         # Test connection
         connector.connect(connection_details)
@@ -232,6 +281,8 @@ def connect_connection(
         # For SQL connectors, add type to details
         if connection.type in ['postgres', 'mysql']:
             connection_details['type'] = connection.type
+        # Compressed files may inflate no further than the plan allows
+        connection_details['max_decompressed_bytes'] = get_decompressed_limit(current_user)
         
         # Test connection
         connector.connect(connection_details)
@@ -259,48 +310,47 @@ def delete_connection(connection_id: int, current_user: User = Depends(get_curre
     if not connection:
         raise HTTPException(status_code=404, detail="Connection not found")
     
-    # Delete related query history
+    # Delete related query history (including entries still waiting to be written)
+    history_logger.flush()
     db.query(QueryHistory).filter(QueryHistory.source_id == connection_id).delete()
     
+    # Shared dataset snapshots are removed once no connection reads the file
+    _discard_cached_data(connection.id, connection.type, connection.details, db)
+    
     db.delete(connection)
     db.commit()
+    
+    result_cache.invalidate_connection(connection_id)
+    sample_store.invalidate_connection(connection_id)
+    sketch_store.invalidate_connection(connection_id)
+    rollup_manager.invalidate_connection(connection_id)
     return {"message": "Connection deleted successfully"}
 
+def usage_stats_query(user_id: int, now: datetime):
+    """
+    Build one statement returning all usage counts for a user.
+    Date filters compare created_at to range starts (rather than wrapping it in DATE()) so they can use
+    the (user_id, created_at) index.
+    """
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = today_start.replace(day=1)
+    connections = select(
+        func.count(Connection.id).label("total_connections"),
+        func.count(case((Connection.status == "active", 1))).label("active_connections")
+    ).where(Connection.user_id == user_id).subquery()
+    queries = select(
+        func.count(QueryHistory.id).label("total_queries"),
+        func.count(case((QueryHistory.created_at >= today_start, 1))).label("queries_today"),
+        func.count(case((QueryHistory.created_at >= month_start, 1))).label("queries_this_month")
+    ).where(QueryHistory.user_id == user_id).subquery()
+    # Both subqueries return one row, so the unconditional join is a single row
+    return select(connections, queries).select_from(connections.join(queries, true()))
+
 @router.get("/stats/usage")
-def get_usage_stats(
+async def get_usage_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get usage statistics for the current user"""
-    # Total connections
-    total_connections = db.query(Connection).filter(Connection.user_id == current_user.id).count()
-    active_connections = db.query(Connection).filter(
-        Connection.user_id == current_user.id,
-        Connection.status == "active"
-    ).count()
-    
-    # Total queries
-    total_queries = db.query(QueryHistory).filter(QueryHistory.user_id == current_user.id).count()
-    
-    # Queries today
-    today = datetime.utcnow().date()
-    queries_today = db.query(QueryHistory).filter(
-        QueryHistory.user_id == current_user.id,
-        func.date(QueryHistory.created_at) == today
-    ).count()
-    
-    # Queries this month
-    month_start = datetime.utcnow().replace(day=1).date()
-    queries_this_month = db.query(QueryHistory).filter(
-        QueryHistory.user_id == current_user.id,
-        func.date(QueryHistory.created_at) >= month_start
-    ).count()
-    
-    return {
-        "total_connections": total_connections,
-        "active_connections": active_connections,
-        "total_queries": total_queries,
-        "queries_today": queries_today,
-        "queries_this_month": queries_this_month
-    }
-
+    stats = (await db.execute(usage_stats_query(current_user.id, datetime.utcnow()))).one()
+    return dict(stats._mapping)
@@ -2,7 +2,7 @@
 Export functionality router
 Allows Pro and Business users to export query results to PDF/Excel
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -11,6 +11,11 @@ from database import get_db
 from models import User
 from routers.auth import get_current_user
 from plan_limits import can_access_feature
+from execution.result_store import result_store
+from execution.serialization import (
+    negotiate_format, columnar_json, arrow_schema, iter_arrow_stream,
+    ARROW_STREAM_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE
+)
 import pandas as pd
 import io
 from datetime import datetime
@@ -19,9 +24,19 @@ import os
 router = APIRouter()
 
 class ExportRequest(BaseModel):
-    data: List[Dict[str, Any]]
+    data: List[Dict[str, Any]] = []
     format: str  # "pdf" or "excel"
     filename: Optional[str] = None
+    result_token: Optional[str] = None  # Export a full stored query result instead of data
+
+def get_export_dataframe(export_request: ExportRequest, current_user: User) -> pd.DataFrame:
+    """Get the DataFrame to export, from a stored query result or the posted rows"""
+    if export_request.result_token:
+        df = result_store.get(export_request.result_token, current_user.id)
+        if df is None:
+            raise HTTPException(status_code=404, detail="Result not found or expired. Please run the query again.")
+        return df
+    return pd.DataFrame(export_request.data)
 
 @router.post("/excel")
 def export_to_excel(export_request: ExportRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -33,7 +48,7 @@ def export_to_excel(export_request: ExportRequest, current_user: User = Depends(
     
     try:
         # Convert data to DataFrame
-        df = pd.DataFrame(export_request.data)
+        df = get_export_dataframe(export_request, current_user)
         
         # Create Excel file in memory
         output = io.BytesIO()
@@ -50,6 +65,8 @@ def export_to_excel(export_request: ExportRequest, current_user: User = Depends(
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error exporting to Excel: {str(e)}")
 
@@ -63,7 +80,7 @@ def export_to_csv(export_request: ExportRequest, current_user: User = Depends(ge
     
     try:
         # Convert data to DataFrame
-        df = pd.DataFrame(export_request.data)
+        df = get_export_dataframe(export_request, current_user)
         
         # Create CSV file in memory
         output = io.StringIO()
@@ -78,6 +95,8 @@ def export_to_csv(export_request: ExportRequest, current_user: User = Depends(ge
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error exporting to CSV: {str(e)}")
 
@@ -92,7 +111,7 @@ def export_to_pdf(export_request: ExportRequest, current_user: User = Depends(ge
     try:
         # For PDF export, we'll use a simple text-based approach
         # In production, you might want to use libraries like reportlab or weasyprint
-        df = pd.DataFrame(export_request.data)
+        df = get_export_dataframe(export_request, current_user)
         
         # Create a simple text representation
         pdf_content = f"""
@@ -102,7 +121,7 @@ Total Rows: {len(df)}
 
 {df.to_string()}
 """
-        
+
         # Generate filename
         filename = export_request.filename or f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
@@ -112,6 +131,51 @@ Total Rows: {len(df)}
             media_type="text/plain",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error exporting to PDF: {str(e)}")
 
+@router.post("/columnar")
+def export_columnar(
+    export_request: ExportRequest,
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Export query results in a columnar format chosen by the Accept header:
+    application/vnd.apache.arrow.stream for Arrow IPC, otherwise columnar JSON
+    """
+    # Check if user has access to export feature
+    can_export, message = can_access_feature(current_user, "export")
+    if not can_export:
+        raise HTTPException(status_code=403, detail=message)
+    
+    try:
+        result_format = negotiate_format(accept)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    
+    try:
+        df = get_export_dataframe(export_request, current_user)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        
+        if result_format == ARROW_STREAM_MEDIA_TYPE:
+            filename = export_request.filename or f"query_results_{timestamp}.arrows"
+            return StreamingResponse(
+                iter_arrow_stream(df, arrow_schema(df)),
+                media_type=ARROW_STREAM_MEDIA_TYPE,
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+        
+        filename = export_request.filename or f"query_results_{timestamp}.json"
+        return StreamingResponse(
+            io.BytesIO(columnar_json(df).encode('utf-8')),
+            media_type=COLUMNAR_JSON_MEDIA_TYPE,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting columnar data: {str(e)}")
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
-from database import get_db
+from database import get_async_db
 from models import QueryHistory, User
 from routers.auth import get_current_user
 from plan_limits import get_query_history_days
+from execution.serialization import FastJSONResponse
+from history_logger import history_logger
 
 router = APIRouter()
 
@@ -26,8 +28,7 @@ class QueryHistoryResponse(BaseModel):
 @router.post("/log")
 def log_query(
     query: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Log a query to history"""
     # Support query parameter
@@ -35,54 +36,49 @@ def log_query(
     if not text:
         return {"message": "No query text provided"}
     
+    # Written right away (unlike /query/run's entries) so the response can carry the row id
     try:
-        history_entry = QueryHistory(
-            user_id=current_user.id,
-            query_text=text,
-            source_id=None,  # Can be updated if source_id is provided
-            executed_query=None,
-            result_count=None
-        )
-        db.add(history_entry)
-        db.commit()
-        db.refresh(history_entry)
-        return {"message": "Query logged successfully", "id": history_entry.id}
+        entry_id = history_logger.write(current_user.id, text)
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Error logging query: {str(e)}")
+    return {"message": "Query logged successfully", "id": entry_id}
+
+def _history_to_dict(history_item: QueryHistory) -> dict:
+    """Convert a history row to its response fields without Pydantic validation"""
+    return {field: getattr(history_item, field) for field in QueryHistoryResponse.model_fields}
 
-@router.get("/", response_model=List[QueryHistoryResponse])
-def get_history(
+@router.get("/", response_model=List[QueryHistoryResponse], response_class=FastJSONResponse)
+async def get_history(
     limit: int = Query(50, ge=1, le=100),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get query history for current user (respecting plan limits)"""
     # Get history retention days based on plan
     history_days = get_query_history_days(current_user)
     
     # Build query with date filter if plan has limit
-    query = db.query(QueryHistory).filter(QueryHistory.user_id == current_user.id)
+    query = select(QueryHistory).where(QueryHistory.user_id == current_user.id)
     
     if history_days > 0:  # -1 means unlimited
         cutoff_date = datetime.utcnow() - timedelta(days=history_days)
-        query = query.filter(QueryHistory.created_at >= cutoff_date)
+        query = query.where(QueryHistory.created_at >= cutoff_date)
     
-    history = query.order_by(QueryHistory.created_at.desc()).limit(limit).all()
+    history = (await db.execute(query.order_by(QueryHistory.created_at.desc()).limit(limit))).scalars().all()
     
-    return history
+    return FastJSONResponse([_history_to_dict(item) for item in history])
 
 @router.get("/{history_id}", response_model=QueryHistoryResponse)
-def get_history_item(
+async def get_history_item(
     history_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific history item"""
-    history_item = db.query(QueryHistory).filter(
+    history_item = (await db.execute(select(QueryHistory).where(
         QueryHistory.id == history_id,
         QueryHistory.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not history_item:
         raise HTTPException(status_code=404, detail="History item not found")
@@ -90,21 +86,21 @@ def get_history_item(
     return history_item
 
 @router.delete("/{history_id}")
-def delete_history_item(
+async def delete_history_item(
     history_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a history item"""
-    history_item = db.query(QueryHistory).filter(
+    history_item = (await db.execute(select(QueryHistory).where(
         QueryHistory.id == history_id,
         QueryHistory.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not history_item:
         raise HTTPException(status_code=404, detail="History item not found")
     
-    db.delete(history_item)
-    db.commit()
+    await db.delete(history_item)
+    await db.commit()
     return {"message": "History item deleted successfully"}
 
@@ -1,16 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
 from database import get_db
-from models import Connection, QueryHistory, User
+from models import Connection, User
 from routers.auth import get_current_user
 from connectors.factory import get_connector
 from nlp.query_engine import QueryEngine
 from nlp.advanced_query_engine import AdvancedQueryEngine
-from plan_limits import can_execute_query
+from plan_limits import can_execute_query, get_decompressed_limit, get_plan_limits, get_user_plan
+from execution.result_cache import result_cache, get_plan_ttl
+from execution.single_flight import query_flights
+from execution.result_store import result_store
+from execution.sampling import run_approximate, describe_intervals
+from execution.sketches import run_sketch
+from execution.rollups import rollup_manager
+from execution.worker_pool import query_worker_pool
+from execution.admission import AdmissionRejected, AdmissionTicket, admission_scheduler
+from execution.governor import QueryBudget, QueryLimitExceeded, check_estimate, check_result, run_with_deadline
+from metrics import metrics
+from history_logger import history_logger
+from execution.serialization import (
+    negotiate_format, ndjson_response, columnar_json_response, arrow_response, FastJSONResponse,
+    NDJSON_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE
+)
 import pandas as pd
 
 router = APIRouter()
@@ -21,12 +35,24 @@ advanced_query_engine = AdvancedQueryEngine()  # Enhanced NLP engine
 class QueryRequest(BaseModel):
     query_text: str
     source_id: Optional[str] = "default"  # Connection ID or "default"
+    approximate: bool = False  # Answer from a random sample with confidence intervals
 
 class QueryResponse(BaseModel):
     summary: str
     results: List[Dict[str, Any]]
     suggestions: List[str]
     executed_query: Optional[str] = None
+    result_token: Optional[str] = None  # Use with /query/results/{token} to page through all rows
+    total_rows: Optional[int] = None
+    next_cursor: Optional[int] = None
+    confidence_intervals: Optional[List[Dict[str, Any]]] = None  # Only for approximate queries
+    approximate: bool = False  # True when results are sketch or sample estimates rather than exact
+
+class ResultPageResponse(BaseModel):
+    results: List[Dict[str, Any]]
+    cursor: int
+    next_cursor: Optional[int] = None
+    total_rows: int
 
 def get_connection_by_id_or_default(connection_id: str, user_id: int, db: Session) -> Optional[Connection]:
     """Get connection by ID or return default"""
@@ -45,39 +71,72 @@ def get_connection_by_id_or_default(connection_id: str, user_id: int, db: Sessio
         except (ValueError, TypeError):
             return None
 
-@router.post("/run", response_model=QueryResponse)
-def run_query(query_request: QueryRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Execute a natural language query on a data source"""
+@router.post("/run", response_model=QueryResponse, response_class=FastJSONResponse)
+async def run_query(
+    query_request: QueryRequest,
+    accept: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Execute a natural language query on a data source.
+    The Accept header selects the result format:
+    - application/json (default): summary with the first 100 rows
+    - application/vnd.columnar+json: same, with rows as {"columns": [...], "data": [[...]]}
+    - application/x-ndjson: summary line followed by all rows as NDJSON
+    - application/vnd.apache.arrow.stream: all rows as Arrow IPC, summary in the schema metadata
+    """
+    try:
+        result_format = negotiate_format(accept)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    
+    # Plan checks and the connection lookup use the sync session, so they run in the threadpool
+    connection = await run_in_threadpool(_get_query_connection, query_request, current_user, db)
+    if not connection:
+        # Create a demo/default dataset if no connection exists
+        return await run_in_threadpool(_run_demo_query, query_request.query_text)
+    
+    # Wait for an execution slot on the event loop, so queued queries don't hold threadpool threads;
+    # under load, higher plans are admitted first
+    try:
+        ticket = await admission_scheduler.acquire(get_user_plan(current_user))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    try:
+        return await run_in_threadpool(_execute_query, query_request, result_format, current_user, connection, ticket, db)
+    finally:
+        admission_scheduler.release(ticket)
+
+def _get_query_connection(query_request: QueryRequest, current_user: User, db: Session) -> Optional[Connection]:
+    """Check the user's query limits, then get the connection to query (None means the demo dataset)"""
+    can_query, message = can_execute_query(current_user, db)
+    if not can_query:
+        raise HTTPException(status_code=403, detail=message)
+    return get_connection_by_id_or_default(query_request.source_id, current_user.id, db)
+
+def _execute_query(query_request: QueryRequest, result_format: str, current_user: User, connection: Connection, ticket: AdmissionTicket, db: Session):
+    """Run a query on a connection while holding an execution slot"""
     try:
-        # Check query limits based on plan
-        start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        queries_this_month = db.query(QueryHistory).filter(
-            and_(
-                QueryHistory.user_id == current_user.id,
-                QueryHistory.created_at >= start_of_month
-            )
-        ).count()
-        
-        can_query, message = can_execute_query(current_user, queries_this_month)
-        if not can_query:
-            raise HTTPException(status_code=403, detail=message)
-        
-        # Get connection
-        connection = get_connection_by_id_or_default(query_request.source_id, current_user.id, db)
-        
-        if not connection:
-            # Create a demo/default dataset if no connection exists
-            return _run_demo_query(query_request.query_text)
-        
         # Get connector
         connector = get_connector(connection.type)
+        # Compressed files may inflate no further than the owner's plan allows
+        details = {**connection.details, "max_decompressed_bytes": get_decompressed_limit(current_user)}
         
         try:
-            # Connect to data source
-            connector.connect(connection.details)
+            # Data version lets cached schema and results be reused until the source changes
+            data_version = connector.get_data_version(details)
             
-            # Get schema
-            schema = connector.get_schema()
+            # Get schema (cached per data version so cache hits skip connecting)
+            schema = result_cache.get_schema(connection.id, data_version)
+            if schema is None:
+                if query_worker_pool.handles(connection.type):
+                    schema = query_worker_pool.get_schema(connection.id, connection.type, details)
+                else:
+                    if not connector.is_connected():
+                        connector.connect(details)
+                    schema = connector.get_schema()
+                result_cache.put_schema(connection.id, data_version, schema)
             
             # Parse natural language query using advanced engine
             # Try advanced engine first, fallback to basic engine if needed
@@ -88,14 +147,78 @@ def run_query(query_request: QueryRequest, current_user: User = Depends(get_curr
                 print(f"Advanced engine failed, using basic: {e}")
                 parsed_query = query_engine.parse_query(query_request.query_text, schema)
             
-            # Execute query
-            result_df = connector.execute_query(parsed_query["query"])
+            # Distinct counts and percentiles over large columns (or when asked to approximate) come from streamed sketches
+            sketch = run_sketch(connector, connection.id, details, data_version, parsed_query, query_request.approximate)
+            
+            # Approximate mode answers from a per-connection sample when the plan supports it
+            approximate = None
+            if query_request.approximate and sketch is None:
+                approximate = run_approximate(connector, connection.id, details, data_version, parsed_query)
+            
+            if sketch is not None:
+                result_df = sketch["result"]
+                cache_status = "HIT" if sketch["sketch_cached"] else "MISS"
+            elif approximate is not None:
+                result_df = approximate["result"]
+                cache_status = "HIT" if approximate["sample_cached"] else "MISS"
+            else:
+                # Execute query, or reuse a cached result for the same plan and data version
+                cache_key = result_cache.make_key(connection.id, parsed_query["query"], data_version)
+                result_df = result_cache.get(cache_key)
+                if result_df is not None:
+                    cache_status = "HIT"
+                else:
+                    cache_status = "MISS"
+                    
+                    # Per-query memory and time ceilings for the user's plan
+                    budget = QueryBudget.from_limits(get_plan_limits(get_user_plan(current_user)))
+                    
+                    def execute():
+                        # File datasets stay loaded in the worker process that owns the connection
+                        if query_worker_pool.handles(connection.type):
+                            df = query_worker_pool.execute(connection.id, connection.type, details, parsed_query["query"], budget)
+                        else:
+                            if not connector.is_connected():
+                                connector.connect(details)
+                            check_estimate(getattr(connector, "df", None), parsed_query["query"], budget)
+                            # A run past its deadline keeps the admission slot until it actually finishes
+                            df = run_with_deadline(
+                                lambda: connector.execute_query(parsed_query["query"]), budget,
+                                hold=lambda: admission_scheduler.hold(ticket)
+                            )
+                            check_result(df, budget)
+                        result_cache.put(cache_key, df, get_plan_ttl(parsed_query, data_version))
+                        return df
+                    
+                    # Hot group-bys are answered from rollup cubes instead of scanning the source
+                    result_df = rollup_manager.answer(connector, connection.id, details, data_version, parsed_query, db)
+                    if result_df is None:
+                        # Identical concurrent queries share one execution
+                        result_df, _ = query_flights.do(cache_key, execute)
             
-            # Convert DataFrame to list of dicts
+            # Keep larger results server-side so further pages don't re-execute the query
+            # (one that fits in the first page is already complete in the response)
+            result_token = result_store.put(result_df, current_user.id) if len(result_df) > 100 else None
+            
+            # The first 100 rows feed the JSON body and, for every format, the suggestions
+            # (other formats serialize their rows straight from the DataFrame)
+            full_result = result_format in (NDJSON_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE)
             results = result_df.head(100).to_dict(orient="records")
             
             # Generate summary
-            summary = f"Found {len(result_df)} rows. Showing top 100 results."
+            if sketch is not None:
+                summary = sketch["summary"]
+            elif approximate is not None:
+                summary = (
+                    f"Approximate result from a {approximate['sample_rows']:,}-row sample of "
+                    f"{approximate['population_rows']:,} rows."
+                )
+                if approximate["intervals"]:
+                    summary = f"{summary} 95% confidence intervals: {describe_intervals(approximate['intervals'])}"
+            elif full_result:
+                summary = f"Found {len(result_df)} rows. Streaming all results."
+            else:
+                summary = f"Found {len(result_df)} rows. Showing top 100 results."
             if parsed_query.get("operation"):
                 summary = f"{parsed_query['operation'].replace('_', ' ').title()}: {summary}"
             
@@ -105,44 +228,49 @@ def run_query(query_request: QueryRequest, current_user: User = Depends(get_curr
             except:
                 suggestions = query_engine.generate_suggestions(query_request.query_text, results)
             
-            # Update connection last_used timestamp and log query to history
-            connection.last_used = datetime.utcnow()
+            # Log query to history and update connection last_used (written in the background)
+            history_logger.log(
+                current_user.id,
+                query_request.query_text,
+                source_id=connection.id,
+                executed_query=parsed_query["query"],
+                result_count=len(result_df)
+            )
             
-            try:
-                history_entry = QueryHistory(
-                    user_id=current_user.id,
-                    query_text=query_request.query_text,
-                    source_id=connection.id,
-                    executed_query=parsed_query["query"],
-                    result_count=len(result_df)
-                )
-                db.add(history_entry)
-                db.commit()  # This will also commit the last_used update
-            except Exception as e:
-                # Don't fail if history logging fails, but try to commit last_used
-                print(f"Error logging query history: {e}")
-                db.rollback()
-                try:
-                    # Retry with just the last_used update
-                    connection.last_used = datetime.utcnow()
-                    db.commit()
-                except:
-                    pass
+            fields = {
+                "summary": summary,
+                "suggestions": suggestions,
+                "executed_query": parsed_query["query"],
+                "result_token": result_token,
+                "total_rows": approximate["total_rows"] if approximate is not None else len(result_df)
+            }
+            if approximate is not None:
+                fields["confidence_intervals"] = approximate["intervals"]
+            fields["approximate"] = sketch is not None or approximate is not None
+            headers = {"X-Cache": cache_status}
+            if result_format == NDJSON_MEDIA_TYPE:
+                return ndjson_response(fields, result_df, headers=headers)
+            if result_format == ARROW_STREAM_MEDIA_TYPE:
+                return arrow_response(fields, result_df, headers=headers)
             
-            return QueryResponse(
-                summary=summary,
-                results=results,
-                suggestions=suggestions,
-                executed_query=parsed_query["query"]
-            )
+            fields["next_cursor"] = 100 if len(result_df) > 100 else None
+            if result_format == COLUMNAR_JSON_MEDIA_TYPE:
+                return columnar_json_response(fields, result_df.head(100), headers=headers)
+            # Encoded directly by FastJSONResponse (NaN -> null, timestamps -> ISO)
+            return FastJSONResponse({**fields, "results": results}, headers=headers)
         
         finally:
             connector.close()
     
+    except HTTPException:
+        raise
+    except QueryLimitExceeded as e:
+        metrics.inc("query_governor_rejections_total", kind=e.kind)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error executing query: {str(e)}")
 
-def _run_demo_query(query_text: str) -> QueryResponse:
+def _run_demo_query(query_text: str) -> FastJSONResponse:
     """Run a demo query with sample data if no connection is available"""
     # Create sample data
     import random
@@ -179,15 +307,36 @@ def _run_demo_query(query_text: str) -> QueryResponse:
         except:
             suggestions = query_engine.generate_suggestions(query_text, results)
         
-        return QueryResponse(
-            summary=summary,
-            results=results,
-            suggestions=suggestions,
-            executed_query=parsed_query["query"]
-        )
+        return FastJSONResponse({
+            "summary": summary,
+            "results": results,
+            "suggestions": suggestions,
+            "executed_query": parsed_query["query"]
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error executing demo query: {str(e)}")
 
+@router.get("/results/{token}", response_model=ResultPageResponse, response_class=FastJSONResponse)
+def get_result_page(
+    token: str,
+    cursor: int = Query(0, ge=0),
+    page_size: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """Get a page of a stored query result without re-executing the query"""
+    page = result_store.get_page(token, current_user.id, cursor, page_size)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired. Please run the query again.")
+    
+    page_df, total_rows = page
+    next_cursor = cursor + page_size
+    return FastJSONResponse({
+        "results": page_df,
+        "cursor": cursor,
+        "next_cursor": next_cursor if next_cursor < total_rows else None,
+        "total_rows": total_rows
+    })
+
 @router.get("/schema/{connection_id}")
 def get_schema(connection_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get schema for a connection"""
@@ -201,7 +350,7 @@ def get_schema(connection_id: int, current_user: User = Depends(get_current_user
     
     try:
         connector = get_connector(connection.type)
-        connector.connect(connection.details)
+        connector.connect({**connection.details, "max_decompressed_bytes": get_decompressed_limit(current_user)})
         schema = connector.get_schema()
         connector.close()
         return schema
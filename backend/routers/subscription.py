@@ -3,11 +3,11 @@ Subscription management router
 Handles plan upgrades, downgrades, and plan information
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timedelta
-from database import get_db
+from database import get_async_db
 from models import User
 from routers.auth import get_current_user
 from plan_limits import get_user_plan, get_plan_limits, get_plan_features
@@ -24,7 +24,7 @@ class UpgradeRequest(BaseModel):
     trial_days: Optional[int] = 14  # For trial period
 
 @router.get("/current", response_model=PlanInfo)
-def get_current_plan(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_current_plan(current_user: User = Depends(get_current_user)):
     """Get current user's plan and features"""
     plan = get_user_plan(current_user)
     limits = get_plan_limits(plan)
@@ -37,7 +37,7 @@ def get_current_plan(current_user: User = Depends(get_current_user), db: Session
     }
 
 @router.post("/upgrade")
-def upgrade_plan(upgrade_request: UpgradeRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def upgrade_plan(upgrade_request: UpgradeRequest, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Upgrade user's plan (for demo/testing purposes)"""
     if upgrade_request.plan not in ["pro", "business"]:
         raise HTTPException(status_code=400, detail="Invalid plan. Must be 'pro' or 'business'")
@@ -59,8 +59,9 @@ def upgrade_plan(upgrade_request: UpgradeRequest, current_user: User = Depends(g
         # If no trial days, set to 1 year from now (for demo)
         current_user.subscription_expires_at = datetime.utcnow() + timedelta(days=365)
     
-    db.commit()
-    db.refresh(current_user)
+    # current_user was loaded through this request's session, so committing it saves the change
+    await db.commit()
+    await db.refresh(current_user)
     
     return {
         "message": f"Successfully upgraded to {upgrade_request.plan} plan",
@@ -69,12 +70,12 @@ def upgrade_plan(upgrade_request: UpgradeRequest, current_user: User = Depends(g
     }
 
 @router.post("/downgrade")
-def downgrade_plan(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def downgrade_plan(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Downgrade user's plan to free"""
     current_user.plan = "free"
     current_user.subscription_expires_at = None
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return {
         "message": "Successfully downgraded to free plan",
@@ -82,7 +83,7 @@ def downgrade_plan(current_user: User = Depends(get_current_user), db: Session =
     }
 
 @router.get("/plans")
-def get_available_plans():
+async def get_available_plans():
     """Get all available plans and their features"""
     from plan_limits import PLAN_LIMITS
     
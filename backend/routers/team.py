@@ -3,11 +3,12 @@ Team collaboration router for Business plan users
 Allows Business users to invite team members and collaborate
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime
-from database import get_db
+from database import get_async_db
 from models import User, TeamMember
 from routers.auth import get_current_user
 from plan_limits import can_access_feature, get_plan_limits
@@ -31,7 +32,7 @@ class TeamMemberResponse(BaseModel):
         from_attributes = True
 
 @router.get("/members", response_model=List[TeamMemberResponse])
-def get_team_members(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_team_members(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Get all team members for the current user's team"""
     # Check if user has team collaboration access
     can_access, message = can_access_feature(current_user, "team_collaboration")
@@ -39,11 +40,11 @@ def get_team_members(current_user: User = Depends(get_current_user), db: Session
         raise HTTPException(status_code=403, detail=message)
     
     # Get team members where user is the owner
-    team_members = db.query(TeamMember).filter(TeamMember.user_id == current_user.id).all()
+    team_members = (await db.execute(select(TeamMember).where(TeamMember.user_id == current_user.id))).scalars().all()
     return team_members
 
 @router.post("/invite", response_model=TeamMemberResponse)
-def invite_team_member(team_member: TeamMemberCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def invite_team_member(team_member: TeamMemberCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Invite a new team member"""
     # Check if user has team collaboration access
     can_access, message = can_access_feature(current_user, "team_collaboration")
@@ -52,7 +53,7 @@ def invite_team_member(team_member: TeamMemberCreate, current_user: User = Depen
     
     # Check team size limit
     limits = get_plan_limits(current_user.plan)
-    current_team_size = db.query(TeamMember).filter(TeamMember.user_id == current_user.id).count()
+    current_team_size = await db.scalar(select(func.count()).select_from(TeamMember).where(TeamMember.user_id == current_user.id))
     max_members = limits.get("max_team_members", 5)
     
     if current_team_size >= max_members:
@@ -62,10 +63,10 @@ def invite_team_member(team_member: TeamMemberCreate, current_user: User = Depen
         )
     
     # Check if member is already invited
-    existing = db.query(TeamMember).filter(
+    existing = (await db.execute(select(TeamMember).where(
         TeamMember.user_id == current_user.id,
         TeamMember.member_email == team_member.member_email
-    ).first()
+    ))).scalars().first()
     
     if existing:
         raise HTTPException(status_code=400, detail="Team member already invited")
@@ -81,8 +82,8 @@ def invite_team_member(team_member: TeamMemberCreate, current_user: User = Depen
         role=team_member.role
     )
     db.add(db_team_member)
-    db.commit()
-    db.refresh(db_team_member)
+    await db.commit()
+    await db.refresh(db_team_member)
     
     # TODO: Send invitation email
     # In production, you would send an email with an invitation link
@@ -90,7 +91,7 @@ def invite_team_member(team_member: TeamMemberCreate, current_user: User = Depen
     return db_team_member
 
 @router.delete("/members/{member_id}")
-def remove_team_member(member_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def remove_team_member(member_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Remove a team member"""
     # Check if user has team collaboration access
     can_access, message = can_access_feature(current_user, "team_collaboration")
@@ -98,25 +99,25 @@ def remove_team_member(member_id: int, current_user: User = Depends(get_current_
         raise HTTPException(status_code=403, detail=message)
     
     # Get team member
-    team_member = db.query(TeamMember).filter(
+    team_member = (await db.execute(select(TeamMember).where(
         TeamMember.id == member_id,
         TeamMember.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not team_member:
         raise HTTPException(status_code=404, detail="Team member not found")
     
-    db.delete(team_member)
-    db.commit()
+    await db.delete(team_member)
+    await db.commit()
     
     return {"message": "Team member removed successfully"}
 
 @router.put("/members/{member_id}/role")
-def update_team_member_role(
+async def update_team_member_role(
     member_id: int,
     role: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a team member's role"""
     # Check if user has team collaboration access
@@ -128,17 +129,17 @@ def update_team_member_role(
         raise HTTPException(status_code=400, detail="Invalid role. Must be 'owner', 'admin', or 'member'")
     
     # Get team member
-    team_member = db.query(TeamMember).filter(
+    team_member = (await db.execute(select(TeamMember).where(
         TeamMember.id == member_id,
         TeamMember.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if not team_member:
         raise HTTPException(status_code=404, detail="Team member not found")
     
     team_member.role = role
-    db.commit()
-    db.refresh(team_member)
+    await db.commit()
+    await db.refresh(team_member)
     
     return team_member
 
@@ -0,0 +1,47 @@
+"""
+Shared test fixtures
+Tests import the backend modules the way the app does (run from the backend directory) and never touch the
+development database or the shared snapshot directory
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_tmp = tempfile.mkdtemp(prefix="backend_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["DATASET_SNAPSHOT_DIR"] = os.path.join(_tmp, "snapshots")
+os.environ["RESULT_STORE_SPILL_DIR"] = _tmp
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from metadata_store import create_metadata_engine
+from models import User
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Session factory for a fresh metadata database with one user (id 1)"""
+    engine = create_metadata_engine(f"sqlite:///{tmp_path / 'metadata.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add(User(id=1, email="user@example.com", hashed_password="x"))
+    db.commit()
+    db.close()
+    yield factory
+    engine.dispose()
+
+@pytest.fixture
+def sales():
+    """Orders with a sorted id, random amounts, a low-cardinality region and a text customer column with nulls"""
+    rng = np.random.default_rng(3)
+    rows = 20000
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "amount": rng.integers(1, 10000, rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "customer": [f"Customer{i % 1500}" if i % 97 else None for i in range(rows)],
+    })
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import pytest
+from execution import admission
+from execution.admission import AdmissionRejected, AdmissionScheduler
+
+POLICIES = {
+    "free": {"weight": 1, "max_concurrent": 2, "max_queued": 2, "max_wait_seconds": 0.3},
+    "pro": {"weight": 4, "max_concurrent": 4, "max_queued": 8, "max_wait_seconds": 5},
+}
+
+@pytest.fixture(autouse=True)
+def policies(monkeypatch):
+    monkeypatch.setattr(admission, "get_admission_policy", lambda plan: POLICIES[plan])
+
+def test_slots_are_granted_up_to_the_plan_and_total_limits():
+    async def scenario():
+        scheduler = AdmissionScheduler(3)
+        free = [await scheduler.acquire("free") for _ in range(2)]
+        waiting = asyncio.ensure_future(scheduler.acquire("free"))
+        pro = await scheduler.acquire("pro")
+        await asyncio.sleep(0.05)
+        # free is at its own limit and the pro query took the last slot
+        assert not waiting.done()
+        
+        scheduler.release(free[0])
+        ticket = await asyncio.wait_for(waiting, 1)
+        for held in (free[1], pro, ticket):
+            scheduler.release(held)
+        assert scheduler._running == 0
+    
+    asyncio.run(scenario())
+
+def test_full_queues_and_long_waits_are_rejected():
+    async def scenario():
+        scheduler = AdmissionScheduler(1)
+        running = await scheduler.acquire("free")
+        queued = [asyncio.ensure_future(scheduler.acquire("free")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await scheduler.acquire("free")
+        assert full.value.retry_after >= 1
+        
+        # Nobody releases, so the queued queries run out of waiting time
+        for waiting in queued:
+            with pytest.raises(AdmissionRejected):
+                await waiting
+        assert len(scheduler._queues["free"]) == 0
+        scheduler.release(running)
+    
+    asyncio.run(scenario())
+
+def test_freed_slots_go_to_plans_by_weight():
+    async def scenario():
+        scheduler = AdmissionScheduler(1)
+        blocker = await scheduler.acquire("pro")
+        order = []
+        
+        async def query(plan: str):
+            ticket = await scheduler.acquire(plan)
+            order.append(plan)
+            scheduler.release(ticket)
+        
+        waiting = [asyncio.ensure_future(query("free")) for _ in range(2)]
+        waiting += [asyncio.ensure_future(query("pro")) for _ in range(4)]
+        await asyncio.sleep(0)
+        scheduler.release(blocker)
+        await asyncio.gather(*waiting)
+        return order
+    
+    order = asyncio.run(scenario())
+    # Four pro queries (weight 4) are served in the time one free query (weight 1) is
+    assert order.index("free") >= 3
+
+def test_cancelled_waiters_leave_the_queue():
+    async def scenario():
+        scheduler = AdmissionScheduler(1)
+        running = await scheduler.acquire("pro")
+        waiting = asyncio.ensure_future(scheduler.acquire("pro"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert len(scheduler._queues["pro"]) == 0
+        
+        scheduler.release(running)
+        assert scheduler._running == 0
+    
+    asyncio.run(scenario())
+
+def test_holds_keep_the_slot_until_released_from_another_thread():
+    async def scenario():
+        scheduler = AdmissionScheduler(1)
+        ticket = await scheduler.acquire("pro")
+        release_hold = scheduler.hold(ticket)
+        scheduler.release(ticket)
+        
+        waiting = asyncio.ensure_future(scheduler.acquire("pro"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        
+        # Background runs end in worker threads
+        threading.Thread(target=release_hold).start()
+        scheduler.release(await asyncio.wait_for(waiting, 1))
+    
+    asyncio.run(scenario())
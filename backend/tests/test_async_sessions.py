@@ -0,0 +1,48 @@
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+import database
+from database import ThreadedSession
+from metadata_store import create_async_metadata_engine, create_metadata_engine
+from models import Connection, User
+
+def test_async_sessions_read_and_write_the_metadata_store(session_factory, tmp_path):
+    engine = create_async_metadata_engine(f"sqlite:///{tmp_path / 'metadata.db'}")
+    assert engine.url.drivername == "sqlite+aiosqlite"
+    factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    
+    async def run():
+        async with factory() as db:
+            connection = Connection(name="sales", type="csv", details={}, user_id=1)
+            db.add(connection)
+            await db.commit()
+            names = (await db.execute(select(Connection.name).where(Connection.user_id == 1))).scalars().all()
+            user = await db.scalar(select(User).where(User.id == 1))
+        await engine.dispose()
+        return connection.id, names, user.email
+    
+    assert asyncio.run(run()) == (1, ["sales"], "user@example.com")
+
+def test_backends_without_an_async_driver_get_no_async_engine(monkeypatch):
+    monkeypatch.setattr("metadata_store.importlib.util.find_spec", lambda name: None)
+    assert create_async_metadata_engine("sqlite:///metadata.db") is None
+    assert create_async_metadata_engine("mssql+pyodbc://localhost/analyzer") is None
+
+def test_routes_fall_back_to_threadpooled_sync_sessions(session_factory, tmp_path, monkeypatch):
+    engine = create_metadata_engine(f"sqlite:///{tmp_path / 'metadata.db'}")
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+    monkeypatch.setattr(database, "ThreadedSessionLocal", sessionmaker(autoflush=False, expire_on_commit=False, bind=engine))
+    
+    async def run():
+        sessions = database.get_async_db()
+        db = await sessions.__anext__()
+        assert isinstance(db, ThreadedSession)
+        db.add(Connection(name="orders", type="csv", details={}, user_id=1))
+        await db.commit()
+        names = (await db.execute(select(Connection.name))).scalars().all()
+        await sessions.aclose()
+        return names
+    
+    assert asyncio.run(run()) == ["orders"]
+    engine.dispose()
@@ -0,0 +1,116 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import zipfile
+import pandas as pd
+import pytest
+from config import settings
+from connectors import csv_connector
+from connectors.compressed import ZSTD_AVAILABLE, DecompressedSizeExceeded, detect_compression, open_source, source_size
+from connectors.csv_connector import CSVConnector, read_csv_file
+from connectors.dataset_cache import dataset_cache
+
+@pytest.fixture
+def table():
+    return pd.DataFrame({"id": range(2000), "city": ["Lisbon", "Oslo"] * 1000, "value": [1.25] * 2000})
+
+def write(path, data: bytes, codec: str):
+    if codec == "gzip":
+        path.write_bytes(gzip.compress(data))
+    elif codec == "bz2":
+        path.write_bytes(bz2.compress(data))
+    elif codec == "xz":
+        path.write_bytes(lzma.compress(data))
+    elif codec == "zstd":
+        import zstandard
+        path.write_bytes(zstandard.ZstdCompressor().compress(data))
+    else:
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("data.csv", data)
+
+CODECS = ["gzip", "bz2", "xz", "zip"] + (["zstd"] if ZSTD_AVAILABLE else [])
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_compressed_files_read_like_the_plain_file(tmp_path, table, codec):
+    data = table.to_csv(index=False).encode("utf-8")
+    # The name says nothing about the format; the magic number does
+    path = tmp_path / "table.data"
+    write(path, data, codec)
+    
+    assert detect_compression(str(path)) == codec
+    pd.testing.assert_frame_equal(read_csv_file(str(path)), table)
+    assert source_size(str(path)) == len(data)
+
+@pytest.mark.parametrize("codec", ["gzip", "zip"])
+def test_decompression_stops_at_the_limit(tmp_path, codec):
+    # About 6MB of text that compresses to a few kilobytes
+    data = b"a,b\n" + b"1234567890,abcdefghij\n" * 300000
+    path = tmp_path / f"bomb.csv.{'gz' if codec == 'gzip' else 'zip'}"
+    write(path, data, codec)
+    assert os.path.getsize(path) < 100000
+    
+    with pytest.raises(DecompressedSizeExceeded):
+        read_csv_file(str(path), max_decompressed_bytes=1024 * 1024)
+    assert source_size(str(path), 1024 * 1024) == 1024 * 1024 + 1
+    with pytest.raises(ValueError, match="limit"):
+        CSVConnector().connect({"file_path": str(path), "max_decompressed_bytes": 1024 * 1024})
+
+def test_compressed_files_are_never_split_for_parallel_parsing(tmp_path, table, monkeypatch):
+    monkeypatch.setattr(settings, "parallel_csv_workers", 4)
+    monkeypatch.setattr(settings, "parallel_csv_min_bytes", 0)
+    monkeypatch.setattr(csv_connector, "read_csv_parallel", lambda *args: pytest.fail("split a compressed file"))
+    path = tmp_path / "table.csv.zip"
+    write(path, table.to_csv(index=False).encode("utf-8"), "zip")
+    pd.testing.assert_frame_equal(read_csv_file(str(path)), table)
+
+def test_zip_connections_cache_and_sample_through_the_stream(tmp_path, table):
+    path = tmp_path / "table.csv.zip"
+    write(path, table.to_csv(index=False).encode("utf-8"), "zip")
+    details = {"file_path": str(path)}
+    connector = CSVConnector()
+    try:
+        connector.connect(details)
+        pd.testing.assert_frame_equal(connector.df, table)
+        # Compressed files aren't tracked for appends
+        assert not connector.dataset.source_state
+        assert CSVConnector().row_count(details) == len(table)
+        dataset_cache.discard(os.path.abspath(str(path)))
+        sample, population = CSVConnector().sample(details, 100)
+        assert population == len(table) and len(sample) == 100
+    finally:
+        dataset_cache.discard(os.path.abspath(str(path)))
+
+def test_zip_archives_must_hold_exactly_one_file(tmp_path, table):
+    path = tmp_path / "two.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("a.csv", "x\n1\n")
+        archive.writestr("b.csv", "x\n2\n")
+    with pytest.raises(ValueError, match="exactly one file"):
+        read_csv_file(str(path))
+
+def test_unsupported_containers_are_rejected(tmp_path):
+    tar_path = tmp_path / "data.tar"
+    with tarfile.open(tar_path, "w") as archive:
+        info = tarfile.TarInfo("data.csv")
+        info.size = 4
+        archive.addfile(info, io.BytesIO(b"x\n1\n"))
+    seven_zip = tmp_path / "data.bin"
+    seven_zip.write_bytes(b"7z\xbc\xaf\x27\x1c" + b"\x00" * 32)
+    for path in (tar_path, seven_zip):
+        with pytest.raises(ValueError, match="Unsupported"):
+            read_csv_file(str(path))
+
+def test_plain_files_are_never_decompressed_by_name(tmp_path):
+    # pandas would pick gzip from the suffix and bypass the size limit
+    path = tmp_path / "mislabelled.csv.gz"
+    path.write_bytes(b"x\n1\n")
+    with pytest.raises(ValueError, match="says compressed"):
+        read_csv_file(str(path))
+    
+    plain = tmp_path / "plain.csv"
+    plain.write_bytes(b"x\n1\n")
+    with open_source(str(plain)) as source:
+        assert pd.read_csv(source)["x"].tolist() == [1]
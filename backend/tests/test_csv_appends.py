@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from connectors.csv_connector import CSVConnector
+from connectors.dataset_cache import dataset_cache
+from metrics import metrics
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "events.csv"
+    pd.DataFrame({"id": np.arange(1000), "amount": np.arange(1000) * 1.5, "kind": ["a", "b"] * 500}).to_csv(path, index=False)
+    yield str(path)
+    dataset_cache.discard(os.path.abspath(str(path)))
+
+def append(path: str, text: str):
+    with open(path, "a") as f:
+        f.write(text)
+
+def connect(path: str) -> CSVConnector:
+    connector = CSVConnector()
+    connector.connect({"file_path": path})
+    return connector
+
+def test_appended_rows_extend_the_cached_dataset(csv_path):
+    connect(csv_path)
+    appends = metrics.get("dataset_appends_total")
+    append(csv_path, "1000,1500.0,a\n1001,1501.5,b\n")
+    
+    connector = connect(csv_path)
+    assert metrics.get("dataset_appends_total") == appends + 1
+    pd.testing.assert_frame_equal(connector.df, pd.read_csv(csv_path), check_index_type=False)
+
+def test_files_without_a_trailing_newline_are_reparsed(csv_path):
+    with open(csv_path, "rb+") as f:
+        f.truncate(os.path.getsize(csv_path) - 1)
+    connect(csv_path)
+    appends = metrics.get("dataset_appends_total")
+    # The appended bytes continue the unterminated last row
+    append(csv_path, "9\n1000,1500.0,a\n")
+    
+    connector = connect(csv_path)
+    assert metrics.get("dataset_appends_total") == appends
+    pd.testing.assert_frame_equal(connector.df, pd.read_csv(csv_path))
+    assert connector.df["kind"].iloc[999] == "b9"
+
+def test_rewritten_files_are_reparsed(csv_path):
+    connect(csv_path)
+    appends = metrics.get("dataset_appends_total")
+    with open(csv_path, "r+") as f:
+        f.seek(len("id,amount,kind\n"))
+        f.write("7")
+    append(csv_path, "1000,1500.0,a\n")
+    
+    connector = connect(csv_path)
+    assert metrics.get("dataset_appends_total") == appends
+    pd.testing.assert_frame_equal(connector.df, pd.read_csv(csv_path))
+
+def test_appends_that_change_a_column_type_are_reparsed(csv_path):
+    connect(csv_path)
+    appends = metrics.get("dataset_appends_total")
+    append(csv_path, "1000,not a number,a\n")
+    
+    connector = connect(csv_path)
+    assert metrics.get("dataset_appends_total") == appends
+    pd.testing.assert_frame_equal(connector.df, pd.read_csv(csv_path))
+
+def test_appended_chunks_stream_only_the_new_rows(csv_path):
+    connector = connect(csv_path)
+    since = connector.get_data_version({"file_path": csv_path})
+    append(csv_path, "".join(f"{i},{i * 1.5},c\n" for i in range(1000, 1250)))
+    now = connector.get_data_version({"file_path": csv_path})
+    
+    # Served by parsing the tail alone, without connecting first
+    chunks = list(CSVConnector().iter_appended_chunks({"file_path": csv_path}, ["id", "kind"], 100, since, now))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    assert pd.concat(chunks)["id"].tolist() == list(range(1000, 1250))
+    
+    # Once the dataset is at the new version, the rows come from memory
+    connect(csv_path)
+    chunks = list(CSVConnector().iter_appended_chunks({"file_path": csv_path}, ["id"], 1000, since, now))
+    assert pd.concat(chunks)["id"].tolist() == list(range(1000, 1250))
+
+def test_unknown_history_gives_no_appended_chunks(csv_path):
+    connector = connect(csv_path)
+    now = connector.get_data_version({"file_path": csv_path})
+    assert connector.iter_appended_chunks({"file_path": csv_path}, ["id"], 100, "unknown-version", now) is None
+    assert CSVConnector().iter_appended_chunks({"file_path": "/missing.csv"}, ["id"], 100, "a", "b") is None
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from connectors.csv_connector import CSVConnector
+from connectors.dataset_cache import DatasetCache, dataset_cache
+
+def new_cache(tmp_path) -> DatasetCache:
+    return DatasetCache(1024 * 1024 * 1024, str(tmp_path / "snapshots"))
+
+def snapshot_files(tmp_path):
+    return sorted(os.listdir(tmp_path / "snapshots"))
+
+def test_other_processes_map_the_snapshot_instead_of_parsing(sales, tmp_path):
+    loads = []
+    
+    def loader():
+        loads.append(1)
+        return sales
+    
+    first = new_cache(tmp_path).get("sales.csv", "v1", loader)
+    # A fresh cache over the same directory stands in for another API worker
+    other = new_cache(tmp_path).get("sales.csv", "v1", loader)
+    assert loads == [1]
+    assert first.snapshot_path == other.snapshot_path
+    pd.testing.assert_frame_equal(other.df, sales)
+    
+    amounts = other.df["amount"].to_numpy()
+    assert not amounts.flags.writeable
+    if int(pd.__version__.split(".")[0]) >= 3:
+        assert isinstance(other.df["customer"].dtype, pd.StringDtype)
+
+def test_new_versions_replace_the_old_snapshot(sales, tmp_path):
+    cache = new_cache(tmp_path)
+    cache.get("sales.csv", "v1", lambda: sales)
+    old_files = snapshot_files(tmp_path)
+    cache.get("sales.csv", "v2", lambda: sales.head(10))
+    assert len(snapshot_files(tmp_path)) == len(old_files)
+    assert snapshot_files(tmp_path) != old_files
+    
+    cache.discard("sales.csv")
+    assert snapshot_files(tmp_path) == []
+
+def test_frames_that_change_in_arrow_stay_in_memory(tmp_path):
+    mixed = pd.DataFrame({"code": pd.Series(["a", 1, 2.5] * 10, dtype=object)})
+    dataset = new_cache(tmp_path).get("mixed.csv", "v1", lambda: mixed)
+    assert dataset.snapshot_path is None
+    pd.testing.assert_frame_equal(dataset.df, mixed)
+
+def test_structures_persist_next_to_the_snapshot_and_reload(sales, tmp_path):
+    cache = new_cache(tmp_path)
+    loads = []
+    
+    def loader():
+        loads.append(1)
+        return sales
+    
+    dataset = cache.get("sales.csv", "v1", loader)
+    for _ in range(settings.secondary_index_min_filters):
+        dataset.execute_filter("df[df['region'] == 'east']")
+        dataset.execute_filter("df[df['customer'].str.contains('mer14', case=False, na=False)]")
+    dataset.execute_filter("df[df['amount'] > 9000]")
+    
+    other = new_cache(tmp_path).get("sales.csv", "v1", loader)
+    assert loads == [1]
+    assert set(other.indexes) == {"region"}
+    assert set(other.ngram_indexes) == {"customer"}
+    # Equality filters scan zone maps until the column has an index
+    assert set(other.zone_maps) == {"amount", "region"}
+    pd.testing.assert_frame_equal(other.execute_filter("df[df['region'] == 'east']"), sales[sales["region"] == "east"], check_index_type=False)
+
+@pytest.fixture
+def connector(tmp_path):
+    path = str(tmp_path / "values.csv")
+    pd.DataFrame({"n": np.arange(100000) * 1.5, "label": ["x", "y"] * 50000}).to_csv(path, index=False)
+    connector = CSVConnector()
+    connector.connect({"file_path": path})
+    yield connector
+    dataset_cache.discard(os.path.abspath(path))
+
+def test_queries_read_the_mapped_frame_without_copying_it(connector):
+    result = connector.execute_query("df[['n']]")
+    assert np.shares_memory(result["n"].to_numpy(), connector.df["n"].to_numpy())
+
+def test_queries_that_write_leave_the_shared_frame_alone(connector):
+    before = connector.df.copy()
+    result = connector.execute_query("df.__setitem__('n', 0) or df.loc.__setitem__((df.index[:5], 'label'), 'z') or df")
+    assert (result["n"] == 0).all()
+    assert result["label"].iloc[:5].tolist() == ["z"] * 5
+    pd.testing.assert_frame_equal(connector.df, before)
@@ -0,0 +1,51 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import pytest
+from execution import serialization
+from execution.serialization import FastJSONResponse, dumps
+
+CONTENT = {
+    "count": np.int64(3),
+    "ratio": np.float32(0.5),
+    "missing": float("nan"),
+    "values": np.array([1, 2]),
+    "when": pd.Timestamp("2024-03-01 12:30"),
+    "never": pd.NaT,
+    "na": pd.NA,
+    "day": date(2024, 3, 1),
+    "price": Decimal("2.50"),
+    "tags": {"a"},
+    "stats": pd.Series({"std": np.nan, "mean": 2.0}),
+    "rows": pd.DataFrame({"x": [1.0, np.nan]}),
+}
+
+EXPECTED = {
+    "count": 3,
+    "ratio": 0.5,
+    "missing": None,
+    "values": [1, 2],
+    "when": "2024-03-01T12:30:00",
+    "never": None,
+    "na": None,
+    "day": "2024-03-01",
+    "price": 2.5,
+    "tags": ["a"],
+    "stats": {"std": None, "mean": 2.0},
+    "rows": [{"x": 1.0}, {"x": None}],
+}
+
+@pytest.mark.parametrize("orjson_available", [True, False])
+def test_numpy_and_pandas_values_encode_as_plain_json(monkeypatch, orjson_available):
+    monkeypatch.setattr(serialization, "ORJSON_AVAILABLE", orjson_available)
+    assert json.loads(dumps(CONTENT)) == EXPECTED
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+def test_response_renders_with_the_fast_encoder():
+    response = FastJSONResponse({"generated": datetime(2024, 1, 2, 3, 4), "mean": np.float64("nan")})
+    assert json.loads(response.body) == {"generated": "2024-01-02T03:04:00", "mean": None}
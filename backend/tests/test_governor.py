@@ -0,0 +1,113 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from execution.governor import (
+    QueryBudget, QueryMemoryLimitExceeded, QueryTimeLimitExceeded,
+    check_estimate, check_result, estimate_query_memory, run_with_deadline
+)
+from metrics import metrics
+
+def test_budget_from_plan_limits():
+    budget = QueryBudget.from_limits({"max_query_memory_mb": 256, "max_query_seconds": 30, "max_query_cpu_seconds": -1})
+    assert (budget.memory_bytes, budget.wall_seconds, budget.cpu_seconds) == (256 * 1024 * 1024, 30, None)
+    assert QueryBudget.from_limits({}).to_dict() == {"memory_bytes": None, "wall_seconds": None, "cpu_seconds": None}
+
+def test_estimates_grow_with_the_plan():
+    df = pd.DataFrame({"a": np.arange(100000), "b": np.arange(100000) * 1.0})
+    scan = estimate_query_memory(df, "df.head(10)")
+    grouped = estimate_query_memory(df, "df.groupby('a')['b'].sum()")
+    filtered = estimate_query_memory(df, "df[df['a'] > 5]")
+    assert scan < grouped
+    assert filtered == 2 * scan
+
+def test_plans_over_budget_are_refused_before_they_run():
+    df = pd.DataFrame({"a": np.arange(100000)})
+    check_estimate(df, "df[df['a'] > 5]", QueryBudget())
+    check_estimate(None, "df", QueryBudget(memory_bytes=1))
+    check_estimate(df, "df.head()", QueryBudget(memory_bytes=10 * 1024 * 1024))
+    with pytest.raises(QueryMemoryLimitExceeded) as error:
+        check_estimate(df, "df[df['a'] > 5]", QueryBudget(memory_bytes=1024 * 1024))
+    assert error.value.status_code == 413
+
+def test_results_over_budget_are_refused():
+    result = pd.DataFrame({"a": np.arange(1000000)})
+    check_result(result, QueryBudget(memory_bytes=100 * 1024 * 1024))
+    with pytest.raises(QueryMemoryLimitExceeded):
+        check_result(result, QueryBudget(memory_bytes=1024 * 1024))
+
+def test_deadline_returns_results_and_errors():
+    assert run_with_deadline(lambda: 42, QueryBudget()) == 42
+    assert run_with_deadline(lambda: 42, QueryBudget(wall_seconds=5)) == 42
+    with pytest.raises(ZeroDivisionError):
+        run_with_deadline(lambda: 1 / 0, QueryBudget(wall_seconds=5))
+
+def test_deadline_abandons_slow_runs_but_keeps_their_hold():
+    finish = threading.Event()
+    released = threading.Event()
+    holds = []
+    
+    def hold():
+        holds.append(1)
+        return released.set
+    
+    abandoned = metrics.get("query_governor_abandoned_running")
+    with pytest.raises(QueryTimeLimitExceeded) as error:
+        run_with_deadline(finish.wait, QueryBudget(wall_seconds=0.1), hold=hold)
+    assert error.value.status_code == 408
+    assert holds == [1]
+    # The abandoned run still holds its slot until it actually ends
+    assert not released.is_set()
+    assert metrics.get("query_governor_abandoned_running") == abandoned + 1
+    
+    finish.set()
+    assert released.wait(5)
+    time.sleep(0.05)
+    assert metrics.get("query_governor_abandoned_running") == abandoned
+
+def test_hold_is_released_after_a_run_in_time():
+    released = threading.Event()
+    run_with_deadline(lambda: None, QueryBudget(wall_seconds=5), hold=lambda: released.set)
+    assert released.wait(5)
+
+def test_workers_start_by_default_when_plans_limit_memory_or_cpu(monkeypatch):
+    import plan_limits
+    from execution.worker_pool import QueryWorkerPool
+    assert QueryWorkerPool(-1).handles("csv")
+    assert not QueryWorkerPool(0).handles("csv")
+    
+    unlimited = {plan: {**limits, "max_query_memory_mb": -1, "max_query_cpu_seconds": -1} for plan, limits in plan_limits.PLAN_LIMITS.items()}
+    monkeypatch.setattr(plan_limits, "PLAN_LIMITS", unlimited)
+    assert not QueryWorkerPool(-1).handles("csv")
+
+@pytest.fixture
+def worker_pool():
+    from execution.worker_pool import QueryWorkerPool
+    pool = QueryWorkerPool(1)
+    yield pool
+    pool.shutdown()
+
+@pytest.fixture
+def small_csv(tmp_path):
+    path = tmp_path / "small.csv"
+    pd.DataFrame({"a": np.arange(1000)}).to_csv(path, index=False)
+    return {"file_path": str(path)}
+
+def test_workers_stop_queries_past_their_cpu_time(worker_pool, small_csv):
+    with pytest.raises(QueryTimeLimitExceeded) as error:
+        worker_pool.execute(1, "csv", small_csv, "df['a'].map(lambda x: sum(range(200000)))", QueryBudget(cpu_seconds=0.2))
+    assert error.value.kind == "cpu"
+    # The worker carries on with the next query
+    assert worker_pool.execute(1, "csv", small_csv, "len(df)", QueryBudget(cpu_seconds=5))["result"][0] == 1000
+
+def test_workers_stop_queries_past_their_memory(worker_pool, small_csv):
+    with pytest.raises(QueryMemoryLimitExceeded):
+        worker_pool.execute(1, "csv", small_csv, "pd.Series(range(200000000)) + 1", QueryBudget(memory_bytes=64 * 1024 * 1024))
+    assert worker_pool.execute(1, "csv", small_csv, "len(df)")["result"][0] == 1000
+
+def test_workers_past_their_deadline_are_replaced(worker_pool, small_csv):
+    with pytest.raises(QueryTimeLimitExceeded) as error:
+        worker_pool.execute(1, "csv", small_csv, "__import__('time').sleep(5)", QueryBudget(wall_seconds=0.3))
+    assert error.value.kind == "time"
+    assert worker_pool.execute(1, "csv", small_csv, "len(df)")["result"][0] == 1000
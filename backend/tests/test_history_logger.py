@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+import threading
+import pytest
+from history_logger import MAX_WRITE_ATTEMPTS, HistoryLogger
+from models import Connection, QueryHistory, UsageCounter
+from usage import current_period
+
+@pytest.fixture
+def logger(session_factory):
+    db = session_factory()
+    db.add(Connection(id=1, name="sales", type="csv", details={"file_path": "sales.csv"}, user_id=1))
+    db.commit()
+    db.close()
+    history = HistoryLogger(session_factory, max_pending=100, batch_size=10, flush_interval=60)
+    yield history
+    history.close()
+
+def counts(session_factory):
+    db = session_factory()
+    try:
+        written = db.query(QueryHistory).count()
+        counter = db.query(UsageCounter).filter_by(user_id=1, period=current_period()).one_or_none()
+        connection = db.get(Connection, 1)
+        return written, counter.query_count if counter else 0, connection.last_used if connection else None
+    finally:
+        db.close()
+
+def test_flush_writes_history_usage_and_last_used(logger, session_factory):
+    for i in range(25):
+        logger.log(1, f"query {i}", source_id=1, executed_query="df", result_count=i)
+    logger.flush()
+    
+    written, counted, last_used = counts(session_factory)
+    assert (written, counted) == (25, 25)
+    assert last_used is not None
+
+def test_a_bad_row_does_not_hold_back_its_batch(logger, session_factory):
+    for i in range(10):
+        logger.log(1, None if i == 4 else f"query {i}")
+    logger.flush()
+    assert counts(session_factory)[:2] == (9, 9)
+    
+    # The bad row is retried on its own a few times, then dropped
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        logger.flush()
+    assert len(logger._entries) == 0
+    assert counts(session_factory)[:2] == (9, 9)
+
+def test_database_errors_keep_the_whole_batch(logger, session_factory, monkeypatch):
+    for i in range(5):
+        logger.log(1, f"query {i}", source_id=1)
+    original = logger._commit
+    
+    def unavailable(batch, last_used):
+        raise OSError("database unavailable")
+    
+    monkeypatch.setattr(logger, "_commit", unavailable)
+    logger.flush()
+    assert len(logger._entries) == 5
+    
+    monkeypatch.setattr(logger, "_commit", original)
+    logger.flush()
+    assert counts(session_factory)[:2] == (5, 5)
+
+def test_full_buffers_are_written_by_the_caller(session_factory):
+    logger = HistoryLogger(session_factory, max_pending=5, batch_size=5, flush_interval=60)
+    # Keep the background writer from draining the buffer
+    logger._thread = threading.current_thread()
+    for i in range(12):
+        logger.log(1, f"query {i}")
+    
+    assert len(logger._entries) <= 5
+    assert counts(session_factory)[0] >= 7
+    logger._thread = None
+    logger.close()
+    assert counts(session_factory)[:2] == (12, 12)
+
+def test_write_returns_the_id_of_an_entry_written_at_once(logger, session_factory):
+    entry_id = logger.write(1, "logged by hand", source_id=1)
+    assert len(logger._entries) == 0
+    
+    db = session_factory()
+    entry = db.get(QueryHistory, entry_id)
+    assert entry.query_text == "logged by hand"
+    db.close()
+    written, counted, last_used = counts(session_factory)
+    assert (written, counted) == (1, 1)
+    assert last_used is not None
+
+def test_entries_are_stamped_in_utc(logger):
+    logger.log(1, "query")
+    created_at = logger._entries[0][1]["created_at"]
+    assert created_at.utcoffset() == timedelta(0)
+    assert abs(datetime.now(timezone.utc) - created_at) < timedelta(minutes=1)
@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+from config import settings
+from main import app
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def test_metrics_are_hidden_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "")
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 404
+
+def test_metrics_require_the_configured_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "scrape-me")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+    assert response.status_code == 200
+    assert "# TYPE" in response.text
@@ -0,0 +1,33 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from execution.serialization import NDJSON_MEDIA_TYPE, iter_ndjson, negotiate_format
+
+def test_header_line_comes_first_and_every_row_follows():
+    df = pd.DataFrame({"id": np.arange(12), "value": np.linspace(0, 1, 12)})
+    chunks = list(iter_ndjson({"summary": "twelve rows", "total_rows": 12}, df, chunk_rows=5))
+    # Header plus one chunk per five rows
+    assert len(chunks) == 4
+    
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert json.loads(lines[0]) == {"summary": "twelve rows", "total_rows": 12}
+    rows = [json.loads(line) for line in lines[1:]]
+    assert [row["id"] for row in rows] == list(range(12))
+    # Floats keep 15 significant digits rather than to_json's default of 10
+    assert [row["value"] for row in rows] == pytest.approx(df["value"].tolist(), rel=1e-14)
+
+def test_missing_values_and_timestamps_are_valid_json():
+    df = pd.DataFrame({"when": pd.to_datetime(["2024-01-02", None]), "value": [np.nan, 1.5]})
+    lines = b"".join(iter_ndjson({}, df)).decode("utf-8").splitlines()
+    rows = [json.loads(line) for line in lines[1:]]
+    assert rows[0]["value"] is None and rows[1]["when"] is None
+    assert rows[0]["when"].startswith("2024-01-02T00:00:00")
+
+def test_empty_results_stream_only_the_header():
+    assert list(iter_ndjson({"total_rows": 0}, pd.DataFrame({"a": []}))) == [b'{"total_rows": 0}\n']
+
+def test_ndjson_is_negotiated_from_the_accept_header():
+    assert negotiate_format("application/x-ndjson") == NDJSON_MEDIA_TYPE
+    assert negotiate_format("text/html, application/x-ndjson;q=0.9") == NDJSON_MEDIA_TYPE
+    assert negotiate_format("application/json") != NDJSON_MEDIA_TYPE
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from connectors.dataset_cache import CachedDataset
+from connectors.dataset_indexes import NgramIndex
+
+@pytest.mark.parametrize("pattern", ["cust", "OMER14", "er9", "xyz", "9"])
+def test_trigram_search_matches_pandas_contains(sales, pattern):
+    index = NgramIndex.build(sales["customer"])
+    expected = np.flatnonzero(sales["customer"].str.contains(pattern, case=False, regex=False, na=False))
+    assert np.array_equal(index.search(pattern), expected)
+
+def test_trigram_prefix_search_matches_pandas_startswith(sales):
+    index = NgramIndex.build(sales["customer"])
+    expected = np.flatnonzero(sales["customer"].str.lower().str.startswith("customer14", na=False))
+    assert np.array_equal(index.search("Customer14", prefix=True), expected)
+
+def test_trigram_index_survives_the_sidecar_array_round_trip(sales):
+    index = NgramIndex.build(sales["customer"])
+    restored = NgramIndex.from_arrays(index.to_arrays())
+    assert np.array_equal(restored.search("mer12"), index.search("mer12"))
+
+@pytest.mark.parametrize("query", [
+    "df[df['customer'].str.contains('mer14', case=False, na=False)]",
+    "df[df['customer'].str.lower().str.startswith('customer3', na=False)]",
+])
+def test_text_filters_match_plain_pandas(sales, query):
+    dataset = CachedDataset("sales", sales, "v1", None)
+    expected = eval(query, {"df": sales})
+    # The index is built once a column has been searched often enough (None leaves a run to plain pandas)
+    for _ in range(settings.secondary_index_min_filters + 1):
+        result = dataset.execute_filter(query)
+        if result is not None:
+            pd.testing.assert_frame_equal(result, expected)
+    assert result is not None
+
+def test_non_text_columns_get_no_trigram_index(sales):
+    dataset = CachedDataset("sales", sales, "v1", None)
+    for _ in range(settings.secondary_index_min_filters + 1):
+        assert dataset.execute_filter("df[df['amount'].str.contains('12', case=False, na=False)]") is None
@@ -0,0 +1,61 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from connectors.csv_connector import read_csv_file
+from connectors.parallel_csv import read_csv_parallel, split_ranges
+
+@pytest.fixture
+def quoted_csv(tmp_path):
+    """Rows with commas, escaped quotes and line breaks inside quoted fields"""
+    path = tmp_path / "quoted.csv"
+    df = pd.DataFrame({
+        "id": np.arange(3000),
+        "note": [f'line {i}\n"quoted", more' if i % 3 == 0 else f"plain {i}" for i in range(3000)],
+        "value": np.linspace(0, 1, 3000),
+    })
+    df.to_csv(path, index=False)
+    return str(path), df
+
+def test_ranges_start_at_record_boundaries(quoted_csv):
+    path, df = quoted_csv
+    header, ranges = split_ranges(path, 7)
+    assert header == b"id,note,value\n"
+    assert ranges[0][0] == len(header)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    
+    rows = 0
+    with open(path, "rb") as f:
+        data = f.read()
+    for start, end in ranges:
+        part = pd.read_csv(io.BytesIO(header + data[start:end]))
+        rows += len(part)
+    assert rows == len(df)
+
+def test_parallel_parse_matches_a_single_pass(quoted_csv):
+    path, _ = quoted_csv
+    pd.testing.assert_frame_equal(read_csv_parallel(path, 4), pd.read_csv(path))
+
+def test_columns_typed_differently_per_range_get_one_dtype(tmp_path):
+    # Numbers in the first ranges, text at the end: a single pass reads the whole column as text
+    codes = [str(i) for i in range(4000)] + ["A1"]
+    path = tmp_path / "codes.csv"
+    pd.DataFrame({"code": codes, "n": np.arange(4001)}).to_csv(path, index=False)
+    
+    parallel = read_csv_parallel(str(path), 4)
+    pd.testing.assert_frame_equal(parallel, pd.read_csv(path, low_memory=False))
+    assert parallel["code"].map(type).nunique() == 1
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_serial_and_parallel_reads_use_the_same_options(tmp_path, monkeypatch, workers):
+    # Long enough for the low_memory parser to type the column per internal block
+    codes = [str(i) for i in range(600000)] + ["A1"]
+    path = tmp_path / "long.csv"
+    pd.DataFrame({"code": codes}).to_csv(path, index=False)
+    monkeypatch.setattr(settings, "parallel_csv_workers", workers)
+    monkeypatch.setattr(settings, "parallel_csv_min_bytes", 0)
+    
+    df = read_csv_file(str(path))
+    assert df["code"].map(type).nunique() == 1
+    assert df["code"].iat[0] == "0"
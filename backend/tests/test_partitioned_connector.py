@@ -0,0 +1,80 @@
+import gzip
+import numpy as np
+import pandas as pd
+import pytest
+from connectors.partitioned_connector import PartitionedCSVConnector, discover_files
+from metrics import metrics
+
+PARTITIONS = [("east", 2024), ("east", 2025), ("west", 2024), ("west", 2025)]
+
+@pytest.fixture
+def sales_dir(tmp_path):
+    """sales/region=<r>/year=<y>/part-0.csv, with the last partition gzipped"""
+    root = tmp_path / "sales"
+    frames = []
+    for i, (region, year) in enumerate(PARTITIONS):
+        directory = root / f"region={region}" / f"year={year}"
+        directory.mkdir(parents=True)
+        df = pd.DataFrame({"order_id": np.arange(i * 100, i * 100 + 100), "amount": np.arange(100) * (i + 1)})
+        if i == len(PARTITIONS) - 1:
+            with gzip.open(directory / "part-0.csv.gz", "wt") as f:
+                df.to_csv(f, index=False)
+        else:
+            df.to_csv(directory / "part-0.csv", index=False)
+        frames.append(df.assign(region=region, year=year))
+    details = {"path": str(root)}
+    yield details, pd.concat(frames, ignore_index=True)
+    PartitionedCSVConnector().discard_cached(details)
+
+def connect(details: dict) -> PartitionedCSVConnector:
+    connector = PartitionedCSVConnector()
+    connector.connect(details)
+    return connector
+
+def test_partition_keys_are_typed_and_listed_after_the_data_columns(sales_dir):
+    details, _ = sales_dir
+    connector = connect(details)
+    assert connector.get_schema() == {"columns": ["order_id", "amount", "region", "year"], "partition_keys": ["region", "year"]}
+    assert connector.partitions[0] == {"region": "east", "year": 2024}
+    assert discover_files(details["path"] + "/region=west/*/*.csv*") == connector.files[2:]
+
+@pytest.mark.parametrize("query, files_read", [
+    ("df[df['region'] == 'west']", 2),
+    ("df[df['year'] > 2024]", 2),
+    ("df[df['year'] < 2000]", 0),
+    ("df[df['amount'] > 150]", 4),
+    ("df.groupby('year')['amount'].sum().reset_index()", 4),
+])
+def test_queries_read_only_the_partitions_they_can_match(sales_dir, query, files_read):
+    details, everything = sales_dir
+    read = metrics.get("partition_files_read_total")
+    pruned = metrics.get("partition_files_pruned_total")
+    
+    result = connect(details).execute_query(query)
+    expected = eval(query, {"df": everything})
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+    assert metrics.get("partition_files_read_total") - read == files_read
+    assert metrics.get("partition_files_pruned_total") - pruned == len(PARTITIONS) - files_read
+
+def test_chunks_carry_partition_values(sales_dir):
+    details, everything = sales_dir
+    chunks = list(connect(details).iter_chunks(details, ["region", "amount"], 60))
+    streamed = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(streamed, everything[["region", "amount"]], check_dtype=False)
+    assert connect(details).row_count(details) == len(everything)
+
+def test_new_partition_files_change_the_data_version(sales_dir, tmp_path):
+    details, _ = sales_dir
+    connector = PartitionedCSVConnector()
+    version = connector.get_data_version(details)
+    assert connector.get_data_version(details) == version
+    
+    extra = tmp_path / "sales" / "region=north" / "year=2025"
+    extra.mkdir(parents=True)
+    pd.DataFrame({"order_id": [1], "amount": [1]}).to_csv(extra / "part-0.csv", index=False)
+    assert connector.get_data_version(details) != version
+    assert len(connect(details).files) == len(PARTITIONS) + 1
+
+def test_empty_directories_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        connect({"path": str(tmp_path)})
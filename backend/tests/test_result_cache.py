@@ -0,0 +1,91 @@
+import pandas as pd
+from config import settings
+from execution import result_cache as result_cache_module
+from execution.result_cache import QueryResultCache, estimate_size, get_plan_ttl
+
+def frame(rows: int = 10) -> pd.DataFrame:
+    return pd.DataFrame({"a": range(rows), "b": [float(i) for i in range(rows)]})
+
+def test_hit_at_same_version_and_miss_after_version_change():
+    cache = QueryResultCache(10 * 1024 * 1024)
+    df = frame()
+    key = cache.make_key(1, "df.head(10)", "v1")
+    cache.put(key, df, 60)
+    
+    pd.testing.assert_frame_equal(cache.get(cache.make_key(1, "df.head(10)", "v1")), df)
+    assert cache.get(cache.make_key(1, "df.head(10)", "v2")) is None
+    assert cache.get(cache.make_key(2, "df.head(10)", "v1")) is None
+
+def test_new_version_replaces_stale_entries_of_the_same_plan():
+    cache = QueryResultCache(10 * 1024 * 1024)
+    df = frame()
+    cache.put(cache.make_key(1, "df", "v1"), df, 60)
+    cache.put(cache.make_key(1, "df.head(1)", "v1"), df, 60)
+    cache.put(cache.make_key(1, "df", "v2"), df, 60)
+    
+    assert cache.get(cache.make_key(1, "df", "v1")) is None
+    assert cache.get(cache.make_key(1, "df.head(1)", "v1")) is not None
+    assert cache.current_bytes == 2 * estimate_size(df)
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    cache = QueryResultCache(10 * 1024 * 1024)
+    now = [1000.0]
+    monkeypatch.setattr(result_cache_module.time, "monotonic", lambda: now[0])
+    key = cache.make_key(1, "df", "v1")
+    cache.put(key, frame(), 30)
+    
+    now[0] += 29
+    assert cache.get(key) is not None
+    now[0] += 1
+    assert cache.get(key) is None
+    assert cache.current_bytes == 0
+
+def test_byte_budget_evicts_least_recently_used():
+    df = frame(100)
+    cache = QueryResultCache(estimate_size(df) * 2)
+    first, second, third = (cache.make_key(1, f"q{i}", "v1") for i in range(3))
+    cache.put(first, df, 60)
+    cache.put(second, df, 60)
+    cache.get(first)
+    cache.put(third, df, 60)
+    
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
+    assert cache.current_bytes <= cache.max_bytes
+
+def test_oversized_results_and_zero_ttl_are_not_stored():
+    df = frame(100)
+    cache = QueryResultCache(estimate_size(df) - 1)
+    cache.put(cache.make_key(1, "df", "v1"), df, 60)
+    assert cache.get(cache.make_key(1, "df", "v1")) is None
+    
+    cache = QueryResultCache(10 * 1024 * 1024)
+    cache.put(cache.make_key(1, "df", "v1"), df, 0)
+    assert cache.get(cache.make_key(1, "df", "v1")) is None
+
+def test_invalidate_connection_drops_results_and_schema():
+    cache = QueryResultCache(10 * 1024 * 1024)
+    cache.put(cache.make_key(1, "df", "v1"), frame(), 60)
+    cache.put(cache.make_key(2, "df", "v1"), frame(), 60)
+    cache.put_schema(1, "v1", {"columns": ["a"]})
+    cache.invalidate_connection(1)
+    
+    assert cache.get(cache.make_key(1, "df", "v1")) is None
+    assert cache.get(cache.make_key(2, "df", "v1")) is not None
+    assert cache.get_schema(1, "v1") is None
+    assert cache.current_bytes == estimate_size(frame())
+
+def test_schema_cache_needs_a_matching_version():
+    cache = QueryResultCache(1024)
+    cache.put_schema(1, None, {"columns": ["a"]})
+    assert cache.get_schema(1, None) is None
+    
+    cache.put_schema(1, "v1", {"columns": ["a"]})
+    assert cache.get_schema(1, "v1") == {"columns": ["a"]}
+    assert cache.get_schema(1, "v2") is None
+
+def test_unversioned_sources_get_the_short_ttl():
+    assert get_plan_ttl({"operation": "comparison"}, "v1") == 1800
+    assert get_plan_ttl({"operation": "comparison"}, None) == settings.result_cache_unversioned_ttl_seconds
+    assert get_plan_ttl({"operation": "unknown"}, "v1") == settings.result_cache_default_ttl_seconds
@@ -0,0 +1,64 @@
+import io
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from execution import serialization
+from execution.serialization import (
+    ARROW_STREAM_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE, JSON_MEDIA_TYPE,
+    arrow_schema, columnar_json, columnar_json_response, iter_arrow_stream, negotiate_format
+)
+
+@pytest.fixture
+def result():
+    return pd.DataFrame({
+        "region": ["north", "south", None],
+        "amount": [1.5, np.nan, 3.0],
+        "orders": np.array([1, 2, 3], dtype=np.int64),
+    })
+
+def test_columnar_json_lists_columns_and_row_values(result):
+    assert json.loads(columnar_json(result)) == {
+        "columns": ["region", "amount", "orders"],
+        "data": [["north", 1.5, 1], ["south", None, 2], [None, 3.0, 3]],
+    }
+
+def test_columnar_json_keeps_float_precision():
+    values = json.loads(columnar_json(pd.DataFrame({"third": [1 / 3]})))["data"]
+    assert values[0][0] == pytest.approx(1 / 3, rel=1e-14)
+
+def test_columnar_response_embeds_the_rows_next_to_the_other_fields(result):
+    response = columnar_json_response({"summary": "three rows"}, result)
+    body = json.loads(response.body)
+    assert response.media_type == COLUMNAR_JSON_MEDIA_TYPE
+    assert body["summary"] == "three rows"
+    assert body["results"]["data"][0] == ["north", 1.5, 1]
+    assert json.loads(columnar_json_response({}, result).body)["results"]["columns"] == ["region", "amount", "orders"]
+
+def test_arrow_stream_round_trips_with_metadata(result):
+    schema = arrow_schema(result, {"summary": "three rows", "total_rows": 3})
+    stream = b"".join(iter_arrow_stream(result, schema, chunk_rows=2))
+    
+    reader = pa.ipc.open_stream(io.BytesIO(stream))
+    table = reader.read_all()
+    assert table.num_rows == 3
+    assert json.loads(table.schema.metadata[b"summary"]) == "three rows"
+    assert json.loads(table.schema.metadata[b"total_rows"]) == 3
+    pd.testing.assert_frame_equal(table.to_pandas(), result, check_dtype=False)
+
+@pytest.mark.parametrize("accept, expected", [
+    (ARROW_STREAM_MEDIA_TYPE, ARROW_STREAM_MEDIA_TYPE),
+    (COLUMNAR_JSON_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE),
+    ("application/json", JSON_MEDIA_TYPE),
+    ("*/*", JSON_MEDIA_TYPE),
+    (None, JSON_MEDIA_TYPE),
+])
+def test_formats_are_negotiated_from_the_accept_header(accept, expected):
+    assert negotiate_format(accept) == expected
+
+def test_arrow_without_pyarrow_falls_back_or_fails(monkeypatch):
+    monkeypatch.setattr(serialization, "ARROW_AVAILABLE", False)
+    assert negotiate_format(f"{ARROW_STREAM_MEDIA_TYPE}, application/json") == JSON_MEDIA_TYPE
+    with pytest.raises(ValueError):
+        negotiate_format(ARROW_STREAM_MEDIA_TYPE)
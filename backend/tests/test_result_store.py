@@ -0,0 +1,106 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from execution import result_store as result_store_module
+from execution.result_cache import estimate_size
+from execution.result_store import ResultStore
+
+def frame(rows: int = 1000, start: int = 0) -> pd.DataFrame:
+    return pd.DataFrame({"id": np.arange(start, start + rows), "value": np.arange(rows) * 0.5})
+
+def test_pages_match_slices_of_the_result(tmp_path):
+    store = ResultStore(10 * 1024 * 1024, 60, str(tmp_path))
+    df = frame()
+    token = store.put(df, user_id=1)
+    
+    page, total = store.get_page(token, 1, 100, 50)
+    assert total == len(df)
+    pd.testing.assert_frame_equal(page, df.iloc[100:150])
+    pd.testing.assert_frame_equal(store.get(token, 1), df)
+    assert store.get_page(token, 1, 990, 50)[0].equals(df.iloc[990:])
+    store.close()
+
+def test_results_are_private_to_their_owner(tmp_path):
+    store = ResultStore(10 * 1024 * 1024, 60, str(tmp_path))
+    token = store.put(frame(), user_id=1)
+    
+    assert store.get(token, 2) is None
+    assert store.get("unknown-token", 1) is None
+    store.close()
+
+def test_results_over_budget_spill_to_disk_and_read_back(tmp_path):
+    df = frame()
+    store = ResultStore(estimate_size(df), 60, str(tmp_path))
+    first = store.put(df, user_id=1)
+    second = store.put(frame(start=5000), user_id=1)
+    
+    assert store.memory_bytes <= store.max_memory_bytes
+    assert len(os.listdir(store._spill_dir)) == 1
+    pd.testing.assert_frame_equal(store.get(first, 1), df)
+    # Reading the spilled result back spills the other one to stay within budget
+    assert store.memory_bytes <= store.max_memory_bytes
+    pd.testing.assert_frame_equal(store.get(second, 1), frame(start=5000))
+    store.close()
+
+def test_expired_results_are_purged_with_their_spill_files(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_store_module.time, "monotonic", lambda: now[0])
+    df = frame()
+    store = ResultStore(estimate_size(df), 30, str(tmp_path))
+    old = store.put(df, user_id=1)
+    store.put(frame(start=5000), user_id=1)
+    spill_dir = store._spill_dir
+    assert os.listdir(spill_dir)
+    
+    now[0] += 31
+    assert store.get(old, 1) is None
+    assert os.listdir(spill_dir) == []
+    assert store.memory_bytes == 0
+    store.close()
+
+def test_browsing_keeps_a_result_alive(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_store_module.time, "monotonic", lambda: now[0])
+    store = ResultStore(10 * 1024 * 1024, 30, str(tmp_path))
+    token = store.put(frame(), user_id=1)
+    
+    for _ in range(3):
+        now[0] += 20
+        assert store.get_page(token, 1, 0, 10) is not None
+    store.close()
+
+def test_close_removes_the_spill_directory(tmp_path):
+    df = frame()
+    store = ResultStore(estimate_size(df), 60, str(tmp_path))
+    store.put(df, user_id=1)
+    store.put(frame(start=5000), user_id=1)
+    spill_dir = store._spill_dir
+    store.close()
+    
+    assert not os.path.exists(spill_dir)
+    assert store.memory_bytes == 0
+
+def test_concurrent_puts_and_reads_stay_within_budget(tmp_path):
+    df = frame()
+    store = ResultStore(estimate_size(df) * 3, 60, str(tmp_path))
+    errors = []
+    
+    def worker(user_id: int):
+        try:
+            for i in range(10):
+                expected = frame(start=user_id * 1000 + i)
+                token = store.put(expected, user_id)
+                pd.testing.assert_frame_equal(store.get(token, user_id), expected)
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    assert store.memory_bytes <= store.max_memory_bytes + estimate_size(df)
+    store.close()
@@ -0,0 +1,107 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from connectors.csv_connector import CSVConnector
+from connectors.dataset_cache import dataset_cache
+from execution.rollups import RollupCube, RollupManager
+from metrics import metrics
+from models import Connection, QueryHistory
+
+@pytest.fixture
+def orders(tmp_path):
+    rng = np.random.default_rng(21)
+    rows = 5000
+    df = pd.DataFrame({
+        "store": rng.integers(1, 20, rows),
+        "amount": rng.normal(50, 10, rows).round(2),
+    })
+    path = tmp_path / "orders.csv"
+    df.to_csv(path, index=False)
+    yield str(path), df
+    dataset_cache.discard(os.path.abspath(str(path)))
+
+@pytest.fixture
+def history(session_factory, orders):
+    """A connection whose history has grouped amount by store often enough to roll it up"""
+    db = session_factory()
+    db.add(Connection(id=1, name="orders", type="csv", details={"file_path": orders[0]}, user_id=1))
+    for _ in range(3):
+        db.add(QueryHistory(user_id=1, source_id=1, query_text="total amount by store",
+                            executed_query="df.groupby('store')['amount'].sum().reset_index()"))
+    db.commit()
+    yield db
+    db.close()
+
+def plan(agg: str) -> dict:
+    return {"query": f"df.groupby('store')['amount'].{agg}().reset_index()"}
+
+@pytest.mark.parametrize("agg", ["sum", "mean", "min", "max", "count"])
+def test_cubes_merge_chunks_into_exact_group_by_answers(orders, agg):
+    _, df = orders
+    cube = RollupCube("store", "amount")
+    for start in range(0, len(df), 700):
+        cube.update(df.iloc[start:start + 700])
+    
+    expected = getattr(df.groupby("store")["amount"], agg)().reset_index()
+    pd.testing.assert_frame_equal(cube.answer(agg), expected, check_dtype=False, check_exact=False)
+
+def test_text_measures_are_not_rolled_up():
+    with pytest.raises(ValueError):
+        RollupCube("store", "note").update(pd.DataFrame({"store": [1], "note": ["x"]}))
+
+def test_hot_group_bys_are_answered_from_a_cube_until_the_file_changes(orders, history):
+    path, df = orders
+    manager = RollupManager()
+    details = {"file_path": path}
+    builds = metrics.get("query_rollup_builds_total")
+    
+    answer = manager.answer(CSVConnector(), 1, details, "v1", plan("mean"), history)
+    pd.testing.assert_frame_equal(answer, df.groupby("store")["amount"].mean().reset_index(), check_dtype=False)
+    manager.answer(CSVConnector(), 1, details, "v1", plan("max"), history)
+    assert metrics.get("query_rollup_builds_total") == builds + 1
+    
+    manager.answer(CSVConnector(), 1, details, "v2", plan("sum"), history)
+    assert metrics.get("query_rollup_builds_total") == builds + 2
+    # Cold pairs and unversioned sources are left to the query
+    assert manager.answer(CSVConnector(), 1, details, "v2", {"query": "df.groupby('amount')['store'].sum().reset_index()"}, history) is None
+    assert manager.answer(CSVConnector(), 1, details, None, plan("sum"), history) is None
+
+def test_chunks_parse_keys_the_same_way_throughout_the_file(tmp_path, history, monkeypatch):
+    monkeypatch.setattr("execution.rollups.ROLLUP_CHUNK_ROWS", 100)
+    # Store ids are whole numbers in the first chunk and missing further on
+    df = pd.DataFrame({"store": [i % 7 for i in range(300)], "amount": np.arange(300.0)})
+    df.loc[250:, "store"] = None
+    path = tmp_path / "sparse.csv"
+    df.to_csv(path, index=False, float_format="%g")
+    
+    answer = RollupManager().answer(CSVConnector(), 1, {"file_path": str(path)}, "v1", plan("count"), history)
+    assert answer["store"].tolist() == list(range(7))
+    assert answer["amount"].tolist() == df.groupby("store")["amount"].count().tolist()
+
+def test_keys_that_change_type_mid_file_fall_back_to_the_query(tmp_path, history, monkeypatch):
+    monkeypatch.setattr("execution.rollups.ROLLUP_CHUNK_ROWS", 100)
+    # "5" in the last chunk would otherwise group apart from the 5 parsed as a number earlier
+    stores = [str(i % 7) for i in range(300)]
+    stores[-1] = "online"
+    path = tmp_path / "mixed.csv"
+    pd.DataFrame({"store": stores, "amount": np.arange(300.0)}).to_csv(path, index=False)
+    
+    assert RollupManager().answer(CSVConnector(), 1, {"file_path": str(path)}, "v1", plan("sum"), history) is None
+
+def test_cached_datasets_feed_cubes_with_their_own_dtypes(tmp_path, history, monkeypatch):
+    monkeypatch.setattr("execution.rollups.ROLLUP_CHUNK_ROWS", 100)
+    stores = [str(i % 7) for i in range(300)]
+    stores[-1] = "online"
+    path = str(tmp_path / "mixed.csv")
+    df = pd.DataFrame({"store": stores, "amount": np.arange(300.0)})
+    df.to_csv(path, index=False)
+    connector = CSVConnector()
+    connector.connect({"file_path": path})
+    try:
+        answer = RollupManager().answer(connector, 1, {"file_path": path}, "v1", plan("sum"), history)
+        expected = connector.df.groupby("store")["amount"].sum().reset_index()
+        pd.testing.assert_frame_equal(answer, expected, check_dtype=False)
+        assert len(answer) == 8
+    finally:
+        dataset_cache.discard(os.path.abspath(path))
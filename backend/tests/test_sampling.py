@@ -0,0 +1,111 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from connectors import csv_connector
+from connectors.base import BaseConnector
+from connectors.csv_connector import CSVConnector
+from connectors.dataset_cache import dataset_cache
+from execution.sampling import estimate, run_approximate, sample_store
+
+POPULATION = 100000
+
+@pytest.fixture
+def population():
+    rng = np.random.default_rng(11)
+    return pd.DataFrame({
+        "region": rng.choice(["north", "south"], POPULATION),
+        "amount": rng.normal(100, 20, POPULATION),
+        "note": np.where(rng.random(POPULATION) < 0.3, None, "x"),
+    })
+
+@pytest.fixture
+def sample(population):
+    return population.sample(n=5000, random_state=5).reset_index(drop=True)
+
+def covers(interval, value):
+    return interval["lower"] <= value <= interval["upper"]
+
+def test_grouped_means_and_sums_have_intervals_around_the_exact_values(population, sample):
+    for agg in ("mean", "sum"):
+        query = f"df.groupby('region')['amount'].{agg}().reset_index()"
+        result, intervals, total_rows = estimate(sample, POPULATION, {"query": query, "operation": "average" if agg == "mean" else "sum"})
+        exact = getattr(population.groupby("region")["amount"], agg)()
+        assert total_rows == 2
+        assert result["region"].tolist() == ["north", "south"]
+        for interval in intervals:
+            assert covers(interval, exact[interval["label"]])
+
+def test_counts_medians_and_row_counts(population, sample):
+    _, (interval,), _ = estimate(sample, POPULATION, {"query": "df['note'].count()", "operation": "count"})
+    assert covers(interval, population["note"].count())
+    
+    _, (interval,), _ = estimate(sample, POPULATION, {"query": "df['amount'].median()", "operation": "median"})
+    assert covers(interval, population["amount"].median())
+    
+    result, intervals, _ = estimate(sample, POPULATION, {"query": "len(df)", "operation": "count"})
+    assert result["result"].iat[0] == POPULATION and intervals == []
+
+def test_filters_report_the_estimated_number_of_matching_rows(population, sample):
+    query = "df[df['amount'] > 120]"
+    result, (interval,), total_rows = estimate(sample, POPULATION, {"query": query, "operation": "filter"})
+    assert len(result) == (sample["amount"] > 120).sum()
+    assert total_rows == round(interval["estimate"])
+    assert covers(interval, (population["amount"] > 120).sum())
+
+def test_plans_without_an_estimator_are_left_to_exact_execution(sample):
+    assert estimate(sample, POPULATION, {"query": "df['region'].nunique()", "operation": "distinct"}) is None
+    assert estimate(sample.iloc[:0], POPULATION, {"query": "len(df)", "operation": "count"}) is None
+
+class UnsampledConnector(BaseConnector):
+    """Connector that keeps the base class's sample(), like sources without server-side sampling"""
+    
+    def connect(self, connection_details):
+        return True
+    
+    def execute_query(self, query):
+        return pd.DataFrame()
+    
+    def get_schema(self):
+        return {}
+    
+    def close(self):
+        pass
+    
+    def is_connected(self):
+        return True
+
+def test_sources_without_sampling_run_exactly():
+    assert run_approximate(UnsampledConnector(), 9001, {}, None, {"query": "len(df)", "operation": "count"}) is None
+
+def test_streamed_csv_samples_are_uniform_and_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_connector, "SAMPLE_CHUNK_ROWS", 1000)
+    path = str(tmp_path / "ids.csv")
+    pd.DataFrame({"id": np.arange(20000)}).to_csv(path, index=False)
+    details = {"file_path": path}
+    sample_store.invalidate_connection(9002)
+    
+    connector = CSVConnector()
+    sample, population = connector.sample(details, 2000)
+    assert population == 20000
+    assert len(sample) == 2000 and sample["id"].is_unique
+    # Every chunk of the file contributes about a tenth of its rows
+    per_chunk = np.bincount(sample["id"] // 1000, minlength=20)
+    assert per_chunk.min() > 50 and per_chunk.max() < 150
+    
+    answer = run_approximate(connector, 9002, details, "v1", {"query": "len(df)", "operation": "count"})
+    assert answer["population_rows"] == 20000 and not answer["sample_cached"]
+    assert run_approximate(connector, 9002, details, "v1", {"query": "len(df)", "operation": "count"})["sample_cached"]
+    sample_store.invalidate_connection(9002)
+
+def test_cached_csv_datasets_are_sampled_in_memory(tmp_path):
+    path = str(tmp_path / "ids.csv")
+    pd.DataFrame({"id": np.arange(500)}).to_csv(path, index=False)
+    connector = CSVConnector()
+    connector.connect({"file_path": path})
+    try:
+        sample, population = connector.sample({"file_path": path}, 1000)
+        assert population == 500
+        assert sorted(sample["id"]) == list(range(500))
+    finally:
+        dataset_cache.discard(os.path.abspath(path))
@@ -0,0 +1,59 @@
+import threading
+import time
+import pytest
+from execution.single_flight import SingleFlight
+
+def run_concurrently(flights: SingleFlight, key, fn, callers: int) -> list:
+    """Call flights.do from several threads at once; returns each caller's (result, shared) or exception"""
+    outcomes = [None] * callers
+    barrier = threading.Barrier(callers)
+    
+    def call(i: int):
+        barrier.wait()
+        try:
+            outcomes[i] = flights.do(key, fn)
+        except Exception as e:
+            outcomes[i] = e
+    
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+    
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+    
+    outcomes = run_concurrently(flights, "key", slow, 8)
+    assert len(calls) == 1
+    assert [result for result, _ in outcomes] == ["result"] * 8
+    assert sum(shared for _, shared in outcomes) == 7
+    assert flights.in_flight() == 0
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flights = SingleFlight()
+    
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("boom")
+    
+    outcomes = run_concurrently(flights, "key", failing, 4)
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert flights.in_flight() == 0
+    # The next call runs again instead of replaying the failure
+    assert flights.do("key", lambda: 42) == (42, False)
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == (1, False)
+    assert flights.do("b", lambda: 2) == (2, False)
+    
+    with pytest.raises(KeyError):
+        flights.do("c", lambda: {}["missing"])
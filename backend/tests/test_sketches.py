@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from connectors.csv_connector import CSVConnector
+from connectors.dataset_cache import dataset_cache
+from execution.sketches import HyperLogLog, TDigest, run_sketch, sketch_store
+
+@pytest.fixture
+def numbers():
+    rng = np.random.default_rng(7)
+    return pd.Series(rng.lognormal(3, 1, 200000))
+
+def test_hyperloglog_count_is_within_its_error_bound():
+    values = pd.Series(np.arange(150000) % 90000)
+    sketch = HyperLogLog()
+    sketch.add(values)
+    
+    exact = values.nunique()
+    assert abs(sketch.count() - exact) <= 3 * sketch.relative_error * exact
+    assert sketch.rows == len(values)
+
+def test_hyperloglog_small_counts_and_nulls():
+    sketch = HyperLogLog()
+    sketch.add(pd.Series(["a", "b", "c", None, "a"]))
+    assert sketch.count() == 3
+    
+    empty = HyperLogLog()
+    empty.add(pd.Series([None, None]))
+    assert empty.count() == 0
+
+def test_hyperloglog_merge_equals_one_sketch_of_everything():
+    values = pd.Series([f"user{i}" for i in range(60000)])
+    whole, left, right = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    whole.add(values)
+    left.add(values[:30000])
+    right.add(values[20000:])
+    left.merge(right)
+    
+    assert left.count() == whole.count()
+
+def test_tdigest_quantiles_track_numpy(numbers):
+    digest = TDigest()
+    for start in range(0, len(numbers), 50000):
+        chunk = TDigest()
+        chunk.add(numbers[start:start + 50000])
+        digest.merge(chunk)
+    
+    for q in (0.01, 0.5, 0.9, 0.99):
+        exact = np.quantile(numbers, q)
+        assert digest.quantile(q) == pytest.approx(exact, rel=0.02)
+    assert digest.quantile(0) == numbers.min()
+    assert digest.quantile(1) == numbers.max()
+
+def test_tdigest_ignores_non_numeric_values():
+    digest = TDigest()
+    digest.add(pd.Series(["1", "x", None, "3"]))
+    assert digest.quantile(0.5) == 2
+    assert np.isnan(TDigest().quantile(0.5))
+
+@pytest.fixture
+def sketch_csv(tmp_path, numbers):
+    path = tmp_path / "numbers.csv"
+    pd.DataFrame({"value": numbers.round(3), "bucket": np.arange(len(numbers)) % 5000}).to_csv(path, index=False)
+    return str(path)
+
+def test_small_columns_get_exact_answers_unless_approximate_is_asked_for(sketch_csv):
+    connector = CSVConnector()
+    details = {"file_path": sketch_csv}
+    plan = {"operation": "distinct_count", "column": "bucket", "query": "df['bucket'].nunique()"}
+    sketch_store.invalidate_connection(101)
+    
+    assert run_sketch(connector, 101, details, "v1", plan) is None
+    # Nothing was streamed for the exact query, so the approximate one builds the sketch
+    assert sketch_store.get(101, "bucket", "hll", "v1") is None
+    approximate = run_sketch(connector, 101, details, "v1", plan, approximate=True)
+    assert approximate["sketch_cached"] is False
+    assert approximate["result"]["result"][0] == pytest.approx(5000, rel=0.05)
+    # The sketch of a small column still isn't used for exact queries
+    assert run_sketch(connector, 101, details, "v1", plan) is None
+
+def test_large_columns_use_sketches(sketch_csv, monkeypatch):
+    monkeypatch.setattr(settings, "sketch_min_rows", 1000)
+    connector = CSVConnector()
+    details = {"file_path": sketch_csv}
+    exact = pd.read_csv(sketch_csv)["value"]
+    sketch_store.invalidate_connection(102)
+    
+    median = run_sketch(connector, 102, details, "v1", {"operation": "median", "agg_column": "value", "query": "df['value'].median()"})
+    assert median["sketch_cached"] is False
+    assert median["result"]["result"][0] == pytest.approx(exact.median(), rel=0.02)
+    p90 = run_sketch(connector, 102, details, "v1", {"operation": "percentile", "column": "value", "quantile": 0.9, "query": ""})
+    assert p90["result"]["result"][0] == pytest.approx(exact.quantile(0.9), rel=0.02)
+
+def test_unsketchable_plans_run_exactly(sketch_csv):
+    details = {"file_path": sketch_csv}
+    grouped = {"operation": "distinct_count", "column": "bucket", "group_column": "value", "query": ""}
+    assert run_sketch(CSVConnector(), 103, details, "v1", grouped, approximate=True) is None
+    filtered_median = {"operation": "median", "agg_column": "value", "query": "df[df['bucket'] > 3]['value'].median()"}
+    assert run_sketch(CSVConnector(), 103, details, "v1", filtered_median, approximate=True) is None
+
+def test_row_counts_are_checked_before_building_and_counted_once_per_version(sketch_csv, monkeypatch):
+    connector = CSVConnector()
+    counted = []
+    count_rows = connector.row_count
+    monkeypatch.setattr(connector, "row_count", lambda details: counted.append(1) or count_rows(details))
+    monkeypatch.setattr(connector, "iter_chunks", lambda *args: pytest.fail("streamed a small column"))
+    details = {"file_path": sketch_csv}
+    plan = {"operation": "distinct_count", "column": "bucket", "query": "df['bucket'].nunique()"}
+    sketch_store.invalidate_connection(104)
+    
+    assert run_sketch(connector, 104, details, "v1", plan) is None
+    assert run_sketch(connector, 104, details, "v1", plan) is None
+    assert len(counted) == 1
+    assert run_sketch(connector, 104, details, "v2", plan) is None
+    assert len(counted) == 2
+
+def test_csv_row_counts_with_and_without_a_parsed_dataset(tmp_path):
+    path = tmp_path / "rows.csv"
+    path.write_text("a,b\n1,2\n3,4\n5,6")
+    details = {"file_path": str(path)}
+    # The unterminated last line is a row
+    assert CSVConnector().row_count(details) == 3
+    
+    connector = CSVConnector()
+    connector.connect(details)
+    try:
+        assert CSVConnector().row_count(details) == 3
+    finally:
+        dataset_cache.discard(os.path.abspath(str(path)))
@@ -0,0 +1,66 @@
+from datetime import datetime
+from models import QueryHistory, User, UsageCounter
+import usage
+from usage import UsageCounterCache, current_period
+
+def test_first_read_seeds_the_counter_from_history(session_factory):
+    db = session_factory()
+    for _ in range(3):
+        db.add(QueryHistory(user_id=1, query_text="q", created_at=datetime.utcnow()))
+    db.add(QueryHistory(user_id=1, query_text="last year", created_at=datetime(2000, 1, 5)))
+    db.commit()
+    
+    cache = UsageCounterCache(max_users=10, ttl_seconds=60)
+    assert cache.get_count(db, 1) == 3
+    assert db.query(UsageCounter).filter_by(user_id=1, period=current_period()).one().query_count == 3
+    db.close()
+
+def test_counts_are_cached_and_noted_queries_show_up_at_once(session_factory):
+    db = session_factory()
+    cache = UsageCounterCache(max_users=10, ttl_seconds=60)
+    assert cache.get_count(db, 1) == 0
+    
+    cache.note_query(1, current_period())
+    assert cache.get_count(db, 1) == 1
+    # The row itself only changes when the history batch is written
+    assert db.query(UsageCounter).filter_by(user_id=1).one().query_count == 0
+    db.close()
+
+def test_add_queries_increments_and_creates_rows(session_factory):
+    db = session_factory()
+    db.add(User(id=2, email="other@example.com", hashed_password="x"))
+    db.commit()
+    cache = UsageCounterCache(max_users=10, ttl_seconds=60)
+    cache.get_count(db, 1)
+    
+    cache.add_queries(db, {(1, current_period()): 4, (2, current_period()): 2})
+    db.commit()
+    cache.clear()
+    assert cache.get_count(db, 1) == 4
+    assert cache.get_count(db, 2) == 2
+    db.close()
+
+def test_expired_counts_are_reread(session_factory, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(usage.time, "monotonic", lambda: now[0])
+    db = session_factory()
+    cache = UsageCounterCache(max_users=10, ttl_seconds=30)
+    cache.get_count(db, 1)
+    # Another API process counts queries
+    UsageCounterCache(max_users=10, ttl_seconds=30).add_queries(db, {(1, current_period()): 5})
+    db.commit()
+    
+    assert cache.get_count(db, 1) == 0
+    now[0] += 31
+    assert cache.get_count(db, 1) == 5
+    db.close()
+
+def test_cache_holds_at_most_max_users():
+    cache = UsageCounterCache(max_users=2, ttl_seconds=60)
+    for user_id in range(5):
+        cache._store((user_id, "2030-01"), user_id)
+    assert list(cache._entries) == [(3, "2030-01"), (4, "2030-01")]
+    
+    # A new month makes the old counts useless
+    cache._store((9, "2030-02"), 0)
+    assert list(cache._entries) == [(9, "2030-02")]
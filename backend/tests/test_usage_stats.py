@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+from models import Connection, QueryHistory
+from routers.connections import usage_stats_query
+
+NOW = datetime(2030, 6, 15, 12, 30)
+
+def test_usage_stats_count_connections_and_queries_in_one_statement(session_factory):
+    db = session_factory()
+    db.add_all([
+        Connection(name="a", type="csv", details={}, user_id=1, status="active"),
+        Connection(name="b", type="csv", details={}, user_id=1, status="inactive"),
+    ])
+    for created_at in (NOW - timedelta(hours=1), NOW.replace(hour=0), NOW - timedelta(days=3), NOW - timedelta(days=40)):
+        db.add(QueryHistory(user_id=1, query_text="q", created_at=created_at))
+    db.commit()
+    
+    stats = dict(db.execute(usage_stats_query(1, NOW)).one()._mapping)
+    assert stats == {
+        "total_connections": 2,
+        "active_connections": 1,
+        "total_queries": 4,
+        "queries_today": 2,
+        "queries_this_month": 3,
+    }
+    assert dict(db.execute(usage_stats_query(2, NOW)).one()._mapping) == dict.fromkeys(stats, 0)
+    db.close()
+
+def test_history_is_indexed_by_user_and_date():
+    indexes = {index.name: [column.name for column in index.columns] for index in QueryHistory.__table__.indexes}
+    assert indexes["ix_query_history_user_id_created_at"] == ["user_id", "created_at"]
+    assert indexes["ix_query_history_source_id"] == ["source_id"]
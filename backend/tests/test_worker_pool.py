@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from multiprocessing import shared_memory
+from connectors.dataset_cache import dataset_cache
+from execution.worker_pool import (
+    SHARED_MEMORY_DIR, SHARED_MEMORY_MIN_BYTES, SHARED_MEMORY_PREFIX,
+    QueryWorkerPool, _pack, _sweep_shared_memory, _unpack
+)
+from metrics import metrics
+
+@pytest.fixture
+def pool():
+    pool = QueryWorkerPool(2)
+    yield pool
+    pool.shutdown()
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "readings.csv"
+    pd.DataFrame({"sensor": np.arange(300000) % 50, "value": np.arange(300000) * 0.5}).to_csv(path, index=False)
+    return str(path)
+
+def leftover_blocks(pid: int):
+    return [name for name in os.listdir(SHARED_MEMORY_DIR) if name.startswith(f"{SHARED_MEMORY_PREFIX}{pid}_")]
+
+def test_small_results_are_sent_inline():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    payload, name, buffers = _pack(df, f"{SHARED_MEMORY_PREFIX}{os.getpid()}_inline")
+    assert name is None
+    pd.testing.assert_frame_equal(_unpack(payload, name, buffers), df)
+
+def test_large_results_travel_through_one_shared_memory_block():
+    df = pd.DataFrame({"a": np.arange(SHARED_MEMORY_MIN_BYTES)})
+    payload, name, sizes = _pack(df, f"{SHARED_MEMORY_PREFIX}{os.getpid()}_large")
+    assert name is not None and sum(sizes) >= SHARED_MEMORY_MIN_BYTES
+    pd.testing.assert_frame_equal(_unpack(payload, name, sizes), df)
+    # The receiver unlinks the block
+    assert leftover_blocks(os.getpid()) == []
+
+def test_blocks_left_by_a_dead_worker_are_swept():
+    pid = 999999
+    block = shared_memory.SharedMemory(name=f"{SHARED_MEMORY_PREFIX}{pid}_0", create=True, size=1024)
+    block.close()
+    assert leftover_blocks(pid)
+    _sweep_shared_memory(pid)
+    assert leftover_blocks(pid) == []
+
+def test_only_file_connections_run_in_workers():
+    assert QueryWorkerPool(2).handles("CSV")
+    assert not QueryWorkerPool(2).handles("postgresql")
+    assert not QueryWorkerPool(0).handles("csv")
+
+def test_plans_run_in_workers_and_match_in_process_results(pool, csv_path):
+    details = {"file_path": csv_path}
+    assert pool.get_schema(1, "csv", details)["columns"] == ["sensor", "value"]
+    
+    expected = pd.read_csv(csv_path)
+    shared = metrics.get("query_worker_shared_memory_bytes_total")
+    pd.testing.assert_frame_equal(pool.execute(1, "csv", details, "df[df['value'] > 10]"), expected[expected["value"] > 10])
+    assert metrics.get("query_worker_shared_memory_bytes_total") > shared
+    grouped = pool.execute(1, "csv", details, "df.groupby('sensor')['value'].sum().reset_index()")
+    pd.testing.assert_frame_equal(grouped, expected.groupby("sensor")["value"].sum().reset_index())
+    # The dataset was loaded in the worker, not in this process
+    assert dataset_cache.peek(os.path.abspath(csv_path)) is None
+
+def test_errors_come_back_as_value_errors(pool, csv_path):
+    with pytest.raises(ValueError, match="missing"):
+        pool.execute(1, "csv", {"file_path": csv_path}, "df['missing'].sum()")
+    with pytest.raises(ValueError, match="not found"):
+        pool.execute(1, "csv", {"file_path": csv_path + ".gone"}, "len(df)")
+
+def test_killed_workers_are_restarted_and_their_blocks_swept(pool, csv_path):
+    details = {"file_path": csv_path}
+    pool.execute(7, "csv", details, "len(df)")
+    worker = pool._worker_for(7)
+    pid = worker.process.pid
+    block = shared_memory.SharedMemory(name=f"{SHARED_MEMORY_PREFIX}{pid}_99", create=True, size=1024)
+    block.close()
+    worker.process.kill()
+    worker.process.join()
+    
+    restarts = metrics.get("query_worker_restarts_total")
+    assert pool.execute(7, "csv", details, "len(df)")["result"][0] == 300000
+    assert metrics.get("query_worker_restarts_total") == restarts + 1
+    assert worker.process.pid != pid
+    assert leftover_blocks(pid) == []
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from config import settings
+from connectors.dataset_cache import CachedDataset, ZoneMap
+from metrics import metrics
+
+def test_zone_maps_keep_every_row_group_that_can_match():
+    values = pd.Series(np.arange(1000, dtype=float))
+    values[200:300] = np.nan
+    zones = ZoneMap.build(values, row_group_rows=100)
+    
+    assert zones.candidate_groups(">", 850).tolist() == [False] * 8 + [True] * 2
+    assert zones.candidate_groups("<", 150).tolist() == [True, True] + [False] * 8
+    # The all-null group never matches
+    assert not zones.candidate_groups("==", 250)[2]
+    assert np.array_equal(zones.rows(zones.candidate_groups("==", 555)), np.arange(500, 600))
+    assert zones.candidate_groups(">", "text") is None
+
+def test_zone_maps_survive_the_sidecar_array_round_trip(sales):
+    zones = ZoneMap.build(sales["region"], row_group_rows=1000)
+    restored = ZoneMap.from_arrays(zones.to_arrays())
+    assert np.array_equal(restored.candidate_groups("==", "east"), zones.candidate_groups("==", "east"))
+
+@pytest.mark.parametrize("query", [
+    "df[df['amount'] > 9000]",
+    "df[df['amount'] < 50]",
+    "df[df['order_id'] > 18500]",
+    "df[df['region'] < 'north']",
+])
+def test_zone_map_filters_match_plain_pandas(sales, query, monkeypatch):
+    monkeypatch.setattr(settings, "zone_map_row_group_rows", 1024)
+    dataset = CachedDataset("sales", sales, "v1", None)
+    pd.testing.assert_frame_equal(dataset.execute_filter(query), eval(query, {"df": sales}))
+
+def test_sorted_columns_skip_row_groups(sales, monkeypatch):
+    monkeypatch.setattr(settings, "zone_map_row_group_rows", 1000)
+    dataset = CachedDataset("sales", sales, "v1", None)
+    skipped = metrics.get("dataset_row_groups_skipped_total")
+    dataset.execute_filter("df[df['order_id'] > 18500]")
+    assert metrics.get("dataset_row_groups_skipped_total") - skipped == 18
+
+def test_other_plans_are_left_to_the_caller(sales):
+    dataset = CachedDataset("sales", sales, "v1", None)
+    assert dataset.execute_filter("df.groupby('region')['amount'].sum()") is None
+    assert dataset.execute_filter("df[df['missing'] > 3]") is None
+    assert dataset.execute_filter("df[df['amount'] > 'text']") is None
+    for _ in range(settings.secondary_index_min_filters + 1):
+        assert dataset.execute_filter("df[df['region'] == ('east', 'west')]") is None
@@ -0,0 +1,114 @@
+"""
+Monthly query usage
+Per-user query counts kept in one usage_counters row per month, incremented in the same transaction
+as the history rows they count and cached in-process so quota checks don't touch the database
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from config import settings
+from models import QueryHistory, UsageCounter
+
+def current_period(now: Optional[datetime] = None) -> str:
+    """Get the usage period (calendar month, UTC) for a moment, e.g. "2024-05\""""
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+
+def period_start(period: str) -> datetime:
+    """Get the first moment (UTC) of a usage period"""
+    return datetime.strptime(period, "%Y-%m").replace(tzinfo=timezone.utc)
+
+def _insert_if_missing(db: Session, values: dict):
+    """Insert a counter row, leaving it alone if a concurrent request created it first"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        db.add(UsageCounter(**values))
+        db.flush()
+        return
+    db.execute(insert(UsageCounter).values(**values).on_conflict_do_nothing())
+
+class UsageCounterCache:
+    """LRU cache of (user_id, period) -> query count in front of the usage_counters table"""
+    
+    def __init__(self, max_users: int, ttl_seconds: int):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, float]]" = OrderedDict()
+        self._period = None
+        self._lock = threading.Lock()
+    
+    def get_count(self, db: Session, user_id: int) -> int:
+        """Get a user's query count for the current month"""
+        key = (user_id, current_period())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._entries.move_to_end(key)
+                return entry[0]
+        
+        count = self._read_row(db, *key)
+        if count is None:
+            count = self._create_row(db, *key)
+            db.commit()
+        self._store(key, count)
+        return count
+    
+    def note_query(self, user_id: int, period: str):
+        """Count an accepted query in the cached count right away, ahead of its database write"""
+        with self._lock:
+            entry = self._entries.get((user_id, period))
+            if entry is not None:
+                self._entries[(user_id, period)] = (entry[0] + 1, entry[1])
+    
+    def add_queries(self, db: Session, counts: Dict[Tuple[int, str], int]):
+        """
+        Add query counts to their counter rows in db's current transaction.
+        Run it before inserting the history rows being counted, or a new month's row would count them twice.
+        """
+        for (user_id, period), amount in counts.items():
+            increment = update(UsageCounter).where(
+                UsageCounter.user_id == user_id, UsageCounter.period == period
+            ).values(query_count=UsageCounter.query_count + amount)
+            if db.execute(increment).rowcount == 0:
+                self._create_row(db, user_id, period)
+                db.execute(increment)
+    
+    def clear(self):
+        """Drop all cached counts"""
+        with self._lock:
+            self._entries.clear()
+    
+    def _read_row(self, db: Session, user_id: int, period: str) -> Optional[int]:
+        return db.execute(
+            select(UsageCounter.query_count).where(UsageCounter.user_id == user_id, UsageCounter.period == period)
+        ).scalar()
+    
+    def _create_row(self, db: Session, user_id: int, period: str) -> int:
+        """Create the month's counter, starting from history already logged (e.g. before counters existed)"""
+        logged = db.query(func.count(QueryHistory.id)).filter(
+            QueryHistory.user_id == user_id,
+            QueryHistory.created_at >= period_start(period)
+        ).scalar()
+        _insert_if_missing(db, {"user_id": user_id, "period": period, "query_count": logged})
+        return self._read_row(db, user_id, period)
+    
+    def _store(self, key: Tuple[int, str], count: int):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._period != key[1]:
+                # Counts for past months are never read again
+                self._entries.clear()
+                self._period = key[1]
+            self._entries[key] = (count, time.monotonic() + self.ttl_seconds)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+# Shared usage counter cache for the API process
+usage_counters = UsageCounterCache(settings.usage_cache_max_users, settings.usage_cache_ttl_seconds)